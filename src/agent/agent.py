@@ -1,31 +1,56 @@
 import numpy as np
 
+from utils import draw_integers
+
 class Agent:
-    def __init__(self, id, num_players, seed=42):
-        np.random.seed(seed + id)  # Different seed for each agent based on their ID
-        # Initialize beliefs array with random values from normal distribution
-        self.beliefs = np.random.normal(loc=1.0, scale=0, size=num_players)
-        self.beliefs[id] = None
-
-    def vote(self):
-        # Get indices and beliefs of valid suspects (not None and not nan)
-        valid_suspects = [(i, b) for i, b in enumerate(self.beliefs) 
-                         if b is not None and not np.isnan(b)]
-        
-        if not valid_suspects:
+    def __init__(self, registry, id, rng=None):
+        """
+        Thin view over the entry of a player in the PlayerRegistry of its game.
+        registry: PlayerRegistry  arrays holding the state of every player
+        id: int                 unique integer among players
+        rng: Generator          random stream of the agent decisions, usually the stream of its game
+                                (a legacy RandomState is accepted too)
+        """
+        self.registry = registry
+        self.id = id
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    @property
+    def beliefs(self):
+        # row of the player in the belief store: a view with the dense store, in-place writes go to the store
+        return self.registry.belief_row(self.id)
+
+    @beliefs.setter
+    def beliefs(self, beliefs):
+        self.registry.set_belief_row(self.id, beliefs)
+
+    @property
+    def alive(self):
+        return bool(self.registry.alive[self.id])
+
+    def vote(self, rtol=0.0):
+        """
+        votes for one of the players with the highest belief (NaN entries are not valid suspects),
+        ties are broken uniformly at random
+        rtol: float   tie policy, beliefs within rtol * |max| of the highest belief are ties (see game.kernels.max_ties)
+
+        returns int, None if there is no valid suspect
+        """
+        beliefs = self.beliefs
+        if np.isnan(beliefs).all():
             return None  # Return None if no valid suspects
-            
-        # Find the maximum belief value
-        max_belief = max(b for _, b in valid_suspects)
+
         # Get all indices with maximum belief
-        max_indices = [i for i, b in valid_suspects if b == max_belief]
+        best = np.nanmax(beliefs)
+        max_indices = np.flatnonzero(beliefs == best if not rtol else beliefs >= best - rtol * np.abs(best))
         # Randomly choose among the players with maximum belief
-        return np.random.choice(max_indices)
+        return int(max_indices[draw_integers(self.rng, len(max_indices))])
         
     def update_beliefs(self, beliefs):
         self.beliefs = beliefs
 
     def remove_dead_player(self, dead_id):
         """Update beliefs when a player dies by setting their belief to None"""
-        self.beliefs[dead_id] = None
-
+        beliefs = self.beliefs
+        beliefs[dead_id] = None
+        self.beliefs = beliefs
@@ -1,15 +1,25 @@
-import numpy as np
-
 from .agent import Agent
-from utils import softmax
 
 class LittleGirl(Agent):
-    def __init__(self, id, num_players, p_focus=0.3, seed=42):
-        super().__init__(id, num_players, seed)
-        self.beliefs = softmax(self.beliefs)
-        self.id = id
-        self.type = "Villager"
-        self.role = "LittleGirl"
+    type = "Villager"
+    role = "LittleGirl"
+
+    def __init__(self, registry, id, p_focus=0.3, rng=None):
+        super().__init__(registry, id, rng)
         self.p_focus = p_focus
-        self.focus = False
-        self.save_beliefs = None
\ No newline at end of file
+
+    @property
+    def focus(self):
+        return bool(self.registry.focus[self.id])
+
+    @focus.setter
+    def focus(self, focus):
+        self.registry.focus[self.id] = focus
+
+    @property
+    def save_beliefs(self):
+        return self.registry.saved_beliefs.get(self.id)
+
+    @save_beliefs.setter
+    def save_beliefs(self, beliefs):
+        self.registry.saved_beliefs[self.id] = beliefs
\ No newline at end of file
@@ -1,35 +1,23 @@
-import numpy as np
-
 from .agent import Agent
-from utils import softmax
+from utils import draw_integers
 
 class Werewolf(Agent):
-    def __init__(self, id, num_players, werewolves_id, villagers_id, seed=42):
-        """
-        id: int                 unique integer among werewolves
-        num_players: int        total number of players in the game
-        werewolves_id: list     list of ids of all werewolves in game
-        villagers_id:  list     list of ids of all villagers in game
-        seed: int               random seed for reproducibility
-        """
-        super().__init__(id, num_players, seed)
-        # Set beliefs towards other werewolves to None
-        self.beliefs[werewolves_id] = None
-        self.beliefs = softmax(self.beliefs)
-        self.id = id
-        self.type = "Werewolf"
-        self.role = self.type
+    type = "Werewolf"
+    role = "Werewolf"
 
+    @property
+    def villagers_id(self):
         # a werewolf knows who are the villagers
-        self.villagers_id = villagers_id
+        return self.registry.alive_ids(role=False)
 
-    def night_vote(self, villagers_id):
+    def night_vote(self, villagers_id=None):
         """
         Vote for a villager to eliminate during night phase.
         Returns the ID of the chosen villager.
         """
-        self.villagers_id = villagers_id # Update the list of villagers
+        if villagers_id is None:
+            villagers_id = self.villagers_id
         # Simply choose a random villager from the remaining ones
-        if len(self.villagers_id) > 0:
-            return np.random.choice(list(self.villagers_id))
-        return 0
+        if len(villagers_id) > 0:
+            return list(villagers_id)[draw_integers(self.rng, len(villagers_id))]
+        return 0
\ No newline at end of file
@@ -0,0 +1,306 @@
+from game.game import Game
+from main import main
+from utils.logs import save_beliefs, close_beliefs
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+# player counts of a default run: a game of N players builds its N x N beliefs with temporaries of about
+# 4 times the matrix (3.2 GB at N=10000), so the default stays within the memory of an ordinary machine
+DEFAULT_SIZES = (10, 100, 1000, 3000)
+
+# name -> (setup, max_players): setup(num_players, engine) builds the state and returns the call to time
+BENCHMARKS = {}
+
+def benchmark(name, max_players=None):
+    """
+    Registers a benchmark of a hot path. The decorated function gets (num_players, engine) and returns
+    the function to time, the work it does before returning is not timed.
+    max_players: sizes above it are skipped (whole games grow as N^3)
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, max_players)
+        return setup
+    return register
+
+def new_game(num_players, engine, p_focus=0.3):
+    num_wolves = max(1, num_players // 10)
+    return Game(num_villagers=num_players - num_wolves, num_wolves=num_wolves, update_params=[25, 6, 6, 0.3],
+                p_focus=p_focus, seed=0, engine=engine)
+
+@benchmark("Game.__init__")
+def bench_init(num_players, engine):
+    return lambda: new_game(num_players, engine)
+
+@benchmark("Game.day_shift")
+def bench_day_shift(num_players, engine):
+    game = new_game(num_players, engine)
+    return game.day_shift
+
+@benchmark("Game.night_shift")
+def bench_night_shift(num_players, engine):
+    game = new_game(num_players, engine)
+    return game.night_shift
+
+@benchmark("Game.update_beliefs_after_elimination")
+def bench_update_beliefs(num_players, engine):
+    game = new_game(num_players, engine)
+    voters, votes = game.cast_votes()
+    eliminated_id = int(np.argmax(np.bincount(votes)))
+    target_type = game.players[eliminated_id].type
+    game.registry.eliminate(eliminated_id)
+    votes_dict = dict(zip(voters.tolist(), votes.tolist()))
+    return lambda: game.update_beliefs_after_elimination(eliminated_id, votes_dict, target_type)
+
+@benchmark("Agent.vote")
+def bench_vote(num_players, engine):
+    game = new_game(num_players, engine)
+    return game.players[num_players - 1].vote
+
+@benchmark("save_beliefs")
+def bench_save_beliefs(num_players, engine):
+    game = new_game(num_players, engine)
+    log_dir = tempfile.mkdtemp()
+    save_beliefs(game, 0, log_dir=log_dir)
+    def run():
+        save_beliefs(game, 1, log_dir=log_dir)
+    def cleanup():
+        close_beliefs(game)
+        shutil.rmtree(log_dir, ignore_errors=True)
+    run.cleanup = cleanup
+    return run
+
+@benchmark("main", max_players=1000)
+def bench_main(num_players, engine):
+    num_wolves = max(1, num_players // 10)
+    return lambda: main(Players=[num_wolves, num_players - num_wolves], seed=0, save_logs=False, p_focus=0.3, engine=engine)
+
+# import time budget (seconds, beyond the import of NumPy) of the modules of the headless core
+IMPORT_BUDGETS = {
+    'game.game': 0.1,
+    'main': 0.1,
+    'simulation': 0.2,
+}
+# optional dependencies the headless core must not import: plotting, progress bars, process pools
+HEAVY_MODULES = ('matplotlib', 'seaborn', 'pandas', 'tqdm', 'multiprocessing')
+
+def measure_import(module, repeat=5):
+    """
+    times the import of a module in fresh interpreters, started in the source directory
+
+    Returns:
+        dict: 'time' (best of repeat, seconds, beyond the import of NumPy) and 'heavy' (HEAVY_MODULES it loaded)
+    """
+    code = (
+        "import json, sys, time\n"
+        "import numpy\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'time': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    source = os.path.dirname(os.path.abspath(__file__))
+    runs = [json.loads(subprocess.run([sys.executable, '-c', code], cwd=source, check=True, capture_output=True, text=True).stdout)
+            for _ in range(repeat)]
+    return {'time': min(run['time'] for run in runs), 'heavy': runs[0]['heavy']}
+
+def check_import_budget(budgets=None, repeat=5, verbose=True):
+    """
+    Checks that the modules of the headless core import within their time budget and without loading
+    the optional heavy dependencies (see IMPORT_BUDGETS and HEAVY_MODULES).
+
+    Returns:
+        list: (module, problem) of the modules over budget, empty when all of them pass
+    """
+    failures = []
+    for module, budget in (budgets or IMPORT_BUDGETS).items():
+        values = measure_import(module, repeat)
+        if verbose:
+            print(f"import {module:30s} {values['time'] * 1e3:8.1f} ms (budget {budget * 1e3:.0f} ms) {' '.join(values['heavy'])}")
+        if values['heavy']:
+            failures.append((module, f"loads {', '.join(values['heavy'])}"))
+        if values['time'] > budget:
+            failures.append((module, f"{values['time'] * 1e3:.1f} ms over the {budget * 1e3:.0f} ms budget"))
+    return failures
+
+def measure(name, num_players, engine, repeat):
+    """
+    times a benchmark and measures the peak memory allocated by one call. An untimed call comes first, so that
+    the first-call costs (imports, caches, allocator growth) do not weigh on the small sizes.
+
+    Returns:
+        dict: 'time' (best of repeat, seconds), 'spread' (relative gap between the median and the best call,
+            the timing noise of the measure, 0 for a single call) and 'peak_bytes' (tracemalloc peak of one call)
+    """
+    setup, _ = BENCHMARKS[name]
+    run = setup(num_players, engine)
+    run()
+    getattr(run, 'cleanup', lambda: None)()
+
+    times = []
+    for _ in range(repeat):
+        run = setup(num_players, engine)
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+        getattr(run, 'cleanup', lambda: None)()
+
+    # separate call for the memory, tracemalloc slows the timed calls down
+    run = setup(num_players, engine)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    getattr(run, 'cleanup', lambda: None)()
+
+    best = min(times)
+    spread = (float(np.median(times)) - best) / best if best > 0 else 0.0
+    return {'time': best, 'spread': spread, 'peak_bytes': peak}
+
+def scaling_exponents(results):
+    """
+    Fits time ~ N^k on the measured sizes of each benchmark.
+
+    Returns:
+        dict: name -> k, None when less than 2 sizes were measured
+    """
+    exponents = {}
+    for name, by_size in results.items():
+        sizes = np.array([int(n) for n in by_size], dtype=float)
+        times = np.array([by_size[n]['time'] for n in by_size])
+        keep = times > 0
+        if keep.sum() < 2:
+            exponents[name] = None
+            continue
+        exponents[name] = float(np.polyfit(np.log(sizes[keep]), np.log(times[keep]), 1)[0])
+    return exponents
+
+# settings of a run that change what is measured: a baseline recorded with other values is not comparable
+COMPARABLE_META = ('engine',)
+
+# a time regression must exceed this many times the timing noise (spread) of the two runs
+NOISE_FACTOR = 3
+
+def meta_differences(meta, baseline):
+    """
+    Settings and environment of a run that differ from those of a baseline.
+
+    Returns:
+        list: (key, baseline value, new value), the keys of COMPARABLE_META make the runs incomparable
+    """
+    old_meta = baseline.get('meta', {})
+    return [(key, old_meta.get(key), value) for key, value in meta.items() if old_meta.get(key) != value]
+
+def compare(results, baseline, threshold):
+    """
+    Regressions against a baseline, on the sizes measured by both runs. A time is a regression when the best
+    call is slower than the baseline by more than threshold and by more than NOISE_FACTOR times the larger
+    spread of the two measures; the peak memory, which does not vary between runs, by more than threshold.
+
+    Returns:
+        list: (name, num_players, metric, baseline value, new value)
+    """
+    regressions = []
+    for name, by_size in results.items():
+        for size, values in by_size.items():
+            old = baseline.get('results', {}).get(name, {}).get(size)
+            if old is None:
+                continue
+            noise = NOISE_FACTOR * max(old.get('spread', 0.0), values.get('spread', 0.0))
+            for metric, tolerance in (('time', max(threshold, noise)), ('peak_bytes', threshold)):
+                if old[metric] > 0 and values[metric] > old[metric] * (1 + tolerance):
+                    regressions.append((name, int(size), metric, old[metric], values[metric]))
+    return regressions
+
+def run_benchmarks(sizes=DEFAULT_SIZES, names=None, engine='matrix', repeat=3, verbose=True):
+    """
+    Run the benchmarks of the game hot paths at several player counts.
+
+    Args:
+        sizes (list): Numbers of players
+        names (list): Benchmarks to run, None for all of BENCHMARKS
+        engine (str): Belief update engine of the games ("agents" or "matrix")
+        repeat (int): Number of timed calls, the best one is kept
+        verbose (bool): Print each measure
+
+    Returns:
+        dict: 'meta', 'results' (name -> num_players -> {'time', 'spread', 'peak_bytes'}) and 'exponents'
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        _, max_players = BENCHMARKS[name]
+        results[name] = {}
+        for num_players in sizes:
+            if max_players is not None and num_players > max_players:
+                continue
+            results[name][str(num_players)] = values = measure(name, num_players, engine, repeat)
+            if verbose:
+                print(f"{name:40s} N={num_players:<6d} {values['time'] * 1e3:12.3f} ms {values['peak_bytes'] / 2**20:10.2f} MB")
+
+    return {
+        'meta': {
+            'engine': engine,
+            'sizes': [int(n) for n in sizes],
+            'repeat': repeat,
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+        },
+        'results': results,
+        'exponents': scaling_exponents(results),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the game hot paths across player counts.')
+    parser.add_argument('--sizes', type=int, nargs='+', help='Numbers of players, each game holds an N x N belief matrix (several times that while it is built)', default=list(DEFAULT_SIZES))
+    parser.add_argument('--only', type=str, nargs='+', choices=list(BENCHMARKS), help='Benchmarks to run', default=None)
+    parser.add_argument('--engine', type=str, choices=['agents', 'matrix'], help='Belief update engine', default='matrix')
+    parser.add_argument('--repeat', type=int, help='Number of timed calls per measure', default=3)
+    parser.add_argument('--baseline', type=str, help='Baseline file', default='logs/benchmark_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='Record the results as the new baseline', default=False)
+    parser.add_argument('--threshold', type=float, help='Smallest relative slowdown flagged as a regression, noisier measures need more', default=0.2)
+    parser.add_argument('--import-budget', action='store_true', help='Only check the import time budget of the headless core', default=False)
+    args = parser.parse_args()
+
+    if args.import_budget:
+        failures = check_import_budget()
+        print(f"\n{len(failures)} import budget failure(s)")
+        for module, problem in failures:
+            print(f"{module:30s} {problem}")
+        sys.exit(1 if failures else 0)
+
+    report = run_benchmarks(args.sizes, args.only, args.engine, args.repeat)
+
+    print("\nScaling exponents (time ~ N^k):")
+    for name, k in report['exponents'].items():
+        print(f"{name:40s} " + ("-" if k is None else f"{k:.2f}"))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        differences = meta_differences(report['meta'], baseline)
+        for key, old, new in differences:
+            print(f"\nWarning: {key} {old} in the baseline, {new} in this run")
+        if any(key in COMPARABLE_META for key, _, _ in differences):
+            sys.exit(f"Not comparable with {args.baseline}, rerun with its settings or record a new baseline")
+        if args.repeat < 3:
+            print("\nWarning: less than 3 timed calls, the timing noise is not measured")
+        regressions = compare(report['results'], baseline, args.threshold)
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%} (or {NOISE_FACTOR}x the timing noise) against {args.baseline}")
+        for name, num_players, metric, old, new in regressions:
+            print(f"{name:40s} N={num_players:<6d} {metric:10s} {old:.4g} -> {new:.4g} (x{new / old:.2f})")
+        if regressions:
+            sys.exit(1)
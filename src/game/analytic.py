@@ -0,0 +1,159 @@
+from functools import lru_cache
+import numpy as np
+
+# Exact win probabilities of simple models of the game, computed by dynamic programming over the
+# (villagers v, werewolves m) states. A state only depends on states with two players less, so the
+# tables are filled one anti-diagonal v + m = const at a time with array operations, and kept between
+# calls: a larger table extends the previous one instead of starting over.
+
+
+class _DiagonalTables():
+
+    def __init__(self, count, init, step):
+        """
+        Memoized (T+1, T+1) tables indexed [v, m], filled up to the anti-diagonal v + m = T.
+        count: int        number of tables filled together
+        init:  callable   tables -> None, sets the base cases of freshly allocated tables
+        step:  callable   (tables, n) -> None, fills the anti-diagonal v + m = n from the diagonals below it
+        """
+        self.count = count
+        self.init = init
+        self.step = step
+        self.total = -1
+        self.tables = None
+
+    def get(self, total):
+        """
+        returns the tables filled up to the anti-diagonal v + m = total, as read-only views
+        """
+        if total > self.total:
+            size = max(total, 2 * self.total)
+            tables = [np.zeros((size + 1, size + 1)) for _ in range(self.count)]
+            self.init(tables)
+            if self.tables is not None:
+                for new, old in zip(tables, self.tables):
+                    new[:self.total + 1, :self.total + 1] = old
+            for n in range(self.total + 1, size + 1):
+                self.step(tables, n)
+            for table in tables:
+                table.setflags(write=False)
+            self.tables, self.total = tables, size
+        return [table[:total + 1, :total + 1] for table in self.tables]
+
+
+def _diagonal(n):
+    """
+    states (v, m) of the anti-diagonal v + m = n with m >= 1 and v >= 1
+    """
+    m = np.arange(1, n)
+    return n - m, m
+
+
+def _default_init(tables):
+    dp, = tables
+    dp[:, 0] = 1  # werewolves 0 villagers win
+    dp[0, :] = 0  # villagers 0 villagers lose
+
+
+def _default_step(tables, n):
+    dp, = tables
+    v, m = _diagonal(n)
+    # v - 2 < 0 is a lost game, like the wrapped index of the loop version
+    lynched_villager = np.where(v >= 2, dp[np.maximum(v - 2, 0), m], 0)
+    dp[v, m] = (v / n) * lynched_villager + (m / n) * dp[v - 1, m - 1]
+
+
+def _random_vote_init(tables):
+    win, rounds = tables
+    win[:, 0] = 1
+
+
+def _random_vote_step(tables, n):
+    win, rounds = tables
+    v, m = _diagonal(n)
+
+    # night: the pack kills a villager, the werewolves win as soon as they are as many as the villagers
+    v = v - 1
+    playing = v > m
+    v, m, night_v = v[playing], m[playing], v[playing] + 1
+    alive = v + m
+
+    # day: a uniformly random alive player is lynched, then the win conditions are checked
+    p_win = np.zeros(len(v))
+    p_rounds = np.zeros(len(v))
+    for weight, (vv, mm) in (((v / alive), (v - 1, m)), ((m / alive), (v, m - 1))):
+        villagers_win = mm == 0
+        going_on = (vv > mm) & ~villagers_win
+        p_win += weight * np.where(villagers_win, 1, np.where(going_on, win[vv, mm], 0))
+        p_rounds += weight * np.where(going_on, 1 + rounds[vv, mm], 0)
+    win[night_v, m] = p_win
+    rounds[night_v, m] = p_rounds
+
+
+_DEFAULT = _DiagonalTables(1, _default_init, _default_step)
+_RANDOM_VOTE = _DiagonalTables(2, _random_vote_init, _random_vote_step)
+
+
+def villagers_win_probability_default(n_max):
+    """
+    Villagers win probability of the phase-diagram notebook model: each day a uniformly random player
+    is lynched, then the pack kills a villager at night, until one of the teams is empty.
+    n_max: int   largest number of players
+
+    returns (n_max + 1, n_max + 1) float table dp[v, m] for v villagers and m werewolves,
+    0 for the states with more than n_max players
+    """
+    dp, = _DEFAULT.get(n_max)
+    players = np.add.outer(np.arange(n_max + 1), np.arange(n_max + 1))
+    return np.where(players <= n_max, dp, 0)
+
+
+@lru_cache(maxsize=32)
+def villagers_win_probability(n, m):
+    """
+    Villagers win probability of the first model of the phase-diagram notebook, whose lynching
+    odds depend on the size n of the village:
+    dp[v, k] = v k / d * dp[v - 1, k - 1] + (v^2 + k n) / d * dp[v - 2, k],  d = v^2 + k (v + k) + k v
+    computed for every k <= min(v, m) (the notebook loop reused m as its loop variable and only
+    reached k = 1).
+    n: int   largest number of villagers
+    m: int   largest number of werewolves
+
+    returns (n + 1, m + 1) float read-only table dp[v, k], memoized
+    """
+    dp = np.zeros((n + 1, m + 1))
+    dp[:, 0] = 1
+    dp[0, :] = 0
+    for total in range(2, n + m + 1):
+        k = np.arange(max(1, total - n), min(m, total // 2) + 1)
+        v = total - k
+        denominator = v**2 + (k * total) + k * v
+        lynched_villager = np.where(v >= 2, dp[np.maximum(v - 2, 0), k], 0)
+        dp[v, k] = ((v * k) / denominator) * dp[v - 1, k - 1] + ((v**2 + (k * n)) / denominator) * lynched_villager
+    dp.setflags(write=False)
+    return dp
+
+
+def random_vote_tables(num_players):
+    """
+    Exact outcome of the random-voting baseline of the game (Game vote_mode="random"), played with
+    the rules of Game: each night the pack kills a uniformly random villager, each day the village lynches a
+    uniformly random alive player, and the werewolves win as soon as they are as many as the villagers.
+    num_players: int   largest number of players
+
+    returns (win, rounds): (num_players + 1, num_players + 1) float read-only tables indexed [v, m] with the
+    villagers win probability and the expected number of rounds (as counted by main()) from a game
+    starting with v villagers and m werewolves, for v + m <= num_players
+    """
+    return _RANDOM_VOTE.get(num_players)
+
+
+def random_vote_outcome(num_werewolves, num_villagers):
+    """
+    Exact villagers win probability and expected number of rounds of the random-voting baseline,
+    see random_vote_tables. Statistical oracle of the games played with vote_mode="random".
+
+    returns (float, float)
+    """
+    win, rounds = random_vote_tables(num_werewolves + num_villagers)
+    return float(win[num_villagers, num_werewolves]), float(rounds[num_villagers, num_werewolves])
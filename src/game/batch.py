@@ -0,0 +1,245 @@
+from utils import softmax, draw_integers
+from .kernels import VILLAGER, WEREWOLF, LITTLE_GIRL, apply_day_votes, cast_votes, get_pack_rule, max_ties, night_targets, pick_tie, legacy_random_state
+import numpy as np
+
+class BatchGame():
+
+    def __init__(self, seeds, num_villagers=1, num_wolves=1, update_params = [15, 15, 2, 0.3], p_focus=None, rng_mode="generator", pack_rule="sum", dtype="float64", tie_rtol=0.0):
+        """
+        K independent games with the same number of players, advanced in lockstep.
+        All belief matrices live in one (K, N, N) tensor and every phase is played for all
+        the running games at once. Finished games are dropped from the tensor.
+
+        seeds:          list    one seed per game
+        num_villagers:  int     number of villagers in each game
+        num_wolves:     int     number of wolves in each game
+        update_params:  list    [eta, lambda, mu, gamma] shared by all games,
+                                or (K, 4) array with the parameters of each game
+        p_focus:        float   Little Girl focus probability, None for no Little Girl
+        rng_mode:       str     "generator" or "legacy", see Game
+        pack_rule:      str     aggregation of the werewolf beliefs at night, see Game
+        dtype:          str     "float64" or "float32" beliefs, see Game
+        tie_rtol:       float   tie policy of the votes and of the night targeting, see Game
+
+        Each game draws from its own stream, built like the stream of Game, in the same order,
+        so that it reproduces the game played by main() with the same seed and rng_mode.
+        """
+        if rng_mode not in ("generator", "legacy"):
+            raise ValueError(f"The batched games have no {rng_mode!r} rng_mode, expected 'generator' or 'legacy'")
+        self.seeds          = np.asarray(seeds)
+        self.num_games      = len(self.seeds)
+        self.num_villagers  = num_villagers
+        self.num_wolves     = num_wolves
+        self.num_players    = num_villagers + num_wolves
+        self.is_little_girl = (p_focus is not None)
+        self.p_focus        = p_focus
+        self.pack_rule      = get_pack_rule(pack_rule)
+        self.dtype          = np.dtype(dtype)
+        self.tie_rtol       = tie_rtol
+
+        self.params = np.broadcast_to(np.asarray(update_params, dtype=float), (self.num_games, 4)).copy()
+
+        # roles are the same in every game: villagers first, then werewolves
+        self.is_wolf = np.zeros(self.num_players, dtype=bool)
+        self.is_wolf[self.num_villagers:] = True
+
+        if rng_mode == "legacy":
+            self.rngs = [legacy_random_state(int(seed), self.num_players) for seed in self.seeds]
+        else:
+            self.rngs = [np.random.default_rng(int(seed)) for seed in self.seeds]
+
+        # initial beliefs: uniform over the other players, werewolves ignore their pack
+        beliefs = np.ones((self.num_players, self.num_players), dtype=self.dtype)
+        np.fill_diagonal(beliefs, np.nan)
+        beliefs[self.num_villagers:, self.num_villagers:] = np.nan
+        beliefs = softmax(beliefs, axis=-1)
+        self.beliefs = np.repeat(beliefs[None], self.num_games, axis=0)
+
+        self.alive = np.ones((self.num_games, self.num_players), dtype=bool)
+        self.focus = np.zeros(self.num_games, dtype=bool)
+        self.save_beliefs = np.full((self.num_games, self.num_players), np.nan, dtype=self.dtype)
+        self.rounds = np.zeros(self.num_games, dtype=int)
+        self.last_turn_little_girl = np.zeros(self.num_games, dtype=int)
+        self.first_lynched = np.full(self.num_games, -1)
+
+        # position of the running games in the results
+        self.game_index = np.arange(self.num_games)
+        self.results = [None] * self.num_games
+
+    def _draw(self, counts):
+        """
+        draws uniformly in [0, counts[k]) with the generator of each running game k
+        """
+        return np.array([draw_integers(rng, c) for rng, c in zip(self.rngs, counts)], dtype=int)
+
+    def _is_wolf(self):
+        return np.broadcast_to(self.is_wolf, self.alive.shape)
+
+    def get_villagers_count(self):
+        """
+        returns (K,) int, current number of villagers in each running game
+        """
+        return (self.alive & ~self.is_wolf).sum(axis=1)
+
+    def get_wolves_count(self):
+        """
+        returns (K,) int, current number of werewolves in each running game
+        """
+        return (self.alive & self.is_wolf).sum(axis=1)
+
+    def check_game_over(self):
+        """
+        Same rule as Game.check_game_over for every running game
+
+        returns (K,) object array of None, "werewolves" or "Villagers"
+        """
+        villagers, wolves = self.get_villagers_count(), self.get_wolves_count()
+        winner = np.full(len(villagers), None, dtype=object)
+        winner[wolves == 0] = "Villagers"
+        winner[villagers <= wolves] = "werewolves"
+        return winner
+
+    def little_girl_alive(self):
+        """
+        returns (K,) bool, True where the Little Girl is alive
+        """
+        return self.alive[:, 0] & self.is_little_girl
+
+    def night_shift(self):
+        """
+        Werewolves of every running game eliminate the villager with the maximal pack score,
+        then the Little Girl may spy on the pack.
+
+        returns (K,) int, ids of the eliminated villagers
+        """
+        games = np.arange(len(self.alive))
+        alive_wolf = self.alive & self.is_wolf
+        alive_villager = self.alive & ~self.is_wolf
+
+        # Aggregate the beliefs of the alive werewolves on the alive villagers
+        wolves = slice(self.num_villagers, self.num_players)
+        wolf_beliefs = np.where(alive_wolf[:, wolves, None], self.beliefs[:, wolves, :], np.nan)
+
+        ties, counts = night_targets(wolf_beliefs, alive_villager, self.pack_rule, self.tie_rtol)
+        eliminated = pick_tie(ties, self._draw(counts))
+        self.alive[games, eliminated] = False
+
+        # the Little Girl spies with probability p_focus and focuses a random alive werewolf
+        spying = np.zeros(len(games), dtype=bool)
+        for k in np.flatnonzero(self.little_girl_alive() & ~self.focus):
+            rng = self.rngs[k]
+            if rng.random() < self.p_focus:
+                wolves_id = np.flatnonzero(alive_wolf[k])
+                random_wolf_id = wolves_id[draw_integers(rng, len(wolves_id))]
+                self.save_beliefs[k] = self.beliefs[k, 0]
+                self.beliefs[k, 0] = np.nan
+                self.beliefs[k, 0, random_wolf_id] = 1
+                self.focus[k] = True
+                spying[k] = True
+
+        # Otherwise just take the new death into account
+        rows = self.alive.copy()
+        rows[:, 0] &= ~spying
+        k, i = np.nonzero(rows)
+        self.beliefs[k, i, eliminated[k]] = np.nan
+        self.beliefs[rows] = softmax(self.beliefs[rows], axis=-1)
+
+        return eliminated
+
+    def vote(self):
+        """
+        every alive player of every running game votes for one of the players it wants to kill the most,
+        ties are broken uniformly at random in increasing player order
+
+        returns (K, N) int, votes of the players, -1 for dead players
+        """
+        splits = np.cumsum(self.alive.sum(axis=1))[:-1]
+        def draw(counts):
+            return np.concatenate([draw_integers(rng, c) for rng, c in zip(self.rngs, np.split(counts, splits))])
+
+        votes = np.full(self.alive.shape, -1)
+        votes[self.alive] = cast_votes(self.beliefs[self.alive], draw, self.tie_rtol)
+        return votes
+
+    def day_shift(self):
+        """
+        All the alive players vote, the player with the most votes is eliminated in every running game
+        and the beliefs are updated.
+
+        returns (K,) int, ids of the eliminated players
+        """
+        games = np.arange(len(self.alive))
+        votes = self.vote()
+
+        # Count votes and eliminate player with most votes
+        vote_counts = np.zeros(self.alive.shape, dtype=int)
+        voter_games, _ = np.nonzero(self.alive)
+        np.add.at(vote_counts, (voter_games, votes[self.alive]), 1)
+        ties, counts = max_ties(vote_counts)
+        eliminated = pick_tie(ties, self._draw(counts))
+        self.alive[games, eliminated] = False
+
+        # role code of the first player lynched in each game
+        roles = np.where(self.is_wolf[eliminated], WEREWOLF, np.where((eliminated == 0) & self.is_little_girl, LITTLE_GIRL, VILLAGER))
+        self.first_lynched = np.where(self.first_lynched < 0, roles, self.first_lynched)
+
+        self.beliefs[games, :, eliminated] = np.nan
+
+        # Little Girl was focusing a werewolf and killed it during the day vote
+        restore = self.little_girl_alive() & self.focus
+        restore &= np.isnan(self.beliefs[:, 0]).all(axis=1)
+        for k in np.flatnonzero(restore):
+            alive_id = np.flatnonzero(self.alive[k])
+            self.beliefs[k, 0, alive_id] = softmax(self.save_beliefs[k, alive_id])
+            self.focus[k] = False
+
+        eta, _lambda, mu, gamma = self.params.T
+        apply_day_votes(self.beliefs, self._is_wolf(), self.alive, votes, eliminated, eta, _lambda, mu, gamma)
+
+        return eliminated
+
+    def _finish_games(self):
+        """
+        end of a phase: counts the Little Girl turn, stores the stats of the games
+        that are over and drops them from the batch
+
+        returns int, number of games still running
+        """
+        self.last_turn_little_girl += self.little_girl_alive()
+
+        winner = self.check_game_over()
+        over = winner != None
+        for k in np.flatnonzero(over):
+            self.results[self.game_index[k]] = {
+                'rounds': int(self.rounds[k]),
+                'winner': winner[k],
+                'initial_wolves': self.num_wolves,
+                'initial_villagers': self.num_villagers,
+                'last_turn_little_girl': int(self.last_turn_little_girl[k]),
+                'remaining_villagers': int(self.get_villagers_count()[k]),
+                'remaining_wolves': int(self.get_wolves_count()[k]),
+                'first_lynched': int(self.first_lynched[k]),
+            }
+
+        if over.any():
+            keep = ~over
+            self.rngs = [rng for rng, running in zip(self.rngs, keep) if running]
+            for name in ('beliefs', 'alive', 'focus', 'save_beliefs', 'rounds', 'last_turn_little_girl', 'first_lynched', 'params', 'game_index'):
+                setattr(self, name, getattr(self, name)[keep])
+        return len(self.game_index)
+
+    def play(self):
+        """
+        plays all the games of the batch until they are over
+
+        returns list of dict, the stats of each game in the order of the seeds
+        """
+        while len(self.game_index) > 0:
+            self.night_shift()
+            if self._finish_games() == 0:
+                break
+            self.day_shift()
+            if self._finish_games() == 0:
+                break
+            self.rounds += 1
+        return self.results
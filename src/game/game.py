@@ -1,10 +1,26 @@
 from agent import Villager, Werewolf, LittleGirl
-from utils import softmax
+from utils import softmax, draw_integers
+from .kernels import WEREWOLF, LITTLE_GIRL, apply_day_votes, get_pack_rule, max_ties, pack_scores, pick_tie, legacy_random_state
+from .registry import PlayerRegistry, AlivePlayers
+from .store import BELIEF_STORES
+from .snapshot import GameSnapshot, set_rng_state
+from .streams import CommonRandomNumbers
+from utils.profiling import NO_PROFILING, profiled_method
 import numpy as np
 
+ENGINES = ("agents", "matrix")
+RNG_MODES = ("generator", "legacy", "crn", "antithetic")
+# rng modes drawing from keyed common random numbers, see game.streams
+COMMON_RNG_MODES = ("crn", "antithetic")
+VOTE_MODES = ("kernel", "agents", "random")
+DTYPES = ("float64", "float32")
+
+# per-round belief statistics available through Game.round_metrics
+ROUND_METRICS = ("avg_belief_villagers_on_werewolves", "avg_belief_werewolves_on_little_girl", "avg_belief_villagers_on_little_girl")
+
 class Game():
 
-    def __init__(self, num_villagers=1, num_wolves=1, update_params = [15, 15, 2, 0.3], p_focus=None, seed=42): # [lambda, eta, beta, gamma]
+    def __init__(self, num_villagers=1, num_wolves=1, update_params = [15, 15, 2, 0.3], p_focus=None, seed=42, engine="agents", rng_mode="generator", agent_streams=False, vote_mode="kernel", pack_rule="sum", profiler=None, belief_store="dense", dtype="float64", tie_rtol=0.0, store=None): # [lambda, eta, beta, gamma]
         """
         init a game instance.
         num_villagers:  int     number of villagers in the game
@@ -15,50 +31,209 @@ class Game():
                                 beta: revenge factor for being voted against
                                 gamma: maximum allowed kill will shift
         seed:           int     random seed for reproducibility
+        engine:         str     "agents" updates the belief store agent by agent,
+                                "matrix" updates the whole N x N belief store with array operations.
+                                Both engines give the same game for a given seed.
+        rng_mode:       str     "generator" draws every random decision from a Generator owned by the game,
+                                "legacy" reproduces the games of the former global np.random.seed implementation,
+                                "crn" draws every decision from common random numbers keyed by (seed, stream, round)
+                                (see game.streams): games with the same seed and other update_params share the random
+                                number of each decision, "antithetic" plays the mirror game of "crn" (u -> 1 - u).
+                                Both give every agent its own stream.
+        agent_streams:  bool    give each agent its own child stream, spawned from the game seed, for its
+                                decisions (vote tie-breaks, Little Girl spying) instead of sharing the game stream
+        vote_mode:      str     "kernel" computes all the day votes in one pass over the belief store,
+                                "agents" asks every agent for its vote (reference path for regression checks).
+                                Both modes draw the tie-breaks in the same order and give the same votes.
+                                "random" is the random-voting baseline: the village lynches a uniformly random
+                                alive player, whatever the beliefs. Its outcome is known exactly, see game.analytic.
+        pack_rule:      str     how the werewolves aggregate their beliefs to pick their night victim:
+                                "sum" (default), "max", "majority" (see game.kernels.PACK_RULES), or a callable
+                                mapping the (W, N) belief rows of the alive werewolves to (N,) target scores
+        profiler:       PhaseProfiler   if set, records the time spent in each phase of the game (night, night_targeting,
+                                night_update, day, voting, day_update, metrics, softmax), see utils.profiling.
+                                None disables the instrumentation.
+        belief_store:   str     "dense" keeps the N x N float64 belief store, "palette" a compressed store about
+                                8 times smaller (see game.store.PaletteBeliefStore) for the largest games.
+                                Both stores give the same game; the palette store needs the matrix engine.
+        dtype:          str     "float64" or "float32": dtype of the belief store, of the updates and of the softmax.
+                                float32 halves the memory and bandwidth but changes the games: see tie_rtol,
+                                and simulation.validate_dtype to measure how often the outcome differs.
+        tie_rtol:       float   tie policy of the day votes and of the night targeting: beliefs (or pack scores)
+                                within tie_rtol * |max| of the maximum are ties, broken uniformly at random.
+                                0 (default) keeps exact equality in the belief dtype; in float32 values closer than
+                                ~1e-7 relative are then merged into ties that float64 would have told apart.
+        store:                  belief store of the kind belief_store holding the beliefs to start from instead of
+                                the initial ones, used by GameSnapshot.fork
         """
-        np.random.seed(seed)  # Set random seed
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+        if rng_mode not in RNG_MODES:
+            raise ValueError(f"Unknown rng_mode {rng_mode!r}, expected one of {RNG_MODES}")
+        if vote_mode not in VOTE_MODES:
+            raise ValueError(f"Unknown vote_mode {vote_mode!r}, expected one of {VOTE_MODES}")
+        if np.dtype(dtype).name not in DTYPES:
+            raise ValueError(f"Unknown dtype {dtype!r}, expected one of {DTYPES}")
+        if belief_store not in BELIEF_STORES:
+            raise ValueError(f"Unknown belief_store {belief_store!r}, expected one of {BELIEF_STORES}")
+        if belief_store != "dense" and engine != "matrix":
+            raise ValueError(f"The {belief_store!r} belief store needs the matrix engine")
         self.seed                  = seed
         self.num_villagers         = num_villagers
         self.num_wolves            = num_wolves
         self.num_players           = self.num_villagers + self.num_wolves
         self.is_little_girl        = (p_focus is not None)
         self.p_focus               = p_focus
-        self._eta, self._lambda, self._mu, self._gamma = update_params 
+        self.engine                = engine
+        self.rng_mode              = rng_mode
+        self.agent_streams         = agent_streams
+        self.vote_mode             = vote_mode
+        self.pack_rule             = get_pack_rule(pack_rule)
+        self.profiler              = profiler
+        self.belief_store          = belief_store
+        self.dtype                 = np.dtype(dtype)
+        self.tie_rtol              = tie_rtol
+        # parameters in the belief dtype, so that the agents engine adds them like the matrix engine
+        self._eta, self._lambda, self._mu, self._gamma = (self.dtype.type(p) for p in update_params)
         
 
-        #dictionaries containing active werewolves and villagers in the game
-        self.werewolves = {}
-        self.villagers = {}
+        # Random streams: one for the game, optionally one per agent
+        self.seed_sequence = np.random.SeedSequence(seed)
+        if self.rng_mode == "legacy":
+            self.rng = legacy_random_state(seed, self.num_players)
+        elif self.rng_mode in COMMON_RNG_MODES:
+            self.rng = CommonRandomNumbers(self.seed_sequence, self.num_players, antithetic=(rng_mode == "antithetic"))
+        else:
+            self.rng = np.random.default_rng(self.seed_sequence)
+        agent_rngs = self.agent_rngs()
+
+        # Struct-of-arrays state of the players: roles, alive mask and the N x N belief store (row i = beliefs of player i)
+        self.registry   = PlayerRegistry(self.num_villagers, self.num_wolves, self.is_little_girl, belief_store, self.dtype, store)
+        self.roles      = self.registry.roles
+        self.alive_mask = self.registry.alive
+
+        # Agents are thin views over the registry, one per player
+        self.players = []
+        for i in range(self.num_players):
+            if self.roles[i] == LITTLE_GIRL:
+                self.players.append(LittleGirl(self.registry, i, self.p_focus, agent_rngs[i]))
+            elif self.roles[i] == WEREWOLF:
+                self.players.append(Werewolf(self.registry, i, agent_rngs[i]))
+            else:
+                self.players.append(Villager(self.registry, i, agent_rngs[i]))
 
-        # lists including eliminated werewolves and villagers
-        self.dead_werewolves = []
-        self.dead_villagers = []
-        
-        self.villagers_id = range(self.num_villagers) #list ids of the villagers
-        self.werewolves_id = range(self.num_villagers, self.num_players) #list ids of the werewolfes
+        #dictionaries containing active werewolves and villagers in the game, backed by the registry
+        self.villagers = AlivePlayers(self.registry, self.players, role=False)
+        self.werewolves = AlivePlayers(self.registry, self.players, role=True)
 
-        if self.is_little_girl:
-            self.villagers[self.villagers_id[0]] = LittleGirl(self.villagers_id[0], self.num_players, self.p_focus, self.seed)
-            for i in self.villagers_id[1:]:
-                self.villagers[i] = Villager(i, self.num_players, self.seed)
-        else:    
-            for i in self.villagers_id:
-                self.villagers[i] = Villager(i, self.num_players, self.seed)
+        # Alive dictionary
+        self.alive = AlivePlayers(self.registry, self.players)
 
-        for j in self.werewolves_id:
-            self.werewolves[j] = Werewolf(j, self.num_players, self.werewolves_id, self.villagers_id, self.seed)
+    @property
+    def store(self):
+        return self.registry.store
+
+    @property
+    def beliefs(self):
+        """
+        dense matrix of the belief store, None for a compressed store
+        """
+        return self.registry.beliefs
+
+    def snapshot(self, stats=None):
+        """
+        frozen copy of the position of the game, see game.snapshot.GameSnapshot
+        stats: dict   statistics of the game loop at this position, kept with the snapshot
+
+        returns GameSnapshot
+        """
+        return GameSnapshot(self, stats)
+
+    def restore(self, snapshot, continuation=None):
+        """
+        puts the game back at the position of a snapshot of a game with the same configuration,
+        the belief store is shared with the snapshot until the first write
+        snapshot:     GameSnapshot
+        continuation: int or None   None restores the random streams of the snapshot too, an int
+                                    switches to the streams of that continuation (see GameSnapshot.stream)
+        """
+        self.registry.load_state(snapshot.registry)
+        self.registry.store = snapshot.store.fork()
+
+        if continuation is None:
+            set_rng_state(self.rng, snapshot.rng)
+            if snapshot.agent_rngs is not None:
+                for player, state in zip(self.players, snapshot.agent_rngs):
+                    set_rng_state(player.rng, state)
+            return
+
+        self.seed_sequence = snapshot.stream(continuation)
+        if self.rng_mode == "legacy":
+            self.rng = np.random.RandomState(np.random.MT19937(self.seed_sequence))
+        elif self.rng_mode in COMMON_RNG_MODES:
+            rng = CommonRandomNumbers(self.seed_sequence, self.num_players, antithetic=(self.rng_mode == "antithetic"))
+            rng.set_state(snapshot.rng)
+            self.rng = rng
+        else:
+            self.rng = np.random.default_rng(self.seed_sequence)
+        for player, rng in zip(self.players, self.agent_rngs()):
+            player.rng = rng
+
+    def phase(self, name):
+        """
+        context recording a phase in the profiler of the game, does nothing without profiler
+        name: str   phase name
+        """
+        if self.profiler is None:
+            return NO_PROFILING
+        return self.profiler.phase(name)
+
+    def agent_rngs(self):
+        """
+        streams of the agents: their own streams of the common random numbers, their own child streams
+        with agent_streams, the game stream otherwise
+
+        returns list of num_players streams
+        """
+        if self.rng_mode in COMMON_RNG_MODES:
+            return [self.rng.stream(i) for i in range(self.num_players)]
+        if self.agent_streams:
+            return self.spawn(self.num_players)
+        return [self.rng] * self.num_players
+
+    def spawn(self, n):
+        """
+        spawns independent child random streams from the seed of the game
+
+        returns list of n Generators
+        """
+        return [np.random.default_rng(child) for child in self.seed_sequence.spawn(n)]
+
+    @property
+    def villagers_id(self):
+        """
+        ids of the alive villagers in increasing order
+
+        returns (n,) int array
+        """
+        return self.registry.alive_ids(role=False)
+
+    @property
+    def werewolves_id(self):
+        """
+        ids of the alive werewolves in increasing order
+
+        returns (n,) int array
+        """
+        return self.registry.alive_ids(role=True)
 
-        # Alive dictionary
-        self.alive = self.villagers.copy()
-        self.alive.update(self.werewolves.copy())
-        
     def get_villagers_count(self):
         """
         gets current number of villagers
 
         returns int
         """
-        return self.num_villagers - len(self.dead_villagers)
+        return self.registry.count(role=False)
     
     def get_wolves_count(self):
         """
@@ -66,7 +241,7 @@ class Game():
 
         returns int
         """
-        return self.num_wolves - len(self.dead_werewolves)
+        return self.registry.count(role=True)
     
     def get_agents_count(self):
         """
@@ -81,19 +256,14 @@ class Game():
         elimintes a werewolf with specified id
         id: int  id of the werewolf to be eliminted
         """
-        self.dead_werewolves.append(self.werewolves.pop(id))
-        self.werewolves_id = list(self.werewolves.keys())
-        self.alive.pop(id)
+        self.registry.eliminate(id)
 
     def eliminate_villager(self, id):
         """
         eliminates a villager with specific id
         id: int  id of the villager to be eliminated
         """
-        self.dead_villagers.append(self.villagers[id])
-        self.villagers.pop(id)
-        self.villagers_id = list(self.villagers.keys())
-        self.alive.pop(id)
+        self.registry.eliminate(id)
 
     def calc_inf_metric(self):
         """
@@ -104,10 +274,12 @@ class Game():
         """
         s_w = 0  #S_werewolves  for current round. See section 3.5 of report
         s_v = 0  #S_villagers  for current round. See section  3.6 of report
-        for k, v in self.villagers:
-            mean_w = np.nanmean(v.beliefs[self.werewolves_id])
+        alive_wolf = self.alive_mask & self.registry.is_wolf
+        alive_villager = self.alive_mask & ~self.registry.is_wolf
+        for k, v in self.villagers.items():
+            mean_w = np.nanmean(v.beliefs[alive_wolf])
             s_w = s_w + mean_w
-            mean_v = np.nanmean(v.beliefs[self.villagers_id])
+            mean_v = np.nanmean(v.beliefs[alive_villager])
             s_v = s_v + mean_v
         return {"s_werewolves": s_w, "s_villagers": s_v}
     
@@ -119,8 +291,8 @@ class Game():
 
         """
         total_entropy = 0
-        for k, v in self.villagers:
-            filtered_belief = [x for x in v.beliefs if x is not None]
+        for k, v in self.villagers.items():
+            filtered_belief = [x for x in v.beliefs if not np.isnan(x)]
             if len(filtered_belief) == 0:
                 continue
             belief_array = np.array(filtered_belief)
@@ -128,6 +300,39 @@ class Game():
             total_entropy = total_entropy + entropy
         return {"entropy": total_entropy}
 
+    @profiled_method("metrics")
+    def round_metrics(self, metrics=ROUND_METRICS):
+        """
+        per-round belief statistics, computed with array reductions over the belief store.
+        The Little Girl is left out of the observers.
+        avg_belief_villagers_on_werewolves:     mean over the werewolves of the beliefs of the villagers on them,
+                                                summed over the villagers and divided by the number of villagers
+        avg_belief_werewolves_on_little_girl:   mean belief of the werewolves on the player 0
+        avg_belief_villagers_on_little_girl:    mean belief of the villagers on the player 0
+        metrics: iterable of names from ROUND_METRICS
+
+        returns dict name -> float
+        """
+        is_wolf = self.registry.is_wolf
+        observers = self.alive_mask & (self.roles != LITTLE_GIRL)
+        wolf_rows = self.registry.rows[observers & is_wolf]
+        villager_rows = self.registry.rows[observers & ~is_wolf]
+
+        values = {}
+        for name in metrics:
+            if name == "avg_belief_villagers_on_werewolves":
+                beliefs = self.store.take(villager_rows, np.flatnonzero(self.alive_mask & is_wolf)) / self.get_villagers_count()
+                # cumsum adds the villagers one after the other, like the former per-villager loop
+                total = np.cumsum(beliefs, axis=0)[-1] if len(beliefs) else np.zeros(beliefs.shape[1])
+                values[name] = np.mean(total)
+            elif name == "avg_belief_werewolves_on_little_girl":
+                values[name] = np.mean(self.store.take(wolf_rows, [0]))
+            elif name == "avg_belief_villagers_on_little_girl":
+                values[name] = np.mean(self.store.take(villager_rows, [0]))
+            else:
+                raise ValueError(f"Unknown metric {name!r}, expected one of {ROUND_METRICS}")
+        return values
+
     def check_game_over(self):
         """
         Check if game is over and return winner
@@ -143,6 +348,18 @@ class Game():
             return "Villagers"
         return None
                 
+    def restore_little_girl(self, player):
+        """
+        Little Girl was focusing a werewolf and killed it during the day vote:
+        she gets back the beliefs she had before focusing, restricted to the alive players
+        player: LittleGirl
+        """
+        player.focus = False
+        beliefs = player.beliefs
+        beliefs[self.alive_mask] = softmax(player.save_beliefs[self.alive_mask])
+        player.beliefs = beliefs
+
+    @profiled_method("day_update")
     def update_beliefs_after_elimination(self, eliminated_id, voters_dict, eliminated_type):
         """
         Updates beliefs of all agents after an elimination
@@ -150,19 +367,22 @@ class Game():
         voters_dict: dict - Dictionary mapping voter IDs to their votes
         eliminated_type: str - "Werewolf" or "Villager"
         """
+        if self.engine == "matrix":
+            return self._update_beliefs_after_elimination_matrix(eliminated_id, voters_dict)
+
+        is_wolf = self.registry.is_wolf
+        alive_wolf = self.alive_mask & is_wolf
 
         # Update players' beliefs
         for player in self.alive.values():
             player.beliefs[eliminated_id] = np.nan
 
             # If the player is a villager
-            if player in list(self.villagers.values()):
+            if not is_wolf[player.id]:
 
                 # Little Girl was focusing a werewolf and killed it during the day vote
                 if isinstance(player, LittleGirl) and np.isnan(player.beliefs).all():
-                    player.focus = False
-                    alive_id = list(self.villagers.keys()) + list(self.werewolves.keys())
-                    player.beliefs[alive_id] = softmax(player.save_beliefs[alive_id])
+                    self.restore_little_girl(player)
  
                 for voter_id, vote in voters_dict.items():
 
@@ -190,16 +410,15 @@ class Game():
             # If the player is a werewolf
             else:
                 for voter_id, vote in voters_dict.items():
-                    active_werewolves = list(self.werewolves.keys())
                     
-                    if (voter_id == player.id) or (voter_id in active_werewolves) or (voter_id == eliminated_id):
+                    if (voter_id == player.id) or alive_wolf[voter_id] or (voter_id == eliminated_id):
                         continue
 
                     old_belief = player.beliefs[voter_id]
                     new_belief = old_belief
 
                     """ Death vote """
-                    new_belief += self._eta * ( (vote in active_werewolves) - (vote not in active_werewolves) )
+                    new_belief += self._eta * ( int(alive_wolf[vote]) - int(not alive_wolf[vote]) )
 
                     """ Revenge vote """
                     new_belief += self._lambda * (vote == player.id) 
@@ -213,12 +432,58 @@ class Game():
                                                    old_belief + self._gamma * 1e24)
             
             # normalize the beliefs of the player
-            player.beliefs = softmax(player.beliefs)
+            player.beliefs[:] = softmax(player.beliefs)
             # if player.id == 0:
             #     print([id for id in range(self.num_players) if id not in list(self.alive.keys())])
             #     print(player.beliefs[[id for id in range(self.num_players) if id not in list(self.alive.keys())]])
 
+    def _update_beliefs_after_elimination_matrix(self, eliminated_id, voters_dict):
+        """
+        Matrix engine version of update_beliefs_after_elimination, see game.kernels.apply_day_votes
+        eliminated_id: int - ID of the eliminated player
+        voters_dict: dict - Dictionary mapping voter IDs to their votes
+        """
+        little_girl = self.alive.get(0)
+        if isinstance(little_girl, LittleGirl):
+            beliefs = little_girl.beliefs
+            beliefs[eliminated_id] = np.nan
+            little_girl.beliefs = beliefs
+            if np.isnan(beliefs).all():
+                self.restore_little_girl(little_girl)
+
+        votes = np.full(self.num_players, -1)
+        votes[list(voters_dict.keys())] = list(voters_dict.values())
+
+        # rows of the alive players, block by block for a compressed store
+        observers = self.registry.alive_ids()
+        rows = self.registry.rows[observers]
+        for block, beliefs in self.store.blocks(rows):
+            beliefs[:, eliminated_id] = np.nan
+            apply_day_votes(beliefs[None], self.registry.is_wolf[None], self.alive_mask[None], votes[None],
+                            np.array([eliminated_id]), self._eta, self._lambda, self._mu, self._gamma,
+                            observers=observers[block])
+            self.store.write(rows[block], beliefs)
+
+    def little_girl_spies(self, player):
+        """
+        At night the Little Girl may spy on the werewolves with probability p_focus:
+        she then saves her beliefs and focuses a random werewolf
+        player: LittleGirl
 
+        returns bool, True if she started focusing
+        """
+        if (not player.focus) and player.rng.random() < player.p_focus:
+            player.save_beliefs = player.beliefs.copy()
+            werewolves_id = self.werewolves_id
+            random_wolf_id = werewolves_id[draw_integers(player.rng, len(werewolves_id))]
+            beliefs = np.full(self.num_players, np.nan, dtype=self.dtype)
+            beliefs[random_wolf_id] = 1
+            player.beliefs = beliefs
+            player.focus = True
+            return True
+        return False
+
+    @profiled_method("night_update")
     def update_beliefs_after_night_vote(self, eliminated_id):
         """
         Updates beliefs of all agents after an elimination
@@ -226,23 +491,62 @@ class Game():
         voters_dict: dict - Dictionary mapping voter IDs to their votes
         eliminated_type: str - "Werewolf" or "Villager"
         """
+        if self.engine == "matrix":
+            # only the Little Girl (id 0) draws random numbers here, the other rows are normalized together
+            rows = self.alive_mask.copy()
+            little_girl = self.alive.get(0)
+            if isinstance(little_girl, LittleGirl) and self.little_girl_spies(little_girl):
+                rows[0] = False
+            rows = self.registry.rows[rows]
+            for block, beliefs in self.store.blocks(rows):
+                beliefs[:, eliminated_id] = np.nan
+                self.store.write(rows[block], softmax(beliefs, axis=-1))
+            return
 
         # Update players' beliefs
         for player in self.alive.values():
 
             # If the player is the Little Girl and she cheated
-            if (isinstance(player, LittleGirl)) and (not player.focus) and np.random.random() < player.p_focus:
-                    player.save_beliefs = player.beliefs.copy()
-                    random_wolf_id = np.random.choice(self.werewolves_id)
-                    player.beliefs = np.ones_like(player.beliefs) * np.nan
-                    player.beliefs[random_wolf_id] = 1
-                    player.focus = True
+            if isinstance(player, LittleGirl) and self.little_girl_spies(player):
+                continue
+
             # Otherwise just take the new death into account
-            else:
-                player.beliefs[eliminated_id] = np.nan
-                player.beliefs = softmax(player.beliefs)
+            player.beliefs[eliminated_id] = np.nan
+            player.beliefs[:] = softmax(player.beliefs)
            
 
+    @profiled_method("voting")
+    def cast_votes(self):
+        """
+        day votes of all the alive players. Each player votes for one of the players it wants to kill the most,
+        the tie-breaks are drawn by the players in increasing id order, from their own stream
+
+        returns (voters, votes): (n,) int ids of the alive players in increasing order, (n,) int their votes,
+        both empty in the random vote mode where nobody votes
+        """
+        voters = self.registry.alive_ids()
+        if self.vote_mode == "random":
+            return voters[:0], voters[:0]
+        if self.vote_mode == "agents":
+            return voters, np.array([self.players[i].vote(self.tie_rtol) for i in voters], dtype=int)
+
+        def draw(voters, counts):
+            if self.rng_mode in COMMON_RNG_MODES:
+                return self.rng.integers(voters, counts)
+            if self.agent_streams:
+                return np.array([draw_integers(self.players[i].rng, c) for i, c in zip(voters, counts)], dtype=int)
+            return draw_integers(self.rng, counts)
+
+        # the store finds the maximal entries of the voters' rows (on the codes for a compressed store),
+        # the tie ranks are drawn block by block in voter order
+        votes = np.empty(len(voters), dtype=int)
+        for start in range(0, len(voters), self.store.block_rows):
+            block = voters[start:start + self.store.block_rows]
+            ties, counts = self.store.max_ties(self.registry.rows[block], self.tie_rtol)
+            votes[start:start + len(block)] = pick_tie(ties, draw(block, counts))
+        return voters, votes
+
+    @profiled_method("day")
     def day_shift(self):
         """
         During day shift, all players vote to eliminate one player.
@@ -250,27 +554,28 @@ class Game():
         Returns the eliminated player or None if no one was eliminated.
         """
         # Collect votes from all players with voter IDs
-        votes = {}
-        for player in self.alive.values():
-            votes[player.id] = player.vote()
+        voters, votes = self.cast_votes()
         
         # Count votes and eliminate player with most votes
-        if len(votes) > 0:
-            vote_counts = np.bincount([v for v in votes.values()])
-            max_votes = np.max(vote_counts)
+        if len(votes) > 0 or self.vote_mode == "random":
+            if self.vote_mode == "random":
+                candidates = self.registry.alive_ids()
+            else:
+                vote_counts = np.bincount(votes)
+                max_votes = np.max(vote_counts)
 
-            # Get all players with maximum votes
-            candidates = np.where(vote_counts == max_votes)[0]
+                # Get all players with maximum votes
+                candidates = np.where(vote_counts == max_votes)[0]
 
             # Randomly select one among the candidates
-            eliminated_id = np.random.choice(candidates)
+            eliminated_id = candidates[draw_integers(self.rng, len(candidates))]
             # print(f"Candidates: {candidates}")
             # print(f"Eliminated ID: {eliminated_id}")
             # print(f"werewolves_id: {self.werewolves_id}")
             # print(f"villagers_id: {self.villagers_id}")
 
             target_type = None
-            dead_character = self.alive[eliminated_id]
+            dead_character = self.players[eliminated_id]
             target_type, role = dead_character.type, dead_character.role
             
             if target_type == "Werewolf":
@@ -280,36 +585,38 @@ class Game():
 
             # Update beliefs after elimination
             if target_type:
-                self.update_beliefs_after_elimination(eliminated_id, votes, target_type)
+                self.update_beliefs_after_elimination(eliminated_id, dict(zip(voters.tolist(), votes.tolist())), target_type)
             
             return eliminated_id, role
         
         return None
 
+    @profiled_method("night")
     def night_shift(self):
         """
         During night shift, werewolves collectively vote to eliminate one villager based on their combined beliefs
+        (aggregated by the pack rule)
         Returns the ID of the eliminated villager or None if no one was eliminated
         """
+        if self.rng_mode in COMMON_RNG_MODES:
+            self.rng.next_round()
+
         # Check if there are werewolves and villagers alive
         if len(self.werewolves) > 0 and len(self.villagers) > 0:
-            # Sum up belief vectors of all werewolves
-            combined_beliefs = np.zeros(self.num_players)
-            for werewolf in self.werewolves.values():
-                # Only consider beliefs for villagers
-                for villager_id in self.villagers_id:
-                    combined_beliefs[villager_id] += werewolf.beliefs[villager_id]
-            
-            # Find villagers with maximum combined belief value
-            max_belief = np.max(combined_beliefs)
-            candidates = np.where(combined_beliefs == max_belief)[0]
-            # Filter candidates to only include alive villagers
-            candidates = [c for c in candidates if c in self.villagers_id]
+            with self.phase("night_targeting"):
+                # Aggregate the beliefs of the alive werewolves (in increasing id order) on the alive villagers
+                wolf_rows = self.registry.rows[self.werewolves_id]
+                scores = pack_scores((beliefs for _, beliefs in self.store.blocks(wolf_rows)), self.pack_rule)
+                valid = self.alive_mask & ~self.registry.is_wolf
+                ties, _ = max_ties(np.where(valid, scores, -np.inf), valid, self.tie_rtol)
+
+                # Alive villagers with the maximal pack score
+                candidates = np.flatnonzero(ties)
             
             if len(candidates) > 0:
                 # Randomly select one among the candidates with highest belief
-                eliminated_id = np.random.choice(candidates)
-                eliminated_role = self.alive[eliminated_id].role
+                eliminated_id = candidates[draw_integers(self.rng, len(candidates))]
+                eliminated_role = self.players[eliminated_id].role
                 self.eliminate_villager(eliminated_id)
 
                 # update the beliefs to take the night shift into account
@@ -0,0 +1,219 @@
+import numpy as np
+
+from utils import softmax
+
+# role codes used by the array representation of a game
+VILLAGER, WEREWOLF, LITTLE_GIRL = 0, 1, 2
+
+
+def legacy_random_state(seed, num_players):
+    """
+    RandomState in the state the global generator reached at the end of the legacy Game.__init__:
+    every agent reseeded it with seed + id, the last one being the player N-1, and drew N normal values
+    """
+    rng = np.random.RandomState(seed + num_players - 1)
+    rng.normal(loc=1.0, scale=0, size=num_players)
+    return rng
+
+
+def _as_batch_param(value, num_games, dtype=float):
+    """
+    broadcasts a scalar or per-game update parameter to shape (K, 1, 1), in the dtype of the beliefs
+    """
+    value = np.asarray(value, dtype=dtype)
+    return np.broadcast_to(value.reshape(-1, 1, 1), (num_games, 1, 1))
+
+
+def apply_day_votes(beliefs, is_wolf, alive, votes, eliminated, eta, _lambda, mu, gamma, observers=None):
+    """
+    Whole-array version of the death/revenge/friendship/clip/softmax update of
+    Game.update_beliefs_after_elimination, for a batch of K games of N players.
+    The eliminated player's column must already be NaN (and the Little Girl restored).
+
+    beliefs:    (K, N, N) float   belief matrices, row = observer, updated in place (float64 or float32,
+                                  the update is computed in that dtype)
+                                  ((K, n, N) rows of the observers when observers is given)
+    is_wolf:    (K, N) bool       True for werewolves
+    alive:      (K, N) bool       players alive after the elimination
+    votes:      (K, N) int        day votes, -1 for players that did not vote
+    eliminated: (K,) int          player eliminated during the day, -1 to leave the game untouched
+    eta, _lambda, mu, gamma:      float or (K,) array of update parameters
+    observers:  (n,) int or None  ids of the observers whose rows are given, None for all the players.
+                                  Lets a store update its rows block by block.
+
+    The additions are performed in the same order as the per-agent loop so both
+    paths give bit-identical beliefs.
+    """
+    num_games, num_players = votes.shape
+    ids = np.arange(num_players)
+    if observers is None:
+        observers = ids
+    active = eliminated >= 0
+    elim = np.where(active, eliminated, 0)
+
+    eta, _lambda, mu, gamma = (_as_batch_param(p, num_games, beliefs.dtype) for p in (eta, _lambda, mu, gamma))
+
+    voted = votes >= 0
+    target = np.where(voted, votes, 0)
+    alive_wolf = alive & is_wolf
+    elim_is_wolf = is_wolf[np.arange(num_games), elim]
+
+    # Death vote: villagers suspect the players that voted out a villager and trust the ones that voted out
+    # a werewolf, werewolves suspect anyone who voted against a living member of the pack
+    death_villager = eta[:, :, 0] * np.where(elim_is_wolf, -1, 1)[:, None] * (votes == elim[:, None])
+    death_werewolf = eta[:, :, 0] * np.where(np.take_along_axis(alive_wolf, target, axis=1), 1, -1)
+    death = np.where(is_wolf[:, observers, None], death_werewolf[:, None, :], death_villager[:, None, :]).astype(beliefs.dtype, copy=False)
+
+    # Revenge vote: voter j voted against observer p
+    revenge = _lambda * (votes[:, None, :] == observers[None, :, None])
+
+    # Friendship vote: voter j voted like observer p
+    friendship = -mu * (votes[:, None, :] == votes[:, observers, None])
+
+    old = beliefs
+    new = old + death
+    new += revenge
+    new += friendship
+    new = np.clip(new, old - gamma * 1e24, old + gamma * 1e24)
+
+    # Only the alive observers update their beliefs on the other voters, werewolves ignore their pack
+    counted = voted & (ids[None, :] != elim[:, None]) & active[:, None]
+    counted = np.where(is_wolf[:, observers, None], (counted & ~alive_wolf)[:, None, :], counted[:, None, :])
+    mask = alive[:, observers, None] & counted & (observers[:, None] != ids[None, :])
+    np.copyto(beliefs, new, where=mask)
+
+    # normalize the beliefs of the alive players
+    rows = (alive & active[:, None])[:, observers]
+    beliefs[rows] = softmax(beliefs[rows], axis=-1)
+
+
+def max_ties(values, valid=None, rtol=0.0):
+    """
+    NaN-aware arg-max with ties along the last axis
+    values: (..., N) float
+    valid:  (..., N) bool or None   entries allowed to be picked
+    rtol:   float                   tie policy: entries within rtol * |max| of the maximum are ties.
+                                    0 keeps exact equality in the dtype of values, where float32 merges
+                                    values that float64 tells apart (see Game tie_rtol)
+
+    returns (ties, counts): (..., N) bool mask of the maximal entries and (...) number of ties
+    """
+    best = np.nanmax(values, axis=-1, keepdims=True)
+    ties = values == best if not rtol else values >= best - rtol * np.abs(best)
+    if valid is not None:
+        ties &= valid
+    return ties, ties.sum(axis=-1)
+
+
+def pick_tie(ties, choice):
+    """
+    index of the choice-th maximal entry along the last axis
+    ties:   (..., N) bool   mask returned by max_ties
+    choice: (...) int       rank of the tie to pick, drawn uniformly in [0, counts)
+    """
+    return np.argmax(np.cumsum(ties, axis=-1) > choice[..., None], axis=-1)
+
+
+def cast_votes(beliefs, draw, rtol=0.0):
+    """
+    day votes of a set of players in one pass over their belief rows: each voter votes for one of the
+    players it wants to kill the most, ties are broken uniformly at random
+    beliefs: (..., N) float   belief rows of the voters, NaN for the players that cannot be voted against
+    draw:    callable         (...) int numbers of ties -> (...) int ranks drawn uniformly in [0, counts),
+                              drawing them in voter order reproduces the per-agent votes
+    rtol:    float            tie policy, see max_ties
+
+    returns (...) int, id of the player each voter votes against
+    """
+    ties, counts = max_ties(beliefs, rtol=rtol)
+    return pick_tie(ties, draw(counts))
+
+
+def pack_sum(wolf_beliefs):
+    """
+    pack aggregation rule: sum of the beliefs of the werewolves on each player
+    wolf_beliefs: (..., W, N) float   belief rows of the werewolves, NaN rows for absent werewolves
+
+    returns (..., N) float, score of each target
+    """
+    return np.nansum(wolf_beliefs, axis=-2)
+
+
+def pack_max(wolf_beliefs):
+    """
+    pack aggregation rule: highest belief of a werewolf on each player, see pack_sum
+    """
+    return np.fmax.reduce(wolf_beliefs, axis=-2)
+
+
+def _majority_votes(wolf_beliefs):
+    """
+    vote of each werewolf for pack_majority, split between the players it hesitates between
+
+    returns (..., W, N) float
+    """
+    best = np.fmax.reduce(wolf_beliefs, axis=-1, keepdims=True)
+    ties = wolf_beliefs == best
+    counts = ties.sum(axis=-1, keepdims=True)
+    return ties / np.maximum(counts, 1)
+
+
+def pack_majority(wolf_beliefs):
+    """
+    pack aggregation rule: every werewolf votes for the player it wants to kill the most,
+    a werewolf hesitating between several players splits its vote between them, see pack_sum
+    """
+    return _majority_votes(wolf_beliefs).sum(axis=-2)
+
+
+# pack aggregation rules of the night vote, by name
+PACK_RULES = {"sum": pack_sum, "max": pack_max, "majority": pack_majority}
+
+
+def get_pack_rule(rule):
+    """
+    pack aggregation rule from its name in PACK_RULES, a callable is returned as is
+    """
+    if callable(rule):
+        return rule
+    if rule not in PACK_RULES:
+        raise ValueError(f"Unknown pack rule {rule!r}, expected one of {tuple(PACK_RULES)} or a callable")
+    return PACK_RULES[rule]
+
+
+def night_targets(wolf_beliefs, valid, rule=pack_sum, rtol=0.0):
+    """
+    candidates of the night vote: the targets with the maximal pack score
+    wolf_beliefs: (..., W, N) float   belief rows of the werewolves, NaN rows for absent werewolves
+    valid:        (..., N) bool       targets that can be eliminated (alive villagers)
+    rule:         callable            pack aggregation rule, (..., W, N) beliefs -> (..., N) scores
+    rtol:         float               tie policy, see max_ties
+
+    returns (ties, counts): see max_ties
+    """
+    scores = np.where(valid, rule(wolf_beliefs), -np.inf)
+    return max_ties(scores, valid, rtol)
+
+
+def pack_scores(blocks, rule=pack_sum):
+    """
+    pack scores from the werewolf belief rows handed block by block, for belief stores that cannot
+    decode all the rows at once. The running scores are carried into each block, so the rows are added
+    in the same order as rule on the whole (W, N) array and the scores are bit-identical.
+    A custom rule gets all the rows concatenated.
+    blocks: iterable of (w, N) float   belief rows of the werewolves, in increasing id order
+    rule:   callable                   pack aggregation rule
+
+    returns (N,) float, score of each target
+    """
+    if rule not in (pack_sum, pack_max, pack_majority):
+        return rule(np.concatenate(list(blocks), axis=-2))
+
+    scores = None
+    for block in blocks:
+        if rule is pack_majority:
+            block = _majority_votes(block)
+        if scores is not None:
+            block = np.concatenate([scores[None], block])
+        scores = block.sum(axis=-2) if rule is pack_majority else rule(block)
+    return scores
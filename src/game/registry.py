@@ -0,0 +1,224 @@
+from collections.abc import Mapping
+from utils import softmax
+from .kernels import VILLAGER, WEREWOLF, LITTLE_GIRL
+from .store import BELIEF_STORES, DenseBeliefStore, PaletteBeliefStore
+import numpy as np
+
+class PlayerRegistry():
+
+    def __init__(self, num_villagers, num_wolves, little_girl=False, belief_store="dense", dtype=np.float64, store=None):
+        """
+        Struct-of-arrays state of the players of a game. Player i is described by entry i of each array,
+        the agent objects are thin views over it.
+        num_villagers:  int     number of villagers, ids 0 .. num_villagers - 1
+        num_wolves:     int     number of werewolves, ids num_villagers .. N - 1
+        little_girl:    bool    the villager 0 is the Little Girl
+        belief_store:   str     "dense" N x N store or "palette" compressed store, see game.store
+        dtype:          dtype   float64 or float32 beliefs
+        store:          belief store of the kind belief_store to start from instead of the initial beliefs
+                        (fork of a snapshot, see game.snapshot)
+
+        ids:            (N,) int     id of each player
+        roles:          (N,) int8    role code (VILLAGER, WEREWOLF or LITTLE_GIRL)
+        is_wolf:        (N,) bool    True for the werewolves
+        alive:          (N,) bool    alive flag
+        focus:          (N,) bool    the player is focusing a werewolf (Little Girl only)
+        rows:           (N,) int     row of each player in the belief store
+        store:          belief store, row rows[i] holds the beliefs of player i on every player
+        beliefs:        (N, N) float matrix of the dense store (property), None for the palette store
+        saved_beliefs:  dict         player id -> beliefs saved before focusing
+        """
+        self.num_villagers = num_villagers
+        self.num_wolves    = num_wolves
+        self.num_players   = num_villagers + num_wolves
+
+        self.ids = np.arange(self.num_players)
+        self.roles = np.full(self.num_players, VILLAGER, dtype=np.int8)
+        self.roles[num_villagers:] = WEREWOLF
+        if little_girl:
+            self.roles[0] = LITTLE_GIRL
+        self.is_wolf = self.roles == WEREWOLF
+        self.alive = np.ones(self.num_players, dtype=bool)
+        self.focus = np.zeros(self.num_players, dtype=bool)
+        self.rows = np.arange(self.num_players)
+        self.dtype = np.dtype(dtype)
+
+        if belief_store not in BELIEF_STORES:
+            raise ValueError(f"Unknown belief store {belief_store!r}, expected one of {BELIEF_STORES}")
+        if store is not None:
+            self.store = store
+        elif belief_store == "dense":
+            self.store = DenseBeliefStore(self.initial_beliefs(self.ids))
+        else:
+            # filled block by block, the dense matrix never exists
+            self.store = PaletteBeliefStore(self.num_players, self.num_players, dtype=self.dtype)
+            for start in range(0, self.num_players, self.store.block_rows):
+                ids = self.ids[start:start + self.store.block_rows]
+                self.store.write(self.rows[ids], self.initial_beliefs(ids))
+        self.saved_beliefs = {}
+
+        # Swap-remove index of the alive players of each team (0: villagers, 1: werewolves): the first
+        # _sizes[team] entries of _members[team] are the alive members, in no particular order,
+        # and _position[i] is the position of player i in the array of its team
+        self._members = [np.flatnonzero(~self.is_wolf), np.flatnonzero(self.is_wolf)]
+        self._sizes = [num_villagers, num_wolves]
+        self._position = np.empty(self.num_players, dtype=int)
+        for members in self._members:
+            self._position[members] = np.arange(len(members))
+        # sorted ids of the alive players of each team and of every player (key None), built on the first
+        # access after an elimination and shared by the later ones
+        self._sorted = {}
+
+    @property
+    def beliefs(self):
+        return getattr(self.store, "matrix", None)
+
+    def state(self):
+        """
+        copy of the state of the players (alive, focus and saved beliefs, alive index), the belief store aside
+
+        returns dict name -> copy
+        """
+        return {
+            'alive': self.alive.copy(),
+            'focus': self.focus.copy(),
+            'saved_beliefs': {id: beliefs.copy() for id, beliefs in self.saved_beliefs.items()},
+            'members': [members.copy() for members in self._members],
+            'sizes': list(self._sizes),
+            'position': self._position.copy(),
+        }
+
+    def load_state(self, state):
+        """
+        restores a state returned by state(), in place: the arrays keep their identity
+        """
+        self.alive[:] = state['alive']
+        self.focus[:] = state['focus']
+        self.saved_beliefs = {id: beliefs.copy() for id, beliefs in state['saved_beliefs'].items()}
+        for members, saved in zip(self._members, state['members']):
+            members[:] = saved
+        self._sizes = list(state['sizes'])
+        self._position[:] = state['position']
+        self._sorted = {}
+
+    def initial_beliefs(self, ids):
+        """
+        initial beliefs of some players: uniform over the other players, werewolves ignore their pack
+        ids: (n,) int
+
+        returns (n, N) float
+        """
+        beliefs = np.ones((len(ids), self.num_players), dtype=self.dtype)
+        beliefs[np.arange(len(ids)), ids] = np.nan
+        beliefs[np.ix_(self.is_wolf[ids], self.is_wolf)] = np.nan
+        return softmax(beliefs, axis=-1)
+
+    def belief_row(self, id):
+        """
+        returns (N,) beliefs of a player: a view for the dense store, a copy to write back
+        with set_belief_row for the palette store
+        """
+        return self.store.row(self.rows[id])
+
+    def set_belief_row(self, id, beliefs):
+        """
+        overwrites the beliefs of a player
+        beliefs: (N,) float
+        """
+        self.store.set_row(self.rows[id], beliefs)
+
+    def is_alive(self, id, role=None):
+        """
+        O(1) membership test
+        id:   int   player id
+        role: None for every player, True for the werewolves, False for the villagers (Little Girl included)
+
+        returns bool
+        """
+        return bool(self.alive[id]) and (role is None or bool(self.is_wolf[id]) == role)
+
+    def members(self, role):
+        """
+        ids of the alive players of a team, in no particular order
+        role: True for the werewolves, False for the villagers
+
+        returns (n,) int view on the index, only valid until the next elimination
+        """
+        return self._members[int(role)][:self._sizes[int(role)]]
+
+    def alive_ids(self, role=None):
+        """
+        ids of the alive players in increasing order, the order in which the players draw their random numbers
+        role: None for every player, True for the werewolves, False for the villagers (Little Girl included)
+
+        returns (n,) int read-only array, shared by the calls until the next elimination
+        """
+        key = None if role is None else bool(role)
+        ids = self._sorted.get(key)
+        if ids is None:
+            ids = np.flatnonzero(self.alive) if role is None else np.sort(self.members(role))
+            ids.flags.writeable = False
+            self._sorted[key] = ids
+        return ids
+
+    def count(self, role=None):
+        """
+        O(1) number of alive players, see is_alive for role
+
+        returns int
+        """
+        if role is None:
+            return self._sizes[0] + self._sizes[1]
+        return self._sizes[int(role)]
+
+    def eliminate(self, id):
+        """
+        marks a player as dead in O(1), the belief row of a dead player is not read anymore
+        id: int  id of the eliminated player
+        """
+        if not self.alive[id]:
+            raise ValueError(f"Player {id} is already dead")
+
+        # swap the player with the last alive member of its team and shrink the team
+        team = int(self.is_wolf[id])
+        members = self._members[team]
+        last = self._sizes[team] - 1
+        position = self._position[id]
+        members[position], members[last] = members[last], id
+        self._position[members[position]] = position
+        self._position[id] = last
+        self._sizes[team] = last
+
+        self.alive[id] = False
+        self.focus[id] = False
+        self.saved_beliefs.pop(id, None)
+        self._sorted = {}
+
+
+class AlivePlayers(Mapping):
+
+    def __init__(self, registry, players, role=None):
+        """
+        Read-only dictionary id -> agent of the alive players of a team, backed by the registry:
+        lookups, membership tests and len are O(1), iteration follows the increasing ids.
+        registry: PlayerRegistry
+        players:  list      agent of each player id
+        role:     None for every player, True for the werewolves, False for the villagers
+        """
+        self.registry = registry
+        self.players = players
+        self.role = role
+
+    def __getitem__(self, id):
+        if id not in self:
+            raise KeyError(id)
+        return self.players[id]
+
+    def __contains__(self, id):
+        return 0 <= id < self.registry.num_players and self.registry.is_alive(id, self.role)
+
+    def __len__(self):
+        return self.registry.count(self.role)
+
+    def __iter__(self):
+        return iter(self.registry.alive_ids(self.role).tolist())
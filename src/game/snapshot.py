@@ -0,0 +1,89 @@
+import copy
+import numpy as np
+
+# Snapshots of a game position, to play many continuations of one shared prefix without replaying it.
+# A snapshot owns read-only copies of the state; the games forked from it share its belief store and
+# copy it on their first write, so forking costs the small per-player arrays only.
+
+
+def rng_state(rng):
+    """
+    state of a Generator or of a legacy RandomState
+    """
+    if isinstance(rng, np.random.Generator):
+        return copy.deepcopy(rng.bit_generator.state)
+    return rng.get_state()
+
+
+def set_rng_state(rng, state):
+    """
+    sets in place the state of a Generator or of a legacy RandomState, see rng_state
+    """
+    if isinstance(rng, np.random.Generator):
+        rng.bit_generator.state = copy.deepcopy(state)
+    else:
+        rng.set_state(state)
+
+
+class GameSnapshot():
+
+    def __init__(self, game, stats=None):
+        """
+        Frozen position of a game: belief store, alive players, Little Girl focus and saved beliefs,
+        and the state of every random stream. Take it between two rounds, where main() leaves the game.
+        game:   Game
+        stats:  dict    statistics of the game loop at this position (see main.play_round), copied,
+                        continued by the forks played with simulation.simulate_from
+
+        config:         dict    arguments rebuilding the same Game
+        registry:       dict    state of the players, see PlayerRegistry.state
+        store:          read-only copy of the belief store
+        rng:            state of the stream of the game
+        agent_rngs:     list    state of the stream of each agent (agent_streams games), None otherwise
+        """
+        self.game_class = type(game)
+        self.config = {
+            'num_villagers': game.num_villagers,
+            'num_wolves': game.num_wolves,
+            'update_params': [float(p) for p in (game._eta, game._lambda, game._mu, game._gamma)],
+            'p_focus': game.p_focus,
+            'seed': game.seed,
+            'engine': game.engine,
+            'rng_mode': game.rng_mode,
+            'agent_streams': game.agent_streams,
+            'vote_mode': game.vote_mode,
+            'pack_rule': game.pack_rule,
+            'belief_store': game.belief_store,
+            'dtype': game.dtype.name,
+            'tie_rtol': game.tie_rtol,
+        }
+        self.stats = copy.deepcopy(stats)
+        self.registry = game.registry.state()
+        self.store = game.store.freeze()
+        self.rng = rng_state(game.rng)
+        self.agent_rngs = [rng_state(player.rng) for player in game.players] if game.agent_streams else None
+        # position of the snapshot in the game, tells apart the continuation streams of two snapshots
+        self.eliminated = int(game.num_players - game.registry.count())
+
+    def stream(self, continuation):
+        """
+        seed sequence of a continuation, spawned from the seed of the game and the position of the snapshot
+        continuation: int
+
+        returns SeedSequence
+        """
+        entropy = np.random.SeedSequence(self.config['seed']).entropy
+        return np.random.SeedSequence(entropy, spawn_key=(self.eliminated, continuation))
+
+    def fork(self, continuation=None, profiler=None):
+        """
+        new game at the position of the snapshot, sharing its belief store until its first write
+        continuation: int or None   None continues the game with its own random streams (the same game as the
+                                    original one), an int draws the continuation from its own streams (see stream)
+        profiler:     PhaseProfiler of the new game
+
+        returns Game
+        """
+        game = self.game_class(**self.config, profiler=profiler, store=self.store.fork())
+        game.restore(self, continuation)
+        return game
@@ -0,0 +1,258 @@
+from .kernels import max_ties
+import numpy as np
+
+# belief stores available through Game(belief_store=...)
+BELIEF_STORES = ("dense", "palette")
+
+# floats per block of rows handed out by the blocks of the stores (32 MB in float64), bounds the temporaries
+# of the block updates
+BLOCK_FLOATS = 2**22
+
+
+class DenseBeliefStore():
+
+    def __init__(self, beliefs, copy_on_write=False):
+        """
+        N x N float64 belief store, row r holds the beliefs of one player on every player.
+        beliefs:       (N, N) float   initial beliefs, kept (not copied) as the store
+        copy_on_write: bool           beliefs are shared (with a snapshot), copied before the first write
+
+        matrix:  (N, N) float   the store itself
+        """
+        self.matrix = beliefs
+        self.copy_on_write = copy_on_write
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes
+
+    def _writable(self):
+        """
+        returns the matrix, copied first if it is still shared
+        """
+        if self.copy_on_write:
+            self.matrix = self.matrix.copy()
+            self.copy_on_write = False
+        return self.matrix
+
+    def freeze(self):
+        """
+        returns a read-only copy of the store, see fork
+        """
+        matrix = self.matrix.copy()
+        matrix.setflags(write=False)
+        return DenseBeliefStore(matrix, copy_on_write=True)
+
+    def fork(self):
+        """
+        returns a store sharing the beliefs of this frozen store until its first write
+        """
+        return DenseBeliefStore(self.matrix, copy_on_write=True)
+
+    def row(self, row):
+        """
+        returns (N,) view on a row, writes go to the store
+        """
+        return self._writable()[row]
+
+    def set_row(self, row, values):
+        self._writable()[row] = values
+
+    def read(self, rows):
+        """
+        returns (n, N) float copy of some rows
+        """
+        return self.matrix[rows]
+
+    def take(self, rows, columns):
+        """
+        returns (n, m) float, entries of some rows on some columns
+        """
+        return self.matrix[np.ix_(rows, columns)]
+
+    def write(self, rows, values):
+        self._writable()[rows] = values
+
+    @property
+    def block_rows(self):
+        return max(1, BLOCK_FLOATS // self.matrix.shape[1])
+
+    def blocks(self, rows):
+        """
+        iterates over (block, beliefs) blocks of at most block_rows rows, in the given order, so that the
+        updates of a block allocate temporaries of the size of the block rather than of the matrix
+        rows: (n,) int
+
+        block is the slice of rows covered, beliefs the (len(block), N) float copy of these rows,
+        written back with write
+        """
+        for start in range(0, len(rows), self.block_rows):
+            block = slice(start, start + self.block_rows)
+            yield block, self.matrix[rows[block]]
+
+    def max_ties(self, rows, rtol=0.0):
+        """
+        maximal entries of some rows, see game.kernels.max_ties
+        """
+        return max_ties(self.matrix[rows], rtol=rtol)
+
+    def to_dense(self):
+        return self.matrix
+
+
+class PaletteBeliefStore():
+
+    def __init__(self, num_rows, num_columns, block_rows=None, dtype=np.float64, copy_on_write=False):
+        """
+        Compressed belief store: every row is a small sorted palette of the distinct values it holds
+        and a one byte code per column pointing in it (code 0 is NaN). The belief dynamics only ever add
+        a handful of increments, so a row holds a few tens of distinct values at most, and the store is
+        about 8 times smaller than the dense float64 one while decoding to exactly the same floats.
+        The codes switch to uint16 if a row ever needs more than 255 values.
+        num_rows, num_columns: int   shape of the store, every entry starts NaN
+        block_rows:            int   rows decoded at once by blocks, defaults to BLOCK_FLOATS / num_columns
+        dtype:                 dtype of the palette values, float64 or float32
+        copy_on_write:         bool   the arrays are shared (with a snapshot), copied before the first write
+
+        codes:   (N, N) uint8    code of each entry, sorted like the values of its row
+        palette: (N, P) float    values of each row, palette[r, 0] is NaN, palette[r, sizes[r]] the largest value
+        sizes:   (N,) int        number of distinct non-NaN values of each row
+        """
+        self.shape = (num_rows, num_columns)
+        self.block_rows = block_rows or max(1, BLOCK_FLOATS // num_columns)
+        self.codes = np.zeros(self.shape, dtype=np.uint8)
+        self.palette = np.full((num_rows, 1), np.nan, dtype=dtype)
+        self.sizes = np.zeros(num_rows, dtype=int)
+        self.copy_on_write = copy_on_write
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.palette.nbytes + self.sizes.nbytes
+
+    def _share(self, codes, palette, sizes):
+        """
+        returns a store over the given arrays, copied before its first write
+        """
+        store = PaletteBeliefStore(*self.shape, block_rows=self.block_rows, dtype=self.palette.dtype, copy_on_write=True)
+        store.codes, store.palette, store.sizes = codes, palette, sizes
+        return store
+
+    def freeze(self):
+        """
+        returns a read-only copy of the store, see fork
+        """
+        arrays = [self.codes.copy(), self.palette.copy(), self.sizes.copy()]
+        for array in arrays:
+            array.setflags(write=False)
+        return self._share(*arrays)
+
+    def fork(self):
+        """
+        returns a store sharing the arrays of this frozen store until its first write
+        """
+        return self._share(self.codes, self.palette, self.sizes)
+
+    @staticmethod
+    def encode(values):
+        """
+        palette encoding of a block of rows
+        values: (n, N) float
+
+        returns (codes, palette, sizes): (n, N) int, (n, P) float, (n,) int
+        """
+        order = np.argsort(values, axis=1)  # NaN sorted last
+        ordered = np.take_along_axis(values, order, axis=1)
+        valid = ~np.isnan(ordered)
+
+        # a new palette entry wherever the sorted value changes
+        new = valid.copy()
+        new[:, 1:] &= ordered[:, 1:] != ordered[:, :-1]
+        ordered_codes = np.cumsum(new, axis=1) * valid
+        sizes = new.sum(axis=1)
+
+        palette = np.full((len(values), sizes.max(initial=0) + 1), np.nan, dtype=values.dtype)
+        r, c = np.nonzero(new)
+        palette[r, ordered_codes[r, c]] = ordered[r, c]
+
+        codes = np.empty_like(ordered_codes)
+        np.put_along_axis(codes, order, ordered_codes, axis=1)
+        return codes, palette, sizes
+
+    def read(self, rows):
+        """
+        returns (n, N) float, decoded rows
+        """
+        return np.take_along_axis(self.palette[rows], self.codes[rows].astype(np.intp), axis=1)
+
+    def row(self, row):
+        """
+        returns (N,) float, decoded copy of a row: write it back with set_row
+        """
+        return self.read([row])[0]
+
+    def set_row(self, row, values):
+        self.write([row], np.asarray(values, dtype=self.palette.dtype)[None])
+
+    def take(self, rows, columns):
+        """
+        returns (n, m) float, entries of some rows on some columns, only those are decoded
+        """
+        codes = self.codes[np.ix_(rows, columns)].astype(np.intp)
+        return np.take_along_axis(self.palette[rows], codes, axis=1)
+
+    def write(self, rows, values):
+        """
+        encodes and stores some rows
+        rows:   (n,) int
+        values: (n, N) float
+        """
+        codes, palette, sizes = self.encode(values)
+        if self.copy_on_write:
+            self.codes, self.palette, self.sizes = self.codes.copy(), self.palette.copy(), self.sizes.copy()
+            self.copy_on_write = False
+
+        width = palette.shape[1]
+        if width > self.palette.shape[1]:
+            extra = np.full((self.shape[0], width - self.palette.shape[1]), np.nan, dtype=self.palette.dtype)
+            self.palette = np.concatenate([self.palette, extra], axis=1)
+        if width > np.iinfo(self.codes.dtype).max + 1:
+            self.codes = self.codes.astype(np.uint16)
+
+        self.codes[rows] = codes
+        self.palette[rows, :width] = palette
+        self.sizes[rows] = sizes
+
+    def blocks(self, rows):
+        """
+        iterates over (block, beliefs) blocks of at most block_rows decoded rows, in the given order
+        rows: (n,) int
+
+        block is the slice of rows covered, beliefs the (len(block), N) float decoded rows
+        """
+        for start in range(0, len(rows), self.block_rows):
+            block = slice(start, start + self.block_rows)
+            yield block, self.read(rows[block])
+
+    def max_ties(self, rows, rtol=0.0):
+        """
+        maximal entries of some rows, computed on the codes without decoding: the largest value of a row
+        has the code sizes[row], and with a tolerance the ties are the codes from the first value within
+        rtol of it. See game.kernels.max_ties
+        """
+        sizes = self.sizes[rows]
+        codes = self.codes[rows]
+        if not rtol:
+            ties = (codes == sizes[:, None]) & (sizes[:, None] > 0)
+        else:
+            # entries past sizes are left over from earlier encodings
+            palette = self.palette[rows, 1:]
+            best = self.palette[rows, sizes]
+            below = (palette < (best - rtol * np.abs(best))[:, None]) & (np.arange(1, palette.shape[1] + 1) <= sizes[:, None])
+            ties = (codes > below.sum(axis=-1)[:, None]) & (codes > 0)
+        return ties, ties.sum(axis=-1)
+
+    def to_dense(self):
+        """
+        returns (N, N) float, the whole decoded store (as large as the dense store)
+        """
+        return self.read(np.arange(self.shape[0]))
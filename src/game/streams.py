@@ -0,0 +1,118 @@
+import numpy as np
+
+# Common random numbers for the games compared across parameter points. The draws of a Generator are
+# consumed in sequence, so two games with the same seed drift apart as soon as one of them breaks one more
+# tie than the other, and every later decision is drawn from unrelated numbers. Here every draw is a hash
+# of (seed, stream, round, rank of the draw in the round of the stream): the game has one stream (night and
+# day tie-breaks) and every player its own (vote tie-breaks, Little Girl spying), so a decision gets the same
+# random number in every game of that seed, whatever happened before it.
+# The antithetic streams complement every bit of the hash: the uniform u of a draw becomes 1 - u (to 2^-53).
+
+# stream of the decisions of the game itself
+GAME_STREAM = -1
+
+_MIX = (np.uint64(0xbf58476d1ce4e5b9), np.uint64(0x94d049bb133111eb))
+
+
+def _mix(x):
+    """
+    splitmix64 finalizer of a uint64 array, a bijection with good avalanche
+    """
+    x = (x ^ (x >> np.uint64(30))) * _MIX[0]
+    x = (x ^ (x >> np.uint64(27))) * _MIX[1]
+    return x ^ (x >> np.uint64(31))
+
+
+class CommonRandomNumbers():
+
+    def __init__(self, seed, num_players, antithetic=False):
+        """
+        Keyed random streams of a game (Game rng_mode "crn" and "antithetic"). Exposes the part of the
+        RandomState interface used by the game (randint, random, get_state / set_state) for the game stream.
+        seed:        int or SeedSequence
+        num_players: int     players 0..num_players-1 get a stream each
+        antithetic:  bool    draw 1 - u instead of u
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.key = seed.generate_state(1, np.uint64)
+        self.num_players = num_players
+        self.antithetic = antithetic
+        self.round = 0
+        # draws of each stream in the current round, the game stream last
+        self.draws = np.zeros(num_players + 1, dtype=np.uint64)
+
+    def next_round(self):
+        """
+        starts the draws of a new round, called by the game at nightfall
+        """
+        self.round += 1
+        self.draws[:] = 0
+
+    def uniforms(self, streams):
+        """
+        next uniform draw in [0, 1) of each stream
+        streams: (n,) int   distinct player ids, GAME_STREAM for the game
+
+        returns (n,) float
+        """
+        slots = np.where(streams == GAME_STREAM, self.num_players, streams)
+        h = _mix(self.key ^ _mix(slots.astype(np.uint64) + np.uint64(1)))
+        h = _mix(h ^ np.uint64(self.round))
+        h = _mix(h ^ self.draws[slots])
+        self.draws[slots] += np.uint64(1)
+        if self.antithetic:
+            h = ~h
+        return (h >> np.uint64(11)) * 2.0**-53
+
+    def integers(self, streams, high):
+        """
+        next uniform integer in [0, high) of each stream
+        streams: (n,) int
+        high:    (n,) int
+
+        returns (n,) int
+        """
+        return np.floor(self.uniforms(np.asarray(streams)) * high).astype(int)
+
+    def stream(self, stream):
+        """
+        returns DecisionStream, view of the stream of a player
+        """
+        return DecisionStream(self, stream)
+
+    def randint(self, low, high):
+        return low + int(self.integers(np.array([GAME_STREAM]), np.array([high - low]))[0])
+
+    def random(self):
+        return float(self.uniforms(np.array([GAME_STREAM]))[0])
+
+    def get_state(self):
+        return {'round': self.round, 'draws': self.draws.copy()}
+
+    def set_state(self, state):
+        self.round = state['round']
+        self.draws[:] = state['draws']
+
+
+class DecisionStream():
+
+    def __init__(self, numbers, stream):
+        """
+        Stream of one player in CommonRandomNumbers, with the randint / random interface of a RandomState
+        so that agents draw from it like from any stream. Its state is kept by the CommonRandomNumbers.
+        """
+        self.numbers = numbers
+        self.id = stream
+
+    def randint(self, low, high):
+        return low + int(self.numbers.integers(np.array([self.id]), np.array([high - low]))[0])
+
+    def random(self):
+        return float(self.numbers.uniforms(np.array([self.id]))[0])
+
+    def get_state(self):
+        return None
+
+    def set_state(self, state):
+        pass
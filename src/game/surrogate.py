@@ -0,0 +1,160 @@
+import numpy as np
+
+# Mean-field surrogate of the game, for sweeps of the update parameters (phase diagrams) that would
+# cost thousands of full games per cell. Instead of the N x N beliefs it evolves the probability of
+# every (villagers v, werewolves m, role of the last lynched player) state and, for each state, the
+# expected herd: the share of the players that voted the last lynched player and the share of
+# werewolves among them. Each day a villager votes for the voters of one class of the last vote,
+# the one with the best increment of update_beliefs_after_elimination:
+#   herd       voted the lynched player:   +eta (-eta if it was a werewolf), -mu if the villager did too
+#   attackers  voted against the villager: +_lambda
+#   rest       every other alive player:    0
+# which gives the share of the village votes on werewolves, hence the probability to lynch one.
+# The werewolves vote as a bloc (they all suspect the same accusers), their target is lynched when the
+# bloc outvotes the plurality of the village and then fills the next herd.
+# What a single day does not see (the beliefs accumulated over the rounds, the plurality of correlated
+# votes) is summed up by the constants below, fitted on the eta / _lambda = mu phase diagram of the
+# full game (see simulation.calibrate_surrogate). The Little Girl is not modelled.
+
+# calibration constants of the surrogate
+SURROGATE_CONSTANTS = {
+    'herd_coherence': 0.55,    # share of the villagers voting for the herd that end up on the same player
+    'spread_plurality': 2.0,   # votes of the plurality of a village voting outside the herd
+    'bloc_softness': 0.05,     # width (in votes) of the contest between the pack bloc and that plurality
+    'rest_enrichment': 22.5,   # relative weight of the werewolves among the rest once one is lynched (eta > 0)
+    'vote_gain': 1.6,          # lynch probability per share of the votes on werewolves
+}
+
+
+def _choose(categories):
+    """
+    Vote of a villager for the best non-empty class of voters, ties broken uniformly among the players
+    of the tied classes.
+    categories: list of (value, p_nonempty, size, wolves)   increment of a class, probability that it
+                                                            holds a player, expected size and werewolves
+
+    returns (float, (k,) float): share of werewolves among the votes, share of the votes of each class
+    """
+    order = sorted(range(len(categories)), key=lambda k: -categories[k][0])
+    wolves_share, remaining = 0.0, 1.0
+    chosen = np.zeros(len(categories))
+    start = 0
+    while start < len(order) and remaining > 0:
+        stop = start
+        while stop < len(order) and categories[order[stop]][0] == categories[order[start]][0]:
+            stop += 1
+        tied = [k for k in order[start:stop] if categories[k][2] > 0]
+        if tied:
+            p_none = np.prod([1 - categories[k][1] for k in tied])
+            size = sum(categories[k][1] * categories[k][2] for k in tied)
+            for k in tied:
+                _, p_nonempty, class_size, wolves = categories[k]
+                share = remaining * (1 - p_none) * p_nonempty * class_size / size
+                chosen[k] += share
+                wolves_share += share * wolves / class_size
+            remaining *= p_none
+        start = stop
+    return wolves_share, chosen
+
+
+def _bloc_wins(num_wolves, plurality, constants):
+    """
+    probability that the pack bloc outvotes the plurality of the village
+    """
+    return 1 / (1 + np.exp(np.clip((plurality - num_wolves) / constants['bloc_softness'], -50, 50)))
+
+
+def _day(v, m, last, eta, _lambda, mu, constants):
+    """
+    Day vote of the mean-field game.
+    v, m:  int     alive villagers and werewolves
+    last:  tuple   (last_wolf, herd, herd_wolves) of the last lynch, None on the first day:
+                   role of the lynched player, share of the players that voted it, share of werewolves among them
+
+    returns (p_wolf, herd, herd_wolves): probability to lynch a werewolf, and the herd of this lynch
+    """
+    n = v + m
+    if last is None:
+        # uniform beliefs: the village votes at random, the pack does not vote as a bloc yet
+        wolves_share = m / (n - 1)
+        plurality = constants['spread_plurality']
+        bloc = _bloc_wins(1, plurality, constants)
+    else:
+        last_wolf, herd_share, herd_wolves_share = last
+        herd = max(herd_share * (n - 1), 1.0)
+        herd_wolves = 0.0 if last_wolf else min(herd_wolves_share * herd, m)
+
+        # the pack attacked a single villager: the attackers of the others are villagers
+        attackers = 1.0 + m / v
+        p_attacked = 1 - np.exp(-attackers)
+        attackers_wolves = m / v
+
+        rest = max(n - 1 - herd - attackers, 1e-9)
+        rest_wolves = max(m - herd_wolves - attackers_wolves, 0.0)
+        if last_wolf and eta > 0:
+            # werewolves never vote for a werewolf, the voters trusted by the village are villagers
+            rest_wolves = min(rest, rest_wolves * (1 + constants['rest_enrichment']))
+
+        death = -eta if last_wolf else eta
+        wolves_share = herd_vote = 0.0
+        for in_herd, weight in ((True, herd_share), (False, 1 - herd_share)):
+            categories = [
+                (death - mu * in_herd, 1.0, herd, herd_wolves),
+                (_lambda, p_attacked, attackers / p_attacked, attackers_wolves / p_attacked),
+                (0.0, 1.0, rest, rest_wolves),
+            ]
+            share, chosen = _choose(categories)
+            wolves_share += weight * share
+            herd_vote += weight * chosen[0]
+        plurality = herd_vote * v * constants['herd_coherence'] + (1 - herd_vote) * constants['spread_plurality']
+        bloc = _bloc_wins(m, plurality, constants)
+
+    p_wolf = min(1.0, (1 - bloc) * wolves_share * v / n * constants['vote_gain'])
+
+    # herd of this lynch: the pack bloc and its target, or the plurality of the village
+    herd_share = min(1.0, bloc * (m + 1) / n + (1 - bloc) * plurality / n)
+    herd_wolves_share = bloc * m / (m + 1)
+    return p_wolf, herd_share, herd_wolves_share
+
+
+def mean_field_outcome(num_werewolves, num_villagers, update_params, constants=None):
+    """
+    Predicted villagers win probability and expected number of rounds (as counted by main()) of the game,
+    played with the rules of Game: each night the pack kills a villager, each day the mean-field vote
+    lynches a werewolf with the probability given by _day, and the werewolves win as soon as they are
+    as many as the villagers.
+    num_werewolves, num_villagers: int
+    update_params: list   [eta, _lambda, mu, gamma] of the game, gamma = 0 freezes the beliefs
+    constants:     dict   calibration constants, defaults to SURROGATE_CONSTANTS
+
+    returns (float, float)
+    """
+    constants = {**SURROGATE_CONSTANTS, **(constants or {})}
+    eta, _lambda, mu, gamma = (float(p) for p in update_params)
+    if gamma == 0:
+        eta = _lambda = mu = 0.0
+
+    # (v, m, last_wolf) -> [p, p * herd, p * herd_wolves], last_wolf None before the first day
+    states = {(num_villagers, num_werewolves, None): np.array([1.0, 0.0, 0.0])}
+    win = rounds = 0.0
+    while states:
+        next_states = {}
+        for (v, m, last_wolf), (p, p_herd, p_herd_wolves) in states.items():
+            # night: the pack kills a villager
+            v -= 1
+            if v <= m:
+                continue
+            last = None if last_wolf is None else (last_wolf, p_herd / p, p_herd_wolves / p)
+            p_wolf, herd, herd_wolves = _day(v, m, last, eta, _lambda, mu, constants)
+
+            for state, weight in (((v, m - 1, True), p * p_wolf), ((v - 1, m, False), p * (1 - p_wolf))):
+                if weight <= 0:
+                    continue
+                if state[1] == 0:
+                    win += weight
+                elif state[0] > state[1]:
+                    rounds += weight
+                    next_states.setdefault(state, np.zeros(3))
+                    next_states[state] += weight * np.array([1.0, herd, herd_wolves])
+        states = next_states
+    return float(win), float(rounds)
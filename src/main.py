@@ -1,12 +1,109 @@
-from game.game import Game
+from game.game import Game, ROUND_METRICS
 import argparse
-import numpy as np
 import random
 import os
-from utils.logs import save_beliefs
+from utils.logs import save_beliefs, close_beliefs
+from utils.profiling import PhaseProfiler
 from agent import LittleGirl
 
-def main(Players = [4, 16], verbose=False, seed=None, log_dir='logs', update_params=[25, 6, 6, 0.3], p_focus=None, save_logs=True):
+# labels of the per-round metrics in the verbose output
+METRIC_LABELS = {
+    'avg_belief_villagers_on_werewolves': "Average beliefs villagers on werewolf",
+    'avg_belief_werewolves_on_little_girl': "Average belief werewolves on little_girl",
+    'avg_belief_villagers_on_little_girl': "Average belief villagers on little_girl",
+}
+
+def end_of_phase(game, stats, metrics):
+    """
+    Bookkeeping shared by the night and day halves of a round: counts the Little Girl turns,
+    checks the win condition and records the requested metrics if the game goes on.
+
+    RETURNS:
+    bool: True if the game is over
+    """
+    # Check if the little girl is alive
+    if isinstance(game.alive.get(0), LittleGirl):
+        stats["last_turn_little_girl"] += 1
+    
+    # Check win condition
+    winner = game.check_game_over()
+    if winner:
+        stats['winner'] = winner
+        stats['remaining_villagers'] = game.get_villagers_count()
+        stats['remaining_wolves'] = game.get_wolves_count()
+        return True
+
+    for name, value in game.round_metrics(metrics).items():
+        stats[name].append(value)
+    return False
+
+def new_stats(game, metrics=ROUND_METRICS):
+    """
+    Statistics of a game before its first round.
+
+    ARGUMENTS:
+    game: Game
+    metrics: iterable of str, per-round belief statistics to record (see game.game.ROUND_METRICS)
+
+    RETURNS:
+    dict: Game statistics, filled by play_round. first_lynched is the role code (see game.kernels) of the
+    first player lynched by day, -1 until then; remaining_villagers and remaining_wolves are set at the end
+    """
+    stats = {
+        'rounds': 0,
+        'winner': None,
+        'initial_wolves': game.num_wolves,
+        'initial_villagers': game.num_villagers,
+        'last_turn_little_girl': 0,
+        'first_lynched': -1,
+    }
+    for name in metrics:
+        stats[name] = []
+    return stats
+
+def play_round(game, stats, metrics=ROUND_METRICS, verbose=False):
+    """
+    Play the night and the day of a round and update the statistics. The game is left between two rounds,
+    where it can be logged or snapshotted (see Game.snapshot).
+
+    ARGUMENTS:
+    game: Game
+    stats: dict, statistics of the game (see new_stats), updated in place
+    metrics: iterable of str, per-round belief statistics to record
+    verbose: bool, whether to print detailed game progress
+
+    RETURNS:
+    bool: True if the game is over
+    """
+    if verbose:
+        print(f"\n=== Round {stats['rounds'] + 1} ===")
+        print(f"Night phase - {game.get_wolves_count()} werewolves, {game.get_villagers_count()} villagers")
+    
+    # Night phase
+    eliminated_night, eliminated_role = game.night_shift()
+    if verbose:
+        print(f"🌙 Werewolves eliminated villager {eliminated_night} who was a {eliminated_role}")
+
+    if end_of_phase(game, stats, metrics):
+        return True
+        
+    if verbose:
+        print(f"Day phase - {game.get_wolves_count()} werewolves, {game.get_villagers_count()} villagers")
+    
+    # Day phase
+    eliminated_day, target_type = game.day_shift()
+    if verbose:
+        print(f"☀️ Village eliminated player {eliminated_day} who was a {target_type} !")
+    if stats['first_lynched'] < 0:
+        stats['first_lynched'] = int(game.roles[eliminated_day])
+
+    if end_of_phase(game, stats, metrics):
+        return True
+
+    stats['rounds'] += 1
+    return False
+
+def main(Players = [4, 16], verbose=False, seed=None, log_dir='logs', update_params=[25, 6, 6, 0.3], p_focus=None, save_logs=True, engine='agents', rng_mode='generator', pack_rule='sum', metrics=ROUND_METRICS, profile=False, belief_store='dense', dtype='float64', tie_rtol=0.0, vote_mode='kernel'):
     """
     Run a complete werewolf game simulation.
     
@@ -18,10 +115,25 @@ def main(Players = [4, 16], verbose=False, seed=None, log_dir='logs', update_par
     seed: int, random seed for reproducibility (optional)
     log_dir: str, directory to save belief logs
     save_logs: bool, whether to save belief logs
+    engine: str, belief update engine of the Game ("agents" or "matrix")
+    rng_mode: str, random stream of the Game ("generator", "legacy", or "crn" / "antithetic" common random numbers)
+    pack_rule: str, aggregation of the werewolf beliefs at night ("sum", "max" or "majority")
+    metrics: iterable of str, per-round belief statistics to record in the stats (see game.game.ROUND_METRICS),
+        an empty tuple skips them for the fastest games
+    profile: bool or str, record the time spent in each phase of the game in stats['profile'],
+        "memory" also records the memory allocated in each phase (slow)
+    belief_store: str, "dense" or "palette" (compressed, for the largest games, needs the matrix engine)
+    dtype: str, "float64" or "float32" beliefs, stored, updated and logged in that dtype
+    tie_rtol: float, tie policy of the votes and of the night targeting (see Game), 0 for exact ties
+    vote_mode: str, "kernel", "agents" or "random" (random-voting baseline, see game.analytic)
     
     RETURNS:
     dict: Game statistics
     """
+    unknown = set(metrics) - set(ROUND_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}, expected some of {ROUND_METRICS}")
+
     # Generate random seed if none provided
     if seed is None:
         seed = random.randint(0, 999999)
@@ -31,120 +143,29 @@ def main(Players = [4, 16], verbose=False, seed=None, log_dir='logs', update_par
     # Initialize game
     if save_logs:
         os.makedirs(log_dir, exist_ok=True)
-    game = Game(num_villagers=Players[1], num_wolves=Players[0], seed=seed, update_params=update_params, p_focus=p_focus)
+    profiler = PhaseProfiler(memory=(profile == "memory")) if profile else None
+    game = Game(num_villagers=Players[1], num_wolves=Players[0], seed=seed, update_params=update_params, p_focus=p_focus, engine=engine, rng_mode=rng_mode, pack_rule=pack_rule, profiler=profiler, belief_store=belief_store, dtype=dtype, tie_rtol=tie_rtol, vote_mode=vote_mode)
     # Log initial beliefs
     if save_logs:
-        save_beliefs(game, 0)
+        with game.phase("logging"):
+            save_beliefs(game, 0, log_dir=log_dir)
 
     # Game stats
-    stats = {
-        'rounds': 0,
-        'winner': None,
-        'initial_wolves': Players[0],
-        'initial_villagers': Players[1],
-        'last_turn_little_girl': 0,
-        'avg_belief_villagers_on_werewolves': [],
-        'avg_belief_werewolves_on_little_girl': [],
-        'avg_belief_villagers_on_little_girl': []
-    }
+    stats = new_stats(game, metrics)
     
     # Game loop
-    while True:
-        if verbose:
-            print(f"\n=== Round {stats['rounds'] + 1} ===")
-            print(f"Night phase - {game.get_wolves_count()} werewolves, {game.get_villagers_count()} villagers")
-        
-        # Night phase
-        eliminated_night, eliminated_role = game.night_shift()
-        if verbose:
-            print(f"🌙 Werewolves eliminated villager {eliminated_night} who was a {eliminated_role}")
-
-        # Check if the little girl is alive
-        if isinstance(game.alive.get(0, False), LittleGirl):
-            stats["last_turn_little_girl"] += 1
-        
-        # Check win condition after night
-        winner = game.check_game_over()
-        if winner:
-            stats['winner'] = winner
-            break
-
-        # Average beliefs on werewolves
-        beliefs_werewolves = np.zeros(len(game.werewolves_id))
-        for villager_id in game.villagers_id:
-
-            if isinstance(game.alive[villager_id], LittleGirl):
-                continue
-
-            beliefs_werewolves += game.alive[villager_id].beliefs[game.werewolves_id] / len(game.villagers_id)
-        stats["avg_belief_villagers_on_werewolves"].append(np.mean(beliefs_werewolves))
-
-        # Average beliefs on Little Girl
-        belief_werewolves_on_little_girl = []
-        belief_villagers_on_little_girl  = []
-        for alive_player_id, alive_player in game.alive.items():
-
-            if isinstance(alive_player, LittleGirl):
-                continue
-            
-            if alive_player_id in game.werewolves_id:
-                belief_werewolves_on_little_girl.append(alive_player.beliefs[0])
-            else:
-                belief_villagers_on_little_girl.append(alive_player.beliefs[0])
-
-        stats["avg_belief_werewolves_on_little_girl"].append(np.mean(belief_werewolves_on_little_girl))
-        stats["avg_belief_villagers_on_little_girl"].append(np.mean(belief_villagers_on_little_girl))
-            
-        if verbose:
-            print(f"Day phase - {game.get_wolves_count()} werewolves, {game.get_villagers_count()} villagers")
-        
-        # Day phase
-        eliminated_day, target_type = game.day_shift()
-        if verbose:
-            print(f"☀️ Village eliminated player {eliminated_day} who was a {target_type} !")
-
-        # Check if the little girl is alive
-        if isinstance(game.alive.get(0, False), LittleGirl):
-            stats["last_turn_little_girl"] += 1
-
-        # Check win condition after day
-        winner = game.check_game_over()
-        if winner:
-            stats['winner'] = winner
-            break
-
-        # Average beliefs on werewolves
-        beliefs_werewolves = np.zeros(len(game.werewolves_id))
-        for villager_id in game.villagers_id:
-            
-            if isinstance(game.alive[villager_id], LittleGirl):
-                continue
-
-            beliefs_werewolves += game.alive[villager_id].beliefs[game.werewolves_id] / len(game.villagers_id)
-        stats["avg_belief_villagers_on_werewolves"].append(np.mean(beliefs_werewolves))
-
-        # Average beliefs on Little Girl
-        belief_werewolves_on_little_girl = []
-        belief_villagers_on_little_girl  = []
-        for alive_player_id, alive_player in game.alive.items():
-
-            if isinstance(alive_player, LittleGirl):
-                continue
-            
-            if alive_player_id in game.werewolves_id:
-                belief_werewolves_on_little_girl.append(alive_player.beliefs[0])
-            else:
-                belief_villagers_on_little_girl.append(alive_player.beliefs[0])
-
-        stats["avg_belief_werewolves_on_little_girl"].append(np.mean(belief_werewolves_on_little_girl))
-        stats["avg_belief_villagers_on_little_girl"].append(np.mean(belief_villagers_on_little_girl))
-    
+    while not play_round(game, stats, metrics, verbose):
         # Save beliefs after each round
         if save_logs:
-            save_beliefs(game, stats['rounds'] + 1, log_dir=log_dir)
-            
-        stats['rounds'] += 1
+            with game.phase("logging"):
+                save_beliefs(game, stats['rounds'], log_dir=log_dir)
     
+    if save_logs:
+        close_beliefs(game)
+
+    if profiler is not None:
+        stats['profile'] = profiler.report()
+
     if verbose:
         print("\n=== Game Over ===")
         print(f"Game ended after {stats['rounds']+1} rounds")
@@ -152,9 +173,9 @@ def main(Players = [4, 16], verbose=False, seed=None, log_dir='logs', update_par
         print(f"Remaining villagers: {game.get_villagers_count()}")
         print(f"Remaining werewolves: {game.get_wolves_count()}")
         print(f"Last turn little girl: {stats['last_turn_little_girl']}")
-        print(f"Average beliefs villagers on werewolf: {stats["avg_belief_villagers_on_werewolves"][-1]}")
-        print(f"Average belief werewolves on little_girl: {stats["avg_belief_werewolves_on_little_girl"][-1]}")
-        print(f"Average belief villagers on little_girl: {stats["avg_belief_villagers_on_little_girl"][-1]}")
+        for name in metrics:
+            if stats[name]:
+                print(f"{METRIC_LABELS[name]}: {stats[name][-1]}")
     
     return stats
 
@@ -167,6 +188,17 @@ if __name__ == "__main__":
     parser.add_argument('--seed', type=int, help='Random seed for reproducibility', default=None)
     parser.add_argument('--log_dir', type=str, help='Directory to save belief logs', default='logs')
     parser.add_argument('--save_logs', '-s', action='store_true', help='Save belief logs', default=False)
+    parser.add_argument('--engine', type=str, choices=['agents', 'matrix'], help='Belief update engine', default='agents')
+    parser.add_argument('--rng-mode', type=str, choices=['generator', 'legacy', 'crn', 'antithetic'], help='Random stream of the game, legacy reproduces the former global seeding, crn and antithetic draw common random numbers', default='generator')
+    parser.add_argument('--pack-rule', type=str, choices=['sum', 'max', 'majority'], help='Aggregation of the werewolf beliefs at night', default='sum')
+    parser.add_argument('--metrics', type=str, nargs='*', choices=ROUND_METRICS, help='Per-round belief statistics to record (none for the fastest games)', default=ROUND_METRICS)
+    parser.add_argument('--belief-store', type=str, choices=['dense', 'palette'], help='Belief store, palette is compressed (matrix engine only)', default='dense')
+    parser.add_argument('--dtype', type=str, choices=['float64', 'float32'], help='Dtype of the beliefs', default='float64')
+    parser.add_argument('--tie-rtol', type=float, help='Beliefs within this relative tolerance of the maximum are ties', default=0.0)
+    parser.add_argument('--vote-mode', type=str, choices=['kernel', 'agents', 'random'], help='Day votes, random lynches a uniformly random player', default='kernel')
+    parser.add_argument('--profile', type=str, nargs='?', const='time', choices=['time', 'memory'], help='Record the time (and memory) spent in each phase', default=None)
     args = parser.parse_args()
     
-    main(Players=[int(args.players * args.ratio), args.players], verbose=args.verbose, seed=args.seed, log_dir=args.log_dir, save_logs=args.save_logs, p_focus=args.p_focus)
\ No newline at end of file
+    stats = main(Players=[int(args.players * args.ratio), args.players], verbose=args.verbose, seed=args.seed, log_dir=args.log_dir, save_logs=args.save_logs, p_focus=args.p_focus, engine=args.engine, rng_mode=args.rng_mode, pack_rule=args.pack_rule, metrics=args.metrics, profile=args.profile, belief_store=args.belief_store, dtype=args.dtype, tie_rtol=args.tie_rtol, vote_mode=args.vote_mode)
+    if args.profile:
+        print(PhaseProfiler(memory=(args.profile == "memory")).merge(stats['profile']).format())
@@ -0,0 +1,770 @@
+from game.game import DTYPES, ENGINES, RNG_MODES, VOTE_MODES
+from game.kernels import PACK_RULES
+from simulation import GAME_RECORD, _simulate_chunk, _stored_games
+from utils.cache import ResultCache
+from utils.results import ResultStore
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+import argparse
+import http.client
+import itertools
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import numpy as np
+
+# Local simulation job server. Clients submit jobs (one simulation() cell or a sweep of cells) over
+# localhost HTTP or a Unix socket; every job is split in (configuration, seed) units, and a unit already
+# requested by another job (or found in the cache / results store) is shared instead of played twice.
+# The pending seeds of a configuration are sent by chunks to a worker pool shared by all the clients,
+# and the progress of a job is streamed back as JSON lines.
+#
+#   POST /jobs                 {"cells": [cell, ...], "nb_iter": n} or {"cell": cell, "nb_iter": n}
+#                              -> {"id": job id}, a cell holds the simulation() arguments of a game
+#                              configuration (see CELL_DEFAULTS)
+#   GET  /jobs/<id>            status of the job (see JobScheduler.status)
+#   GET  /jobs/<id>/events     JSON lines of the status each time the job progresses, until it is finished
+#   GET  /status               counters of the scheduler
+
+# simulation() arguments of a cell and their defaults, the matrix engine plays the same games as the agents one faster
+CELL_DEFAULTS = {
+    'nb_players': 100,
+    'ratio_werewolf': 0.1,
+    'update_params': [25, 6, 6, 0.3],
+    'p_focus': None,
+    'engine': 'matrix',
+    'batch_size': None,
+    'rng_mode': 'generator',
+    'pack_rule': 'sum',
+    'dtype': 'float64',
+    'tie_rtol': 0.0,
+    'vote_mode': 'kernel',
+}
+
+
+def _ignore_interrupt():
+    # the workers share the terminal of the server, which stops them itself on Ctrl-C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _number(name, value):
+    """
+    finite float of a numeric argument sent as a number or a numeric string
+    """
+    try:
+        number = float(value) if not isinstance(value, bool) else None
+    except (TypeError, ValueError):
+        number = None
+    if number is None or not np.isfinite(number):
+        raise ValueError(f"{name} must be a finite number, got {value!r}")
+    return number
+
+
+def _integer(name, value, minimum=0):
+    """
+    int of an integral argument (an integer, an integral float or string), at least minimum
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        number = value
+    else:
+        number = _number(name, value)
+        if not number.is_integer():
+            raise ValueError(f"{name} must be an integer of at least {minimum}, got {value!r}")
+    if number < minimum:
+        raise ValueError(f"{name} must be an integer of at least {minimum}, got {value!r}")
+    return int(number)
+
+
+class Unit():
+
+    def __init__(self, config_key, seed, cell):
+        """
+        One game of a configuration, shared by every job asking for it.
+        cell:    dict    normalized simulation() arguments the game is played with
+        state:   str     "pending", "running", "done" or "failed"
+        outcome: tuple   (villager_win, rounds) once done
+        jobs:    list    unexpired jobs holding the unit, once per occurrence
+        """
+        self.config_key = config_key
+        self.seed = seed
+        self.cell = cell
+        self.state = "pending"
+        self.outcome = None
+        self.error = None
+        self.jobs = []
+
+    @property
+    def finished(self):
+        return self.state in ("done", "failed")
+
+
+class Job():
+
+    def __init__(self, job_id, cells):
+        """
+        cells:     list of (cell, units), the normalized simulation() arguments of each cell and its units
+        remaining: int      units not finished yet
+        finished:  float    time the last unit finished, None before
+        """
+        self.id = job_id
+        self.cells = cells
+        self.created = time.time()
+        self.remaining = 0
+        self.finished = None
+
+
+class JobScheduler():
+
+    def __init__(self, workers=None, chunk_size=16, cache=None, results=None, max_in_flight=None, job_ttl=3600):
+        """
+        Deduplicating scheduler of simulation units onto a shared pool.
+        workers:       int     worker processes, 0 plays the chunks in a thread of this process (debugging),
+                               None uses every core
+        chunk_size:    int     seeds of a configuration sent at once to a worker
+        cache:         ResultCache or str    persistent per-seed outcomes, read before playing and filled after
+        results:       ResultStore or str    columnar store of the per-game results, read and filled likewise
+        max_in_flight: int     chunks submitted to the pool at once, 2 per worker by default, so that the units
+                               of a later job can still be shared before they are sent
+        job_ttl:       float   seconds a finished job stays queryable, its units are then forgotten unless
+                               another job holds them (the cache and the results store keep the outcomes)
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache = ResultCache(cache) if isinstance(cache, str) else cache
+        self.results = ResultStore(results) if isinstance(results, str) else results
+        self.max_in_flight = max_in_flight or 2 * max(workers, 1)
+        self.job_ttl = job_ttl
+        self.executor = self._new_executor()
+
+        self.units = {}                 # (config_key, seed) -> Unit
+        self.pending = OrderedDict()    # config_key -> deque of pending units, oldest configuration first
+        self.isolated = deque()         # units of a failed chunk, played again one by one to find the failing ones
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.in_flight = 0
+        self.played = self.shared = self.stored = self.retried = self.pool_restarts = 0
+        self.changed = threading.Condition()
+        self.closed = False
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def _new_executor(self):
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        if self.workers > 0:
+            return ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupt)
+        return ThreadPoolExecutor(max_workers=1)
+
+    @staticmethod
+    def normalize(cell):
+        """
+        checks the simulation() arguments of a cell, so that a bad request is refused instead of failing
+        the units it shares with the other jobs
+
+        Returns:
+            dict: arguments of the cell with the defaults filled in, JSON types only
+        """
+        if not isinstance(cell, dict):
+            raise ValueError(f"A cell is a dict of simulation() arguments, got {cell!r}")
+        unknown = set(cell) - set(CELL_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown cell arguments {sorted(unknown)}, expected some of {list(CELL_DEFAULTS)}")
+        cell = {**CELL_DEFAULTS, **cell}
+
+        choices = {'engine': ENGINES, 'rng_mode': RNG_MODES, 'pack_rule': tuple(PACK_RULES), 'dtype': DTYPES, 'vote_mode': VOTE_MODES}
+        for name, values in choices.items():
+            if cell[name] not in values:
+                raise ValueError(f"Unknown {name} {cell[name]!r}, expected one of {values}")
+
+        # the coerced numbers are stored, so that the config key, the cache and the results store see the
+        # same JSON numbers whatever form the client sent
+        cell['nb_players'] = _integer('nb_players', cell['nb_players'], minimum=2)
+        cell['ratio_werewolf'] = _number('ratio_werewolf', cell['ratio_werewolf'])
+        num_werewolves = int(cell['nb_players'] * cell['ratio_werewolf'])
+        if not 0 < num_werewolves < cell['nb_players']:
+            raise ValueError(f"ratio_werewolf {cell['ratio_werewolf']!r} leaves no werewolf or no villager among {cell['nb_players']} players")
+        if not isinstance(cell['update_params'], (list, tuple)) or len(cell['update_params']) != 4:
+            raise ValueError(f"update_params must be [eta, lambda, mu, gamma], got {cell['update_params']!r}")
+        cell['update_params'] = [_number('update_params', x) for x in cell['update_params']]
+        if cell['p_focus'] is not None:
+            cell['p_focus'] = _number('p_focus', cell['p_focus'])
+            if not 0 <= cell['p_focus'] <= 1:
+                raise ValueError(f"p_focus must be in [0, 1] or None, got {cell['p_focus']!r}")
+        if cell['batch_size'] is not None:
+            cell['batch_size'] = _integer('batch_size', cell['batch_size'], minimum=1)
+            if cell['rng_mode'] not in ('generator', 'legacy') or cell['vote_mode'] == 'random':
+                raise ValueError("The batched games need rng_mode 'generator' or 'legacy' and no random vote mode, use batch_size=None")
+        cell['tie_rtol'] = _number('tie_rtol', cell['tie_rtol'])
+        if cell['tie_rtol'] < 0:
+            raise ValueError(f"tie_rtol must be non-negative, got {cell['tie_rtol']!r}")
+        return cell
+
+    @staticmethod
+    def config_key(cell):
+        """
+        Returns:
+            str: hash of everything the games of a cell depend on (see ResultCache.config_key),
+                the engine and the batch size are execution options that play the same games
+        """
+        num_werewolves = int(cell['nb_players'] * cell['ratio_werewolf'])
+        return ResultCache.config_key(num_werewolves, cell['nb_players'] - num_werewolves, cell['update_params'], cell['p_focus'],
+                                      cell['rng_mode'], cell['pack_rule'], cell['dtype'], cell['tie_rtol'], cell['vote_mode'])
+
+    @staticmethod
+    def _game_args(cell):
+        num_werewolves = int(cell['nb_players'] * cell['ratio_werewolf'])
+        game_args = (num_werewolves, cell['nb_players'] - num_werewolves, cell['update_params'], cell['p_focus'],
+                     cell['engine'], cell['batch_size'], cell['rng_mode'], cell['pack_rule'])
+        options = {'dtype': cell['dtype'], 'tie_rtol': cell['tie_rtol'], 'vote_mode': cell['vote_mode']}
+        return game_args, options
+
+    def _stored(self, cell, config_key, seeds):
+        """
+        outcomes of some seeds of a cell already in the cache or in the results store
+        """
+        found = {}
+        if self.cache is not None:
+            found.update(self.cache.get(config_key, seeds))
+        if self.results is not None and len(found) < len(seeds):
+            game_args, options = self._game_args(cell)
+            config = ResultStore.config_columns(*game_args[:4], cell['rng_mode'], cell['pack_rule'], **options)
+            stored = self.results.read(['seed', 'villagers_win', 'rounds'], where=_stored_games(config, seeds))
+            wanted = set(seeds)
+            for seed, villager_win, rounds in zip(*(stored[column].tolist() for column in ('seed', 'villagers_win', 'rounds'))):
+                if seed in wanted:
+                    found.setdefault(seed, (villager_win, rounds))
+        return found
+
+    def _reusable(self, config_key, seed):
+        # a failed unit is played again by the next job asking for it
+        unit = self.units.get((config_key, seed))
+        return unit is not None and unit.state != "failed"
+
+    def submit(self, cells, nb_iter=None, seeds=None):
+        """
+        adds a job, its units already requested by other jobs are shared, the failed ones are retried
+        cells:  list    simulation() arguments of each cell (see CELL_DEFAULTS)
+        nb_iter: int    games of each cell, seeds 0..nb_iter-1 like simulation()
+        seeds:  list    explicit seeds instead of nb_iter
+
+        Returns:
+            int: job id
+        """
+        # a seed the games refuse (negative, not an integer) would fail the units of the other jobs in its chunk
+        if seeds is None:
+            seeds = list(range(_integer('nb_iter', nb_iter, minimum=1)))
+        elif isinstance(seeds, (list, tuple)) and seeds:
+            seeds = [_integer('seeds', seed) for seed in seeds]
+        else:
+            raise ValueError(f"seeds must be a non-empty list of non-negative integers, got {seeds!r}")
+        if not isinstance(cells, (list, tuple)) or not cells:
+            raise ValueError("A job needs at least one cell")
+        cells = [self.normalize(cell) for cell in cells]
+        keys = [self.config_key(cell) for cell in cells]
+        self._expire()
+
+        # lookups of the persistent stores, outside of the lock
+        with self.changed:
+            new_seeds = [[seed for seed in seeds if not self._reusable(config_key, seed)] for config_key in keys]
+        found = [self._stored(cell, config_key, missing) if missing else {}
+                 for cell, config_key, missing in zip(cells, keys, new_seeds)]
+
+        with self.changed:
+            job = Job(next(self.job_ids), [])
+            for cell, config_key, stored in zip(cells, keys, found):
+                units = []
+                for seed in seeds:
+                    unit = self.units.get((config_key, seed))
+                    if unit is not None and unit.state != "failed":
+                        self.shared += 1
+                    else:
+                        if unit is not None:
+                            self.retried += 1
+                        unit = self.units[config_key, seed] = Unit(config_key, seed, cell)
+                        if seed in stored:
+                            unit.state, unit.outcome = "done", tuple(stored[seed])
+                            self.stored += 1
+                        else:
+                            self.pending.setdefault(config_key, deque()).append(unit)
+                    unit.jobs.append(job)
+                    job.remaining += not unit.finished
+                    units.append(unit)
+                job.cells.append((cell, units))
+            if job.remaining == 0:
+                job.finished = time.time()
+            self.jobs[job.id] = job
+            self.changed.notify_all()
+        return job.id
+
+    def _expire(self):
+        """
+        forgets the jobs finished for more than job_ttl and the finished units no unexpired job holds
+        """
+        with self.changed:
+            deadline = time.time() - self.job_ttl
+            expired = [job for job in self.jobs.values() if job.finished is not None and job.finished < deadline]
+            for job in expired:
+                del self.jobs[job.id]
+                for _, units in job.cells:
+                    for unit in units:
+                        unit.jobs.remove(job)
+                        if not unit.jobs and unit.finished and self.units.get((unit.config_key, unit.seed)) is unit:
+                            del self.units[unit.config_key, unit.seed]
+
+    def _dispatch(self):
+        """
+        dispatcher thread: sends the pending units, a chunk of one configuration at a time, to the pool
+        """
+        while True:
+            with self.changed:
+                while not self.closed and (not (self.pending or self.isolated) or self.in_flight >= self.max_in_flight):
+                    self.changed.wait()
+                if self.closed:
+                    return
+                if self.isolated:
+                    chunk = [self.isolated.popleft()]
+                else:
+                    config_key, queue = next(iter(self.pending.items()))
+                    chunk = [queue.popleft() for _ in range(min(self.chunk_size, len(queue)))]
+                    if not queue:
+                        del self.pending[config_key]
+                for unit in chunk:
+                    unit.state = "running"
+                self.in_flight += 1
+                executor = self.executor
+
+            game_args, options = self._game_args(chunk[0].cell)
+            try:
+                future = executor.submit(_simulate_chunk, [unit.seed for unit in chunk], *game_args, **options)
+            except Exception as exc:
+                # the pool broke before this chunk was sent
+                self._finished(chunk, executor, None, exc)
+            else:
+                future.add_done_callback(lambda future, chunk=chunk, executor=executor: self._finished(chunk, executor, future))
+
+    def _finished(self, chunk, executor, future, exc=None):
+        """
+        stores the outcomes of a chunk played by the pool. When a chunk raises, its units are played again
+        one by one, so that a game failing on its seed only fails its own unit and not the units of the other
+        jobs sharing the chunk; the units of a single-unit chunk or of a broken pool are failed
+        """
+        from concurrent.futures.process import BrokenProcessPool
+        records, error = {}, None
+        try:
+            if exc is None:
+                records, _ = future.result()
+        except Exception as result_exc:
+            exc = result_exc
+        if exc is not None:
+            error = f"{type(exc).__name__}: {exc}"
+
+        try:
+            if records:
+                self._persist(chunk[0].cell, chunk[0].config_key, records)
+        except Exception as persist_exc:
+            # the outcomes are still served, only their copy on disk is missing
+            print(f"Could not store the games of a chunk: {type(persist_exc).__name__}: {persist_exc}", file=sys.stderr)
+        finally:
+            # a worker killed while playing a unit would break the pool again, it is not played again
+            isolate = exc is not None and len(chunk) > 1 and not isinstance(exc, BrokenProcessPool)
+            with self.changed:
+                now = time.time()
+                for unit in chunk:
+                    record = records.get(unit.seed)
+                    if record is not None:
+                        unit.state, unit.outcome = "done", (bool(record[0]), int(record[1]))
+                        self.played += 1
+                    elif isolate:
+                        unit.state = "pending"
+                        self.isolated.append(unit)
+                        continue
+                    else:
+                        unit.state, unit.error = "failed", error or "Not played"
+                    for job in unit.jobs:
+                        job.remaining -= 1
+                        if job.remaining == 0:
+                            job.finished = now
+                self.in_flight -= 1
+
+                # a worker died (killed, out of memory): the pool refuses every later chunk, start a new one
+                if isinstance(exc, BrokenProcessPool) and self.executor is executor and not self.closed:
+                    self.executor = self._new_executor()
+                    self.pool_restarts += 1
+                    executor.shutdown(wait=False, cancel_futures=True)
+                self.changed.notify_all()
+
+    def _persist(self, cell, config_key, records):
+        """
+        copies the records of a chunk to the cache and the results store
+        """
+        if self.cache is not None:
+            self.cache.put(config_key, {seed: record[:2] for seed, record in records.items()})
+        if self.results is not None:
+            game_args, options = self._game_args(cell)
+            config = ResultStore.config_columns(*game_args[:4], cell['rng_mode'], cell['pack_rule'], **options)
+            seeds = sorted(records)
+            self.results.append({**config, 'seed': seeds, **dict(zip(GAME_RECORD, zip(*(records[seed] for seed in seeds))))})
+
+    def status(self, job_id):
+        """
+        Returns:
+            dict: 'id', 'done', 'failed' and 'total' units, 'finished', and for each cell its arguments, its
+                'done' games and the 'win_ratio' / 'mean_rounds' of the games done so far (None before the first)
+        """
+        with self.changed:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            cells, done, failed, total = [], 0, 0, 0
+            for cell, units in job.cells:
+                outcomes = [unit.outcome for unit in units if unit.state == "done"]
+                errors = sorted({unit.error for unit in units if unit.state == "failed"})
+                cells.append({
+                    'cell': cell,
+                    'done': len(outcomes),
+                    'win_ratio': sum(win for win, _ in outcomes) / len(outcomes) if outcomes else None,
+                    'mean_rounds': sum(rounds for _, rounds in outcomes) / len(outcomes) if outcomes else None,
+                    'errors': errors,
+                })
+                done += len(outcomes)
+                failed += sum(unit.state == "failed" for unit in units)
+                total += len(units)
+            finished = job.remaining == 0
+        return {'id': job_id, 'done': done, 'failed': failed, 'total': total, 'finished': finished, 'cells': cells}
+
+    def events(self, job_id, timeout=None):
+        """
+        status of a job each time it progresses, until it is finished
+
+        Yields:
+            dict: see status
+        """
+        last = None
+        while True:
+            status = self.status(job_id)
+            progress = (status['done'], status['failed'])
+            if progress != last:
+                last = progress
+                yield status
+            if status['finished']:
+                return
+            with self.changed:
+                self.changed.wait(timeout)
+
+    def counters(self):
+        """
+        Returns:
+            dict: jobs and units held, units 'played' by the pool, 'shared' with an earlier job, found 'stored',
+                'retried' after a failure, 'pending', chunks 'in_flight' and 'pool_restarts' after a broken pool
+        """
+        self._expire()
+        with self.changed:
+            return {
+                'jobs': len(self.jobs),
+                'units': len(self.units),
+                'played': self.played,
+                'shared': self.shared,
+                'stored': self.stored,
+                'retried': self.retried,
+                'pending': sum(len(queue) for queue in self.pending.values()) + len(self.isolated),
+                'in_flight': self.in_flight,
+                'pool_restarts': self.pool_restarts,
+                'workers': self.workers,
+            }
+
+    def close(self):
+        """
+        stops the dispatcher and the pool, the running chunks are finished
+        """
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        self.dispatcher.join()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """
+    HTTP front end of the JobScheduler of its server
+    """
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'local'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self._send(404, {'error': f'unknown path {self.path}'})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            cells = request['cells'] if 'cells' in request else [request.get('cell', {})]
+            job_id = self.server.scheduler.submit(cells, request.get('nb_iter', 100), request.get('seeds'))
+        except (ValueError, KeyError, TypeError) as exc:
+            return self._send(400, {'error': f"{type(exc).__name__}: {exc}"})
+        except Exception as exc:
+            # e.g. an unreadable cache or results store, the client gets the reason instead of a closed connection
+            return self._send(500, {'error': f"{type(exc).__name__}: {exc}"})
+        self._send(202, {'id': job_id})
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        if parts == ['status']:
+            return self._send(200, self.server.scheduler.counters())
+        if len(parts) not in (2, 3) or parts[0] != 'jobs' or not parts[1].isdigit() or parts[2:] not in ([], ['events']):
+            return self._send(404, {'error': f'unknown path {self.path}'})
+        job_id = int(parts[1])
+        try:
+            status = self.server.scheduler.status(job_id)
+        except KeyError:
+            return self._send(404, {'error': f'unknown job {job_id}'})
+        if len(parts) == 2:
+            return self._send(200, status)
+
+        # JSON lines until the job is finished, the end of the body is the end of the connection
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        self.close_connection = True
+        for event in self.server.scheduler.events(job_id, timeout=1.0):
+            self.wfile.write(json.dumps(event).encode() + b'\n')
+            self.wfile.flush()
+
+
+class JobHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, scheduler, verbose=False):
+        """
+        job server on a localhost (host, port) address
+        """
+        self.scheduler = scheduler
+        self.verbose = verbose
+        super().__init__(address, JobHandler)
+
+
+class JobUnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, scheduler, verbose=False):
+        """
+        job server on a Unix socket, the stale socket file of a previous server is replaced
+        """
+        self.scheduler = scheduler
+        self.verbose = verbose
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, JobHandler)
+
+
+def start_server(address, workers=None, chunk_size=16, cache=None, results=None, verbose=False, job_ttl=3600):
+    """
+    Starts a job server in a background thread, for notebooks and local checks.
+
+    Args:
+        address (str or tuple): Unix socket path, or (host, port) on localhost (port 0 picks a free port)
+        workers, chunk_size, cache, results, job_ttl: See JobScheduler
+
+    Returns:
+        server: JobHTTPServer or JobUnixServer, server.server_address gives the bound address;
+            stop it with stop_server(server)
+    """
+    scheduler = JobScheduler(workers, chunk_size, cache, results, job_ttl=job_ttl)
+    if isinstance(address, str):
+        server = JobUnixServer(address, scheduler, verbose)
+    else:
+        server = JobHTTPServer(tuple(address), scheduler, verbose)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
+    server.scheduler.close()
+    if isinstance(server, JobUnixServer) and os.path.exists(server.server_address):
+        os.remove(server.server_address)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class JobClient():
+
+    def __init__(self, address, timeout=None):
+        """
+        Client of a job server.
+        address: str or tuple   Unix socket path, "host:port" or (host, port)
+        """
+        if isinstance(address, str) and ':' in address and not os.path.exists(address):
+            host, port = address.rsplit(':', 1)
+            address = (host, int(port))
+        self.address = address
+        self.timeout = timeout
+
+    def _connection(self):
+        if isinstance(self.address, str):
+            return _UnixHTTPConnection(self.address, self.timeout)
+        return http.client.HTTPConnection(*self.address, timeout=self.timeout)
+
+    def _request(self, method, path, payload=None):
+        connection = self._connection()
+        try:
+            body = None if payload is None else json.dumps(payload)
+            connection.request(method, path, body, {'Content-Type': 'application/json'} if body else {})
+            response = connection.getresponse()
+            data = json.loads(response.read())
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise RuntimeError(data.get('error', response.reason))
+        return data
+
+    def submit(self, cells, nb_iter=100, seeds=None):
+        """
+        Args:
+            cells (dict or list): simulation() arguments of a cell or of each cell of a sweep (see CELL_DEFAULTS)
+            nb_iter (int): games of each cell, seeds 0..nb_iter-1
+            seeds (list): explicit seeds instead of nb_iter
+
+        Returns:
+            int: job id
+        """
+        cells = [cells] if isinstance(cells, dict) else list(cells)
+        payload = {'cells': cells, 'nb_iter': nb_iter}
+        if seeds is not None:
+            payload['seeds'] = [int(seed) for seed in seeds]
+        return self._request('POST', '/jobs', payload)['id']
+
+    def status(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def counters(self):
+        return self._request('GET', '/status')
+
+    def events(self, job_id):
+        """
+        Yields:
+            dict: status of the job each time it progresses, the last one is finished
+        """
+        connection = self._connection()
+        try:
+            connection.request('GET', f'/jobs/{job_id}/events')
+            response = connection.getresponse()
+            if response.status >= 400:
+                raise RuntimeError(json.loads(response.read()).get('error', response.reason))
+            for line in response:
+                yield json.loads(line)
+        finally:
+            connection.close()
+
+    def wait(self, job_id):
+        """
+        Returns:
+            dict: final status of the job
+        """
+        status = None
+        for status in self.events(job_id):
+            pass
+        return status
+
+    def simulation(self, nb_iter=1000, **cell):
+        """
+        simulation() played by the server
+
+        Returns:
+            tuple: (villager_win_ratio, mean_rounds)
+        """
+        status = self.wait(self.submit(cell, nb_iter))
+        result = status['cells'][0]
+        if result['errors']:
+            raise RuntimeError("; ".join(result['errors']))
+        return result['win_ratio'], result['mean_rounds']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local simulation job server shared by several clients.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve = subparsers.add_parser('serve', help='Run the server until interrupted')
+    serve.add_argument('--socket', type=str, help='Unix socket path (instead of localhost HTTP)', default=None)
+    serve.add_argument('--port', type=int, help='Port on localhost', default=8765)
+    serve.add_argument('--workers', type=int, help='Worker processes, 0 for a thread of the server', default=None)
+    serve.add_argument('--chunk-size', type=int, help='Seeds of a configuration sent at once to a worker', default=16)
+    serve.add_argument('--cache', type=str, help='Directory of the persistent cache of game outcomes', default=None)
+    serve.add_argument('--results', type=str, help='Directory of the columnar store of per-game results', default=None)
+    serve.add_argument('--job-ttl', type=float, help='Seconds a finished job stays queryable', default=3600)
+    serve.add_argument('--verbose', '-v', action='store_true', help='Log the requests', default=False)
+
+    submit = subparsers.add_parser('submit', help='Submit a simulation and stream its progress')
+    submit.add_argument('--address', type=str, help='Unix socket path or host:port of the server', default='localhost:8765')
+    submit.add_argument('--players', type=int, default=100, help='Total number of players')
+    submit.add_argument('--ratio', type=float, default=0.1, help='Ratio of werewolves to total players')
+    submit.add_argument('--iterations', type=int, default=1000, help='Number of games to simulate')
+    submit.add_argument('--update-params', type=float, nargs=4, help='eta, lambda, mu, gamma', default=[25, 6, 6, 0.3])
+    submit.add_argument('--p-focus', type=float, help="Add a Little Girl among Villagers with a p_focus", default=None)
+    submit.add_argument('--engine', type=str, choices=ENGINES, help='Belief update engine', default=CELL_DEFAULTS['engine'])
+    submit.add_argument('--batch-size', type=int, help='Play the games by lockstep batches of this many games', default=CELL_DEFAULTS['batch_size'])
+    submit.add_argument('--rng-mode', type=str, choices=RNG_MODES, help='Random stream of the games', default=CELL_DEFAULTS['rng_mode'])
+    submit.add_argument('--pack-rule', type=str, choices=tuple(PACK_RULES), help='Aggregation of the werewolf beliefs at night', default=CELL_DEFAULTS['pack_rule'])
+    submit.add_argument('--dtype', type=str, choices=DTYPES, help='Dtype of the beliefs', default=CELL_DEFAULTS['dtype'])
+    submit.add_argument('--tie-rtol', type=float, help='Beliefs within this relative tolerance of the maximum are ties', default=CELL_DEFAULTS['tie_rtol'])
+    submit.add_argument('--vote-mode', type=str, choices=VOTE_MODES, help='Day votes, random lynches a uniformly random player', default=CELL_DEFAULTS['vote_mode'])
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        scheduler = JobScheduler(args.workers, args.chunk_size, args.cache, args.results, job_ttl=args.job_ttl)
+        if args.socket:
+            server = JobUnixServer(args.socket, scheduler, args.verbose)
+        else:
+            server = JobHTTPServer(('127.0.0.1', args.port), scheduler, args.verbose)
+        print(f"Serving on {args.socket or f'127.0.0.1:{args.port}'} with {scheduler.workers} worker(s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            scheduler.close()
+            if args.socket and os.path.exists(args.socket):
+                os.remove(args.socket)
+    else:
+        client = JobClient(args.address)
+        cell = {'nb_players': args.players, 'ratio_werewolf': args.ratio, 'update_params': args.update_params,
+                'p_focus': args.p_focus, 'engine': args.engine, 'batch_size': args.batch_size, 'rng_mode': args.rng_mode,
+                'pack_rule': args.pack_rule, 'dtype': args.dtype, 'tie_rtol': args.tie_rtol, 'vote_mode': args.vote_mode}
+        job_id = client.submit(cell, args.iterations)
+        for status in client.events(job_id):
+            result = status['cells'][0]
+            print(f"\rjob {job_id}: {status['done']}/{status['total']} games", end='', file=sys.stderr)
+        print(file=sys.stderr)
+        if result['errors']:
+            sys.exit("; ".join(result['errors']))
+        print(f"Village win ratio: {result['win_ratio']:.2%}")
+        print(f"Average rounds per game: {result['mean_rounds']:.1f}")
@@ -1,12 +1,115 @@
 import numpy as np
-from main import main
+from main import main, new_stats, play_round
+from game.analytic import random_vote_outcome
+from game.surrogate import mean_field_outcome
+from game.batch import BatchGame
 import argparse
-from tqdm import tqdm
-import matplotlib.pyplot as plt
-import seaborn as sns
+from utils.checkpoint import SweepCheckpoint
+from utils.cache import ResultCache
+from utils.results import ResultStore
+from utils.aggregators import SeriesAccumulator
+from utils.profiling import PhaseProfiler
+from utils.progress import progress
 import os
 
-def simulation(nb_players=100, ratio_werewolf=0.1, nb_iter=1000, update_params=[25, 6, 6, 0.3], p_focus=None, verbose=False):
+# the plotting libraries are imported by the plotting functions, and the process pool by the simulations
+# spread over workers: the simulations alone only load NumPy
+
+# variance-reduction modes of simulation(): common random numbers across parameter points, antithetic pairs
+VARIANCE_REDUCTIONS = (None, 'crn', 'antithetic')
+
+def play_games(seeds, num_werewolves, num_villagers, update_params=[25, 6, 6, 0.3], p_focus=None, engine='agents', batch_size=None, rng_mode='generator', pack_rule='sum', metrics=(), profile=False, dtype='float64', tie_rtol=0.0, vote_mode='kernel'):
+    """
+    Play one game per seed, game by game or by lockstep batches of games.
+
+    Args:
+        seeds (iterable): Seeds of the games to play
+        num_werewolves (int): Number of werewolves in each game
+        num_villagers (int): Number of villagers in each game
+        update_params (list): Parameters for belief updates
+        p_focus (float): Little Girl focus probability, None for no Little Girl
+        engine (str): Belief update engine of the games ("agents" or "matrix")
+        batch_size (int): If set, play the games by lockstep batches of batch_size games
+        rng_mode (str): Random stream of the games ("generator", "legacy", "crn" or "antithetic", see Game)
+        pack_rule (str): Aggregation of the werewolf beliefs at night ("sum", "max" or "majority")
+        metrics (iterable): Per-round belief statistics to record (see game.game.ROUND_METRICS),
+            none by default since the simulations only read the winner and the number of rounds
+        profile (bool or str): Record the time spent in each phase of each game in stats['profile'], see main()
+        dtype (str): Dtype of the beliefs ("float64" or "float32")
+        tie_rtol (float): Tie policy of the votes and of the night targeting, see Game
+        vote_mode (str): Day votes of the games ("kernel", "agents" or "random"), see Game
+
+    Yields:
+        dict: stats of each game, in the order of the seeds
+    """
+    seeds = list(seeds)
+    if batch_size and metrics:
+        raise ValueError("Per-round metrics are not recorded by the batched games, use batch_size=None")
+    if batch_size and profile:
+        raise ValueError("The batched games are not instrumented, use batch_size=None to profile")
+    if batch_size and vote_mode == 'random':
+        raise ValueError("The batched games have no random vote mode, use batch_size=None")
+    if batch_size and rng_mode not in ('generator', 'legacy'):
+        raise ValueError("The batched games have no common random numbers, use batch_size=None")
+    if batch_size:
+        for start in range(0, len(seeds), batch_size):
+            yield from BatchGame(
+                seeds=seeds[start:start + batch_size],
+                num_villagers=num_villagers,
+                num_wolves=num_werewolves,
+                update_params=update_params,
+                p_focus=p_focus,
+                rng_mode=rng_mode,
+                pack_rule=pack_rule,
+                dtype=dtype,
+                tie_rtol=tie_rtol
+            ).play()
+    else:
+        for seed in seeds:
+            yield main(
+                Players=[num_werewolves, num_villagers],
+                verbose=False,
+                seed=seed,
+                save_logs=False,
+                update_params=update_params,
+                p_focus = p_focus,
+                engine=engine,
+                rng_mode=rng_mode,
+                pack_rule=pack_rule,
+                metrics=metrics,
+                profile=profile,
+                dtype=dtype,
+                tie_rtol=tie_rtol,
+                vote_mode=vote_mode
+            )
+
+# per-game outcome columns of the results store, in the order of game_record
+GAME_RECORD = ('villagers_win', 'rounds', 'last_turn_little_girl', 'remaining_villagers', 'remaining_wolves', 'first_lynched')
+
+def game_record(stats):
+    """
+    Returns:
+        tuple: scalar outcome of a game (see GAME_RECORD) from its stats
+    """
+    return (stats['winner'] == "Villagers", stats['rounds'], stats['last_turn_little_girl'],
+            stats['remaining_villagers'], stats['remaining_wolves'], stats['first_lynched'])
+
+def _simulate_chunk(seeds, *game_args, profile=False, **options):
+    """
+    Worker task: plays the games of a chunk of seeds
+
+    Returns:
+        tuple: (dict seed -> game_record, phase report of the chunk or None)
+    """
+    outcomes = {}
+    profiler = PhaseProfiler(memory=(profile == "memory")) if profile else None
+    for seed, stats in zip(seeds, play_games(seeds, *game_args, profile=profile, **options)):
+        outcomes[seed] = game_record(stats)
+        if profiler is not None:
+            profiler.merge(stats['profile'])
+    return outcomes, profiler and profiler.report()
+
+def simulation(nb_players=100, ratio_werewolf=0.1, nb_iter=1000, update_params=[25, 6, 6, 0.3], p_focus=None, verbose=False, engine='agents', batch_size=None, workers=None, chunk_size=None, cache=None, rng_mode='generator', pack_rule='sum', profiler=None, dtype='float64', tie_rtol=0.0, vote_mode='kernel', analytic=False, surrogate=False, variance_reduction=None, report=None, results=None):
     """
     Run multiple simulations of werewolf games and analyze results.
     
@@ -16,82 +119,484 @@ def simulation(nb_players=100, ratio_werewolf=0.1, nb_iter=1000, update_params=[
         nb_iter (int): Number of games to simulate
         update_params (list): Parameters for belief updates [lambda, eta, _lambda, gamma]
         verbose (bool): Whether to show progress bar
+        engine (str): Belief update engine of the games ("agents" or "matrix")
+        batch_size (int): If set, play the games in lockstep batches of batch_size games (see game.batch.BatchGame),
+            engine is then ignored. Gives the same results as the game by game simulation.
+        workers (int): If set, spread the games over a pool of worker processes
+        chunk_size (int): Number of consecutive seeds sent at once to a worker,
+            defaults to splitting the games in 4 chunks per worker
+        cache (ResultCache or str): If set, cache (or cache directory) of per-seed outcomes,
+            only the seeds missing from the cache are played
+        rng_mode (str): Random stream of the games, "generator" or "legacy" to reproduce the former global seeding
+        pack_rule (str): Aggregation of the werewolf beliefs at night ("sum", "max" or "majority")
+        profiler (PhaseProfiler): If set, the time spent in each phase of the games played is added to it
+            (games found in the cache are not played, hence not profiled)
+        dtype (str): Dtype of the beliefs, "float32" halves the memory traffic (see validate_dtype)
+        tie_rtol (float): Tie policy of the votes and of the night targeting, see Game
+        vote_mode (str): Day votes of the games, "random" plays the random-voting baseline
+        analytic (bool): Return the exact values of the random-voting baseline (see game.analytic) instead of
+            simulating it. Only valid with vote_mode="random", the other options are then ignored.
+        surrogate (bool): Return the prediction of the mean-field surrogate (see game.surrogate) instead of
+            simulating the games, in milliseconds. Approximate (see calibrate_surrogate), without Little Girl,
+            the other options are then ignored.
+        variance_reduction (str): "crn" plays the games with common random numbers (Game rng_mode="crn"): game i
+            at every update_params draws the same random number for the same decision, so the differences between
+            parameter points are much less noisy (see crn_factor). "antithetic" plays nb_iter / 2 crn games and
+            their mirror games, whose tie-breaks draw 1 - u, and measures the reduction it achieved
+            (see antithetic_factor). Needs rng_mode="generator", not available with batch_size.
+        report (dict): If set, filled with the 'variance_reduction' mode, the (nb_iter, 2) 'outcomes' of the games
+            (villager_win, rounds) and, for antithetic pairs, the variance-reduction 'factor' of each statistic
+        results (ResultStore or str): If set, results store (or its directory) of the per-game outcomes, see
+            utils.results: every game played is appended to it with its configuration, and the seeds already
+            stored are read back instead of being played again
     
     Returns:
         tuple: (villager_win_ratio, mean_rounds)
+    
+    Game i is always played with seed i, so the results do not depend on workers and chunk_size.
     """
     # Calculate number of werewolves and villagers
     num_werewolves = int(nb_players * ratio_werewolf)
     num_villagers = nb_players - num_werewolves
-    
+    if analytic:
+        if vote_mode != 'random':
+            raise ValueError("The analytic values are only known for the random-voting baseline, use vote_mode='random'")
+        return random_vote_outcome(num_werewolves, num_villagers)
+    if surrogate:
+        if p_focus is not None:
+            raise ValueError("The mean-field surrogate does not model the Little Girl, use p_focus=None")
+        return mean_field_outcome(num_werewolves, num_villagers, update_params)
+
+    if variance_reduction not in VARIANCE_REDUCTIONS:
+        raise ValueError(f"Unknown variance_reduction {variance_reduction!r}, expected one of {VARIANCE_REDUCTIONS}")
+    if variance_reduction and rng_mode != 'generator':
+        raise ValueError("The variance reduction modes draw their own random streams, use rng_mode='generator'")
+    if variance_reduction == 'antithetic' and nb_iter % 2:
+        raise ValueError("The antithetic games come in pairs, use an even nb_iter")
+
+    game_args = (num_werewolves, num_villagers, update_params, p_focus, engine, batch_size, pack_rule)
+    options = {'dtype': dtype, 'tie_rtol': tie_rtol, 'vote_mode': vote_mode}
+    if cache is not None and isinstance(cache, str):
+        cache = ResultCache(cache)
+    if results is not None and isinstance(results, str):
+        results = ResultStore(results)
+    run = (game_args, options, verbose, workers, chunk_size, cache, results, profiler)
+
+    # Outcomes of the games in order: (villager_win, rounds)
+    if variance_reduction == 'antithetic':
+        # game 2k is the crn game of seed k, game 2k + 1 its mirror
+        games = _play_outcomes(range(nb_iter // 2), 'crn', *run), _play_outcomes(range(nb_iter // 2), 'antithetic', *run)
+        outcomes = np.stack(games, axis=1).reshape(nb_iter, 2)
+    else:
+        outcomes = _play_outcomes(range(nb_iter), variance_reduction or rng_mode, *run)
+
+    if report is not None:
+        report['variance_reduction'] = variance_reduction
+        report['outcomes'] = outcomes
+        if variance_reduction == 'antithetic':
+            report['factor'] = antithetic_factor(outcomes)
+
     # Stats tracking
-    villager_wins = 0
-    total_rounds = 0
+    villager_win_ratio, mean_rounds = outcomes.mean(axis=0)
+    return float(villager_win_ratio), float(mean_rounds)
+
+def _play_outcomes(seeds, rng_mode, game_args, options, verbose, workers, chunk_size, cache, results, profiler):
+    """
+    Outcomes of the games of a list of seeds, played in this process or by a pool of workers,
+    the seeds found in the cache or in the results store are not played again
+
+    Returns:
+        np.ndarray: (len(seeds), 2) float, villager_win and rounds of each game in the order of the seeds
+    """
+    seeds = list(seeds)
+    num_werewolves, num_villagers, update_params, p_focus, engine, batch_size, pack_rule = game_args
+    game_args = (num_werewolves, num_villagers, update_params, p_focus, engine, batch_size, rng_mode, pack_rule)
+
+    # Outcomes of the games: seed -> (villager_win, rounds)
+    outcomes = {}
+    if cache is not None:
+        cache_key = ResultCache.config_key(num_werewolves, num_villagers, update_params, p_focus, rng_mode, pack_rule, options['dtype'], options['tie_rtol'], options['vote_mode'])
+        outcomes = cache.get(cache_key, seeds)
+    if results is not None:
+        config = ResultStore.config_columns(num_werewolves, num_villagers, update_params, p_focus, rng_mode, pack_rule, options['dtype'], options['tie_rtol'], options['vote_mode'])
+        stored = results.read(['seed', 'villagers_win', 'rounds'], where=_stored_games(config, seeds))
+        for seed, villager_win, rounds in zip(*(stored[column].tolist() for column in ('seed', 'villagers_win', 'rounds'))):
+            outcomes.setdefault(seed, (villager_win, rounds))
+    missing = [seed for seed in seeds if seed not in outcomes]
+    records = {}
     
-    # Create iterator with optional progress bar
-    iterator = tqdm(range(nb_iter)) if verbose else range(nb_iter)
+    profile = profiler is not None and ("memory" if profiler.memory else "time")
     
-    # Run simulations
-    for i in iterator:
-        stats = main(
-            Players=[num_werewolves, num_villagers],
-            verbose=False,
-            seed=i,
-            save_logs=False,
-            update_params=update_params,
-            p_focus = p_focus
-        )
-        
-        if stats['winner'] == "Villagers":
-            villager_wins += 1
-        total_rounds += stats['rounds']
+    # Run simulations in this process, with optional progress bar
+    if not workers or workers <= 1:
+        games = zip(missing, play_games(missing, *game_args, profile=profile, **options))
+        iterator = progress(games, total=len(missing)) if verbose else games
+
+        for seed, stats in iterator:
+            records[seed] = game_record(stats)
+            if profile:
+                profiler.merge(stats['profile'])
+
+    # Or split the seeds in chunks played by a pool of processes
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(missing) // (4 * workers)))
+        chunks = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor, progress(total=len(missing), disable=not verbose) as pbar:
+            futures = {executor.submit(_simulate_chunk, chunk, *game_args, profile=profile, **options): len(chunk) for chunk in chunks}
+            for future in as_completed(futures):
+                chunk_records, report = future.result()
+                records.update(chunk_records)
+                if report is not None:
+                    profiler.merge(report)
+                pbar.update(futures[future])
     
-    villager_win_ratio = villager_wins / nb_iter
-    mean_rounds = total_rounds / nb_iter
+    outcomes.update((seed, record[:2]) for seed, record in records.items())
+    if cache is not None and missing:
+        cache.put(cache_key, {seed: outcomes[seed] for seed in missing})
+    if results is not None and missing:
+        results.append({**config, 'seed': missing, **dict(zip(GAME_RECORD, zip(*(records[seed] for seed in missing))))})
+
+    return np.array([outcomes[seed] for seed in seeds], dtype=float).reshape(len(seeds), 2)
+
+def _stored_games(config, seeds):
+    """
+    Filter of the results store selecting the games of a configuration (see ResultStore.config_columns)
+    played with some seeds. The kernel and agents vote modes play the same games.
+    """
+    where = dict(config)
+    if config['vote_mode'] != 'random':
+        where['vote_mode'] = ['kernel', 'agents']
+    seeds = list(seeds)
+    if seeds:
+        where['seed'] = (min(seeds), max(seeds))
+    return where
+
+def _variance_ratio(independent, coupled):
+    """
+    independent / coupled variance, inf when the coupling removed all the variance, nan without variance at all
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(coupled > 0, independent / np.where(coupled > 0, coupled, 1), np.where(independent > 0, np.inf, np.nan))
+
+def antithetic_factor(outcomes):
+    """
+    Variance-reduction factor achieved by antithetic pairs: variance of the mean of independent games
+    over the variance of the mean of the same number of games played in pairs.
+
+    Args:
+        outcomes (np.ndarray): (2K, 2) outcomes of simulation(variance_reduction='antithetic'), pairs in consecutive rows
+
+    Returns:
+        dict: 'win_ratio' and 'mean_rounds' factors, above 1 when the pairs helped
+    """
+    pairs = outcomes.reshape(-1, 2, outcomes.shape[-1])
+    factor = _variance_ratio(outcomes.var(axis=0, ddof=1) / 2, pairs.mean(axis=1).var(axis=0, ddof=1))
+    return {'win_ratio': float(factor[0]), 'mean_rounds': float(factor[1])}
+
+def crn_factor(outcomes, other):
+    """
+    Variance-reduction factor achieved by common random numbers on the difference between two parameter points:
+    variance of the difference of independent games over the variance of the difference of the games played
+    with the same seeds.
+
+    Args:
+        outcomes, other (np.ndarray): (K, 2) outcomes of simulation(variance_reduction='crn') at two parameter
+            points (report['outcomes'], see simulation)
+
+    Returns:
+        dict: 'win_ratio' and 'mean_rounds' factors, above 1 when the common random numbers helped
+    """
+    factor = _variance_ratio(outcomes.var(axis=0, ddof=1) + other.var(axis=0, ddof=1), (outcomes - other).var(axis=0, ddof=1))
+    return {'win_ratio': float(factor[0]), 'mean_rounds': float(factor[1])}
+
+def simulate_from(snapshot, nb_iter=1000, metrics=(), verbose=False):
+    """
+    Monte-Carlo continuations of a mid-game position: every continuation is forked from the snapshot
+    (see Game.snapshot) and played to the end with its own random streams, the prefix is not replayed.
+
+    Args:
+        snapshot (GameSnapshot): Position to continue, taken between two rounds
+        nb_iter (int): Number of continuations, continuation i is drawn from the stream i of the snapshot
+        metrics (iterable): Per-round belief statistics to record in the continuations
+        verbose (bool): Whether to show progress bar
+
+    Returns:
+        tuple: (villager_win_ratio, mean_rounds), rounds counted from the start of the game when the snapshot
+            holds the statistics of the game loop, from the snapshot otherwise
+    """
+    villager_wins = total_rounds = 0
+    for continuation in progress(range(nb_iter), disable=not verbose):
+        game = snapshot.fork(continuation)
+        if snapshot.stats is not None:
+            stats = {name: list(value) if isinstance(value, list) else value for name, value in snapshot.stats.items()}
+            for name in metrics:
+                stats.setdefault(name, [])
+        else:
+            stats = new_stats(game, metrics)
+        while not play_round(game, stats, metrics):
+            pass
+        villager_wins += stats['winner'] == "Villagers"
+        total_rounds += stats['rounds']
+    return villager_wins / nb_iter, total_rounds / nb_iter
+
+def validate_dtype(nb_players=100, ratio_werewolf=0.1, nb_iter=100, update_params=[25, 6, 6, 0.3], p_focus=None, dtype='float32', tie_rtol=0.0, engine='matrix', batch_size=None, rng_mode='generator', pack_rule='sum'):
+    """
+    Validation mode of the reduced precision: plays every seed with float64 beliefs (exact ties) and with
+    dtype / tie_rtol, and reports how often the outcome of the game differs.
+
+    Args:
+        nb_players, ratio_werewolf, nb_iter, update_params, p_focus: Games to compare, see simulation()
+        dtype (str): Dtype to validate against float64
+        tie_rtol (float): Tie policy of the validated games, see Game
+        engine, batch_size, rng_mode, pack_rule: Forwarded to play_games()
+
+    Returns:
+        dict: 'games', 'winner_differs' and 'rounds_differs' (fraction of the games with another winner,
+            with another number of rounds), 'outcome_differs' (either), 'win_ratio' and 'mean_rounds'
+            (pairs float64 / dtype)
+    """
+    num_werewolves = int(nb_players * ratio_werewolf)
+    num_villagers = nb_players - num_werewolves
+    game_args = (num_werewolves, num_villagers, update_params, p_focus, engine, batch_size, rng_mode, pack_rule)
 
-    return villager_win_ratio, mean_rounds
+    reference = [(stats['winner'], stats['rounds']) for stats in play_games(range(nb_iter), *game_args)]
+    reduced = [(stats['winner'], stats['rounds']) for stats in play_games(range(nb_iter), *game_args, dtype=dtype, tie_rtol=tie_rtol)]
 
-def plot_phase_eta_lambda(nb_players=100, ratio_werewolf=0.1, nb_iter=100, p_focus=None):
+    winner_differs = np.array([a[0] != b[0] for a, b in zip(reference, reduced)])
+    rounds_differs = np.array([a[1] != b[1] for a, b in zip(reference, reduced)])
+    return {
+        'games': nb_iter,
+        'winner_differs': float(winner_differs.mean()),
+        'rounds_differs': float(rounds_differs.mean()),
+        'outcome_differs': float((winner_differs | rounds_differs).mean()),
+        'win_ratio': tuple(float(np.mean([winner == "Villagers" for winner, _ in games])) for games in (reference, reduced)),
+        'mean_rounds': tuple(float(np.mean([rounds for _, rounds in games])) for games in (reference, reduced)),
+    }
+
+def surrogate_calibration_grid():
+    """
+    Returns:
+        list: update_params of the cells of the eta / _lambda phase diagram compared by calibrate_surrogate
+    """
+    values = [0, 1, 3, 6, 12, 25]
+    return [[eta, _lambda, _lambda, 0.3] for eta in values for _lambda in values]
+
+def calibrate_surrogate(nb_players=100, ratio_werewolf=0.1, nb_iter=100, grid=None, engine='matrix', batch_size=None, workers=None, cache=None, rng_mode='generator'):
+    """
+    Calibration report of the mean-field surrogate: plays the full games of every cell of a grid of
+    update parameters and compares them with the surrogate prediction.
+
+    Args:
+        nb_players, ratio_werewolf, nb_iter: Games of each cell, see simulation()
+        grid (list): update_params of the cells, defaults to surrogate_calibration_grid()
+        engine, batch_size, workers, cache, rng_mode: Execution options of the full games, forwarded to simulation()
+
+    Returns:
+        dict: 'cells' (one dict per cell with its 'update_params' and the pairs simulated / surrogate
+            'win_ratio' and 'mean_rounds'), 'win_rmse' and 'win_max_error' (absolute errors on the win ratio),
+            'rounds_error' (mean relative error on the rounds)
+    """
+    if grid is None:
+        grid = surrogate_calibration_grid()
+
+    cells = []
+    for update_params in progress(grid, desc="Calibrating the surrogate"):
+        simulated = simulation(nb_players, ratio_werewolf, nb_iter, update_params, engine=engine, batch_size=batch_size, workers=workers, cache=cache, rng_mode=rng_mode)
+        predicted = simulation(nb_players, ratio_werewolf, nb_iter, update_params, surrogate=True)
+        cells.append({
+            'update_params': list(update_params),
+            'win_ratio': (simulated[0], predicted[0]),
+            'mean_rounds': (simulated[1], predicted[1]),
+        })
+
+    win_errors = np.array([cell['win_ratio'][1] - cell['win_ratio'][0] for cell in cells])
+    rounds_errors = np.array([(cell['mean_rounds'][1] - cell['mean_rounds'][0]) / cell['mean_rounds'][0] for cell in cells])
+    return {
+        'cells': cells,
+        'win_rmse': float(np.sqrt(np.mean(win_errors**2))),
+        'win_max_error': float(np.abs(win_errors).max()),
+        'rounds_error': float(np.abs(rounds_errors).mean()),
+    }
+
+def phase_eta_lambda_ranges():
+    """
+    Returns:
+        tuple: (eta_range, _lambda_range) grid of the eta / _lambda phase diagram
+    """
+    return np.arange(0, 30, 0.5), np.arange(0, 30, 0.5)
+
+def phase_cell_key(nb_players, ratio_werewolf, nb_iter, p_focus, update_params, rng_mode='generator', surrogate=False, variance_reduction=None):
+    """
+    Checkpoint key of one cell of a phase diagram: everything the simulated win ratio depends on.
+    The cells predicted by the surrogate and the cells played with a variance reduction get their own keys.
+    """
+    key = {
+        'nb_players': int(nb_players),
+        'ratio_werewolf': float(ratio_werewolf),
+        'nb_iter': int(nb_iter),
+        'p_focus': None if p_focus is None else float(p_focus),
+        'update_params': [float(x) for x in update_params],
+        'rng_mode': rng_mode,
+    }
+    if surrogate:
+        key['surrogate'] = True
+    elif variance_reduction:
+        key['variance_reduction'] = variance_reduction
+    return key
+
+def plot_phase_eta_lambda(nb_players=100, ratio_werewolf=0.1, nb_iter=100, p_focus=None, checkpoint='logs/phase_checkpoint.jsonl', engine='agents', batch_size=None, workers=None, cache=None, rng_mode='generator', surrogate=False, variance_reduction=None, results=None):
     """
     Create a phase diagram showing villager win rates for different eta and _lambda values.
+    Every finished cell is appended to the checkpoint file, a rerun skips the cells already computed.
     
     Args:
         nb_players (int): Total number of players in each game
         ratio_werewolf (float): Ratio of werewolves to total players
         nb_iter (int): Number of games to simulate per parameter combination
+        p_focus (float): Little Girl focus probability, None for no Little Girl
+        checkpoint (str): Path of the checkpoint file, shared by all the sweeps
+        engine, batch_size, workers, cache: Execution options forwarded to simulation()
+        rng_mode (str): Random stream of the games ("generator" or "legacy")
+        surrogate (bool): Fill the grid with the mean-field surrogate instead of full games (see simulation())
+        variance_reduction (str): "crn" or "antithetic", see simulation(). The common random numbers make the
+            neighbouring cells differ by their parameters rather than by their games.
+        results (ResultStore or str): Results store of the per-game outcomes, forwarded to simulation()
+
+    Returns:
+        dict: variance-reduction factors achieved by the cells played in this run (median over the cells, see
+            crn_factor and antithetic_factor): 'crn' between each cell and its neighbour of lower eta,
+            'antithetic' within the cells, empty without variance reduction
     """
     # Create parameter ranges
-    eta_range = np.arange(0, 30, 0.5)
-    _lambda_range = np.arange(0, 30, 0.5)
-    
-    # Initialize results matrix
-    results = np.zeros((len(_lambda_range), len(eta_range)))
+    eta_range, _lambda_range = phase_eta_lambda_ranges()
+    ckpt = SweepCheckpoint(checkpoint)
     
-    # Run simulations for each parameter combination
+    # Run simulations for each parameter combination not in the checkpoint
     total_combinations = len(eta_range) * len(_lambda_range)
-    with tqdm(total=total_combinations, desc="Running parameter combinations") as pbar:
+    factors = {'crn': [], 'antithetic': []}
+    with progress(total=total_combinations, desc="Running parameter combinations") as pbar:
         for i, _lambda in enumerate(_lambda_range):
+            previous = None
             for j, eta in enumerate(eta_range):
                 # Set parameters: [eta, eta, _lambda, 0.3]
                 update_params = [eta, _lambda, _lambda, 0.3]
+                key = phase_cell_key(nb_players, ratio_werewolf, nb_iter, p_focus, update_params, rng_mode, surrogate, variance_reduction)
+                report = {} if variance_reduction and not surrogate else None
                 
-                # Run simulation with these parameters
-                win_ratio, _ = simulation(
-                    nb_players=nb_players,
-                    ratio_werewolf=ratio_werewolf,
-                    nb_iter=nb_iter,
-                    update_params=update_params,
-                    p_focus=p_focus
-                )
-                
-                # Store result
-                results[i, j] = win_ratio
+                if key not in ckpt:
+                    # Run simulation with these parameters
+                    win_ratio, mean_rounds = simulation(
+                        nb_players=nb_players,
+                        ratio_werewolf=ratio_werewolf,
+                        nb_iter=nb_iter,
+                        update_params=update_params,
+                        p_focus=p_focus,
+                        engine=engine,
+                        batch_size=batch_size,
+                        workers=workers,
+                        cache=cache,
+                        rng_mode=rng_mode,
+                        surrogate=surrogate,
+                        variance_reduction=variance_reduction,
+                        report=report,
+                        results=results
+                    )
+                    
+                    # Store result
+                    ckpt.add(key, {'win_ratio': win_ratio, 'mean_rounds': mean_rounds})
+
+                # the neighbours are compared on the cells played in this run, whose outcomes are known
+                if report:
+                    if previous is not None:
+                        factors['crn'].append(crn_factor(previous, report['outcomes']))
+                    if 'factor' in report:
+                        factors['antithetic'].append(report['factor'])
+                previous = report['outcomes'] if report else None
                 pbar.update(1)
     
+    render_phase_eta_lambda(nb_players, ratio_werewolf, nb_iter, p_focus, checkpoint, rng_mode, surrogate, variance_reduction)
+    return {
+        mode: {name: float(np.nanmedian([factor[name] for factor in cells])) for name in ('win_ratio', 'mean_rounds')}
+        for mode, cells in factors.items() if cells
+    }
+
+def phase_eta_lambda_table(results, nb_players=100, ratio_werewolf=0.1, nb_iter=100, p_focus=None, rng_mode='generator', variance_reduction=None, column='villagers_win', function='mean'):
+    """
+    Cells of the eta / _lambda phase diagram computed by one grouped query over a results store,
+    instead of simulating them. Only the cells whose nb_iter games are all stored are filled.
+
+    Args:
+        results (ResultStore or str): Results store filled by simulation(results=...)
+        nb_players, ratio_werewolf, nb_iter, p_focus, rng_mode, variance_reduction: Games of each cell, see simulation()
+        column (str): Per-game column aggregated in each cell (see utils.results.RESULT_COLUMNS)
+        function (str): Aggregation of the column (see ResultStore.aggregate), the win ratio by default
+
+    Returns:
+        np.ndarray: (len(_lambda_range), len(eta_range)) float, NaN for the missing cells
+    """
+    if isinstance(results, str):
+        results = ResultStore(results)
+    eta_range, _lambda_range = phase_eta_lambda_ranges()
+    num_werewolves = int(nb_players * ratio_werewolf)
+
+    # an antithetic cell is made of nb_iter / 2 crn games and their mirrors
+    rng_modes, num_seeds = ([rng_mode], nb_iter) if not variance_reduction else ((['crn', 'antithetic'], nb_iter // 2) if variance_reduction == 'antithetic' else (['crn'], nb_iter))
+    where = _stored_games(ResultStore.config_columns(num_werewolves, nb_players - num_werewolves, [0, 0, 0, 0.3], p_focus), range(num_seeds))
+    where['rng_mode'] = rng_modes
+    for free in ('eta', 'lambda', 'mu'):
+        del where[free]
+    cells = results.aggregate(['eta', 'lambda', 'mu'], where, value=(column, function), games=('seed', 'count'))
+
+    table = np.full((len(_lambda_range), len(eta_range)), np.nan)
+    eta_index = {float(eta): j for j, eta in enumerate(eta_range)}
+    _lambda_index = {float(_lambda): i for i, _lambda in enumerate(_lambda_range)}
+    for eta, _lambda, mu, value, games in zip(cells['eta'], cells['lambda'], cells['mu'], cells['value'], cells['games']):
+        if mu == _lambda and games == nb_iter and eta in eta_index and _lambda in _lambda_index:
+            table[_lambda_index[_lambda], eta_index[eta]] = value
+    return table
+
+def render_phase_eta_lambda(nb_players=100, ratio_werewolf=0.1, nb_iter=100, p_focus=None, checkpoint='logs/phase_checkpoint.jsonl', rng_mode='generator', surrogate=False, variance_reduction=None, results=None):
+    """
+    Draw the eta / _lambda phase diagram from the cells stored in a checkpoint file, or in a results store.
+    Can be called at any time during a sweep, the missing cells are left blank.
+    
+    Args:
+        nb_players (int): Total number of players in each game
+        ratio_werewolf (float): Ratio of werewolves to total players
+        nb_iter (int): Number of games simulated per parameter combination
+        p_focus (float): Little Girl focus probability, None for no Little Girl
+        checkpoint (str): Path of the checkpoint file
+        rng_mode (str): Random stream of the games ("generator" or "legacy")
+        surrogate (bool): Draw the cells predicted by the mean-field surrogate
+        variance_reduction (str): Draw the cells played with this variance reduction, see simulation()
+        results (ResultStore or str): If set, the cells are queried from this results store instead of the
+            checkpoint (see phase_eta_lambda_table), the checkpoint is then not read
+    """
+    eta_range, _lambda_range = phase_eta_lambda_ranges()
+    
+    # Fill the win ratio matrix with the finished cells
+    if results is not None and not surrogate:
+        win_ratio = phase_eta_lambda_table(results, nb_players, ratio_werewolf, nb_iter, p_focus, rng_mode, variance_reduction)
+    else:
+        ckpt = SweepCheckpoint(checkpoint)
+        win_ratio = np.full((len(_lambda_range), len(eta_range)), np.nan)
+        for i, _lambda in enumerate(_lambda_range):
+            for j, eta in enumerate(eta_range):
+                key = phase_cell_key(nb_players, ratio_werewolf, nb_iter, p_focus, [eta, _lambda, _lambda, 0.3], rng_mode, surrogate, variance_reduction)
+                cell = ckpt.get(key)
+                if cell is not None:
+                    win_ratio[i, j] = cell['win_ratio']
+    
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # Create heatmap
     plt.figure(figsize=(10, 8))
     sns.heatmap(
-        results,
+        win_ratio,
         xticklabels=[f"{x:.2f}" for x in eta_range],
         yticklabels=[f"{x:.2f}" for x in _lambda_range],
         cmap='RdYlBu',
@@ -102,13 +607,15 @@ def plot_phase_eta_lambda(nb_players=100, ratio_werewolf=0.1, nb_iter=100, p_foc
     plt.xlabel('η (eta)')
     plt.ylabel('λ (lambda)')
     plt.xticks(rotation=90)
-    plt.title('Villager Win Rate Phase Diagram')
+    plt.title('Villager Win Rate Phase Diagram' + (' (mean-field surrogate)' if surrogate else '') + (f' ({variance_reduction})' if variance_reduction and not surrogate else ''))
     
     # Create logs directory if it doesn't exist
     os.makedirs('logs', exist_ok=True)
     
     # Save plot
-    plot_name = 'logs/phase_diagram.pdf'
+    plot_name = 'logs/phase_diagram_surrogate.pdf' if surrogate else 'logs/phase_diagram.pdf'
+    if variance_reduction and not surrogate:
+        plot_name = plot_name.replace(".pdf", f"_{variance_reduction}.pdf")
     if p_focus is not None:
         p_str = f"{p_focus:.1f}".rstrip('0').rstrip('.')
         plot_name = plot_name.replace(".pdf", f"_little_girl_{p_str}.pdf")
@@ -133,7 +640,7 @@ def plot_phase_ratio(nb_players=100, nb_iter=100):
     
     # Run simulations for each parameter combination
     total_combinations = len(total_players) * len(ratio)
-    with tqdm(total=total_combinations, desc="Running parameter combinations") as pbar:
+    with progress(total=total_combinations, desc="Running parameter combinations") as pbar:
         for i, werewolf_ratio in enumerate(ratio):
             for j, player_number in enumerate(total_players):
                 # Set parameters: [eta, eta, _lambda, 0.3]
@@ -150,6 +657,9 @@ def plot_phase_ratio(nb_players=100, nb_iter=100):
                 results[i, j] = win_ratio
                 pbar.update(1)
     
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # Create heatmap
     plt.figure(figsize=(10, 8))
     sns.heatmap(
@@ -172,7 +682,7 @@ def plot_phase_ratio(nb_players=100, nb_iter=100):
     plt.savefig('logs/phase_ratio.pdf', dpi=600, bbox_inches='tight')
     plt.close()
 
-def plot_little_girl(nb_players=100, ratio_werewolf=0.1, nb_iter=100):
+def plot_little_girl(nb_players=100, ratio_werewolf=0.1, nb_iter=100, checkpoint='logs/phase_checkpoint.jsonl', engine='agents', batch_size=None, workers=None, cache=None, rng_mode='generator'):
     """
     Create a phase diagram showing villager win rates for different eta and _lambda values.
     
@@ -180,14 +690,25 @@ def plot_little_girl(nb_players=100, ratio_werewolf=0.1, nb_iter=100):
         nb_players (int): Total number of players in each game
         ratio_werewolf (float): Ratio of werewolves to total players
         nb_iter (int): Number of games to simulate per parameter combination
+        checkpoint (str): Path of the checkpoint file shared by the p_focus sweeps
+        engine, batch_size, workers, cache: Execution options forwarded to simulation()
+        rng_mode (str): Random stream of the games ("generator" or "legacy")
     """
     # Create parameter ranges
     p_focus_list = np.linspace(0, 1, 11)
     
     for p_focus in p_focus_list:
-        plot_phase_eta_lambda(nb_players, ratio_werewolf, nb_iter, p_focus)
+        plot_phase_eta_lambda(nb_players, ratio_werewolf, nb_iter, p_focus, checkpoint, engine, batch_size, workers, cache, rng_mode)
+
+def plot_ts_last_turn_little_girl(nb_players=100, ratio_werewolf=0.1, nb_iter=100, results=None):
+    """
+    Mean and standard deviation of the last turn of the Little Girl against p_focus.
 
-def plot_ts_last_turn_little_girl(nb_players=100, ratio_werewolf=0.1, nb_iter=100):
+    Args:
+        nb_players, ratio_werewolf, nb_iter: Games of each p_focus, see simulation()
+        results (ResultStore or str): If set, the games are played through simulation() into this results store
+            (only the ones not stored yet) and the statistics come from one grouped query over the store
+    """
     p_focus_list = np.linspace(0, 1, 101)
 
     # Calculate number of werewolves and villagers
@@ -196,22 +717,39 @@ def plot_ts_last_turn_little_girl(nb_players=100, ratio_werewolf=0.1, nb_iter=10
 
     avg_last_turn = np.zeros_like(p_focus_list)
     std_last_turn = np.zeros_like(p_focus_list)
-    exp = np.zeros(shape=(nb_iter,))
 
-    for idx, p_focus in enumerate(tqdm(p_focus_list)):
-        for idx_exp, seed in enumerate(range(nb_iter)):
-            stats = main(
-                Players=[num_werewolves, num_villagers],
-                verbose=False,
-                seed=seed,
-                save_logs=False,
-                p_focus = p_focus
-            )
-            exp[idx_exp] = stats["last_turn_little_girl"]
+    if results is not None:
+        if isinstance(results, str):
+            results = ResultStore(results)
+        for p_focus in progress(p_focus_list):
+            simulation(nb_players, ratio_werewolf, nb_iter, p_focus=p_focus, results=results)
+        where = _stored_games(ResultStore.config_columns(num_werewolves, num_villagers, [25, 6, 6, 0.3], 0.0), range(nb_iter))
+        where['p_focus'] = (0.0, 1.0)
+        cells = results.aggregate(['p_focus'], where, mean=('last_turn_little_girl', 'mean'), std=('last_turn_little_girl', 'std'))
+        index = {float(p_focus): idx for idx, p_focus in enumerate(p_focus_list)}
+        for p_focus, mean, std in zip(cells['p_focus'], cells['mean'], cells['std']):
+            if p_focus in index:
+                avg_last_turn[index[p_focus]], std_last_turn[index[p_focus]] = mean, std
+    else:
+        for idx, p_focus in enumerate(progress(p_focus_list)):
+            # running statistics of the last turn, folded in game after game
+            last_turn = SeriesAccumulator()
+            for seed in range(nb_iter):
+                stats = main(
+                    Players=[num_werewolves, num_villagers],
+                    verbose=False,
+                    seed=seed,
+                    save_logs=False,
+                    p_focus = p_focus,
+                    metrics=()
+                )
+                last_turn.add(stats["last_turn_little_girl"])
         
-        # Update the avg/std last turn
-        avg_last_turn[idx] = np.mean(exp)
-        std_last_turn[idx] = np.std(exp)
+            # Update the avg/std last turn
+            avg_last_turn[idx] = last_turn.mean[0]
+            std_last_turn[idx] = last_turn.std()[0]
+
+    import matplotlib.pyplot as plt
 
     # Plot
     plt.plot(p_focus_list, avg_last_turn, label='Average little girl last turn', color='blue')
@@ -233,12 +771,12 @@ def plot_ts_avg_belief(nb_players=100, ratio_werewolf=0.1, nb_iter=100, p_focus=
 
     update_params = [eta, _lambda, _lambda, 0.3]
 
-    # Initiate the mean average arrays
-    mean_avg_beliefs_villagers_on_werewolves = np.ones(shape=(nb_iter, nb_players)) * np.nan
-    mean_avg_beliefs_werewolves_on_little_girl = np.ones(shape=(nb_iter, nb_players)) * np.nan
-    mean_avg_beliefs_villagers_on_little_girl = np.ones(shape=(nb_iter, nb_players)) * np.nan
+    # Streaming per-turn statistics of the series, the memory does not grow with nb_iter
+    villagers_on_werewolves = SeriesAccumulator()
+    werewolves_on_little_girl = SeriesAccumulator()
+    villagers_on_little_girl = SeriesAccumulator()
 
-    for iter in tqdm(range(nb_iter)):
+    for iter in progress(range(nb_iter)):
         stats = main(
             Players=[num_werewolves, num_villagers],
             verbose=False,
@@ -248,20 +786,17 @@ def plot_ts_avg_belief(nb_players=100, ratio_werewolf=0.1, nb_iter=100, p_focus=
             p_focus = p_focus
         )
 
-        # Retrieve the avg belief
-        exp_avg_belief_werewolves                = stats["avg_belief_villagers_on_werewolves"]
-        exp_avg_belief_werewolves_on_little_girl = stats["avg_belief_werewolves_on_little_girl"]
-        exp_avg_belief_villagers_on_little_girl  = stats["avg_belief_villagers_on_little_girl"]
-        
-        # Update mean average arrays
-        mean_avg_beliefs_villagers_on_werewolves[iter, :len(exp_avg_belief_werewolves)] = exp_avg_belief_werewolves
-        mean_avg_beliefs_werewolves_on_little_girl[iter, :len(exp_avg_belief_werewolves_on_little_girl)] = exp_avg_belief_werewolves_on_little_girl
-        mean_avg_beliefs_villagers_on_little_girl[iter, :len(exp_avg_belief_villagers_on_little_girl)] = exp_avg_belief_villagers_on_little_girl
+        # Fold the series of the game in
+        villagers_on_werewolves.add(stats["avg_belief_villagers_on_werewolves"])
+        werewolves_on_little_girl.add(stats["avg_belief_werewolves_on_little_girl"])
+        villagers_on_little_girl.add(stats["avg_belief_villagers_on_little_girl"])
+
+    # Average the series
+    mean_avg_beliefs_villagers_on_werewolves = villagers_on_werewolves.mean
+    mean_avg_beliefs_werewolves_on_little_girl = werewolves_on_little_girl.mean
+    mean_avg_beliefs_villagers_on_little_girl = villagers_on_little_girl.mean
 
-    # Average the arrays
-    mean_avg_beliefs_villagers_on_werewolves = np.nanmean(mean_avg_beliefs_villagers_on_werewolves, axis=0)
-    mean_avg_beliefs_werewolves_on_little_girl = np.nanmean(mean_avg_beliefs_werewolves_on_little_girl, axis=0)
-    mean_avg_beliefs_villagers_on_little_girl = np.nanmean(mean_avg_beliefs_villagers_on_little_girl, axis=0)
+    import matplotlib.pyplot as plt
 
     # Plot mean average arrays beliefs on werewolves / little_girl
     plt.plot(range(len(mean_avg_beliefs_villagers_on_werewolves)), mean_avg_beliefs_villagers_on_werewolves, color='red', label=r"$S_{\text{Villagers} \to \text{Werewolves}}$")
@@ -286,27 +821,78 @@ if __name__ == "__main__":
     parser.add_argument('--little-girl-plot', action='store_true', help='Generate the little girl analysis', default=False)
     parser.add_argument('--last-turn', action='store_true', help='Generate the little girl last turn analysis', default=False)
     parser.add_argument('--avg-belief', action='store_true', help='Generate the average belief analysis', default=False)
+    parser.add_argument('--engine', type=str, choices=['agents', 'matrix'], help='Belief update engine', default='agents')
+    parser.add_argument('--batch-size', type=int, help='Play the games by lockstep batches of this size', default=None)
+    parser.add_argument('--workers', type=int, help='Number of worker processes', default=None)
+    parser.add_argument('--chunk-size', type=int, help='Number of games sent at once to a worker', default=None)
+    parser.add_argument('--checkpoint', type=str, help='Checkpoint file of the phase diagram sweeps', default='logs/phase_checkpoint.jsonl')
+    parser.add_argument('--render-only', action='store_true', help='Draw the phase plot from the checkpoint without simulating', default=False)
+    parser.add_argument('--cache', type=str, help='Directory of the persistent cache of game outcomes', default=None)
+    parser.add_argument('--results', type=str, help='Directory of the columnar store of per-game results (grid search, phase plot, last turn)', default=None)
+    parser.add_argument('--cache-size', type=float, help='Size limit of the cache in MB', default=1024)
+    parser.add_argument('--rng-mode', type=str, choices=['generator', 'legacy'], help='Random stream of the games, legacy reproduces the former global seeding', default='generator')
+    parser.add_argument('--pack-rule', type=str, choices=['sum', 'max', 'majority'], help='Aggregation of the werewolf beliefs at night (grid search)', default='sum')
+    parser.add_argument('--profile', type=str, help='Dump the time spent in each phase of the games to this JSON file (grid search)', default=None)
+    parser.add_argument('--dtype', type=str, choices=['float64', 'float32'], help='Dtype of the beliefs (grid search)', default='float64')
+    parser.add_argument('--tie-rtol', type=float, help='Beliefs within this relative tolerance of the maximum are ties (grid search)', default=0.0)
+    parser.add_argument('--vote-mode', type=str, choices=['kernel', 'agents', 'random'], help='Day votes of the games, random is the random-voting baseline (grid search)', default='kernel')
+    parser.add_argument('--analytic', action='store_true', help='Exact values of the random-voting baseline instead of simulating it (grid search)', default=False)
+    parser.add_argument('--surrogate', action='store_true', help='Predict the results with the mean-field surrogate instead of playing the games (grid search, phase plot)', default=False)
+    parser.add_argument('--variance-reduction', type=str, choices=['crn', 'antithetic'], help='Common random numbers across parameter points, or antithetic pairs of games (grid search, phase plot)', default=None)
+    parser.add_argument('--calibrate-surrogate', action='store_true', help='Compare the mean-field surrogate with the full games on a grid of update parameters', default=False)
+    parser.add_argument('--validate-dtype', action='store_true', help='Report how often the games differ from float64 with --dtype and --tie-rtol', default=False)
     args = parser.parse_args()
+    cache = ResultCache(args.cache, max_bytes=int(args.cache_size * 2**20)) if args.cache else None
 
     
-    if args.phase_plot:
-        plot_phase_eta_lambda(
+    if args.phase_plot and args.render_only:
+        render_phase_eta_lambda(
             nb_players=args.players,
             ratio_werewolf=args.ratio,
             nb_iter=args.iterations,
-            p_focus=args.p_focus
+            p_focus=args.p_focus,
+            checkpoint=args.checkpoint,
+            rng_mode=args.rng_mode,
+            surrogate=args.surrogate,
+            variance_reduction=args.variance_reduction,
+            results=args.results
+        )
+    elif args.phase_plot:
+        factors = plot_phase_eta_lambda(
+            nb_players=args.players,
+            ratio_werewolf=args.ratio,
+            nb_iter=args.iterations,
+            p_focus=args.p_focus,
+            checkpoint=args.checkpoint,
+            engine=args.engine,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            cache=cache,
+            rng_mode=args.rng_mode,
+            surrogate=args.surrogate,
+            variance_reduction=args.variance_reduction,
+            results=args.results
         )
+        for mode, factor in factors.items():
+            print(f"Variance reduction ({mode}): x{factor['win_ratio']:.2f} on the win ratio, x{factor['mean_rounds']:.2f} on the rounds")
     if args.little_girl_plot:
         plot_little_girl(
             nb_players=args.players,
             ratio_werewolf=args.ratio,
-            nb_iter=args.iterations
+            nb_iter=args.iterations,
+            checkpoint=args.checkpoint,
+            engine=args.engine,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            cache=cache,
+            rng_mode=args.rng_mode
         )
     if args.last_turn:
         plot_ts_last_turn_little_girl(
             nb_players=args.players,
             ratio_werewolf=args.ratio,
-            nb_iter=args.iterations
+            nb_iter=args.iterations,
+            results=args.results
         )
     if args.avg_belief:
         plot_ts_avg_belief(
@@ -316,13 +902,76 @@ if __name__ == "__main__":
             p_focus=args.p_focus
         )
     if args.grid_search:
+        profiler = PhaseProfiler() if args.profile else None
+        report = {}
         win_ratio, avg_rounds = simulation(
             nb_players=args.players,
             ratio_werewolf=args.ratio,
             nb_iter=args.iterations,
-            verbose=True
+            verbose=True,
+            engine=args.engine,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            cache=cache,
+            rng_mode=args.rng_mode,
+            pack_rule=args.pack_rule,
+            profiler=profiler,
+            dtype=args.dtype,
+            tie_rtol=args.tie_rtol,
+            vote_mode=args.vote_mode,
+            analytic=args.analytic,
+            surrogate=args.surrogate,
+            variance_reduction=args.variance_reduction,
+            report=report,
+            results=args.results
         )
         
-        print(f"Results from {args.iterations} simulations:")
+        if args.analytic:
+            print("Exact values of the random-voting baseline:")
+        elif args.surrogate:
+            print("Prediction of the mean-field surrogate:")
+        else:
+            print(f"Results from {args.iterations} simulations:")
         print(f"Village win ratio: {win_ratio:.2%}")
         print(f"Average rounds per game: {avg_rounds:.1f}")
+        if 'factor' in report:
+            print(f"Variance reduction (antithetic): x{report['factor']['win_ratio']:.2f} on the win ratio, x{report['factor']['mean_rounds']:.2f} on the rounds")
+        if profiler is not None:
+            print(profiler.format())
+            profiler.dump(args.profile)
+    if args.validate_dtype:
+        report = validate_dtype(
+            nb_players=args.players,
+            ratio_werewolf=args.ratio,
+            nb_iter=args.iterations,
+            p_focus=args.p_focus,
+            dtype=args.dtype,
+            tie_rtol=args.tie_rtol,
+            engine=args.engine,
+            batch_size=args.batch_size,
+            rng_mode=args.rng_mode,
+            pack_rule=args.pack_rule
+        )
+        print(f"{args.dtype} (tie_rtol={args.tie_rtol}) against float64 over {report['games']} games:")
+        print(f"Different winner: {report['winner_differs']:.2%}")
+        print(f"Different number of rounds: {report['rounds_differs']:.2%}")
+        print(f"Village win ratio: {report['win_ratio'][0]:.2%} / {report['win_ratio'][1]:.2%}")
+        print(f"Average rounds per game: {report['mean_rounds'][0]:.1f} / {report['mean_rounds'][1]:.1f}")
+    if args.calibrate_surrogate:
+        report = calibrate_surrogate(
+            nb_players=args.players,
+            ratio_werewolf=args.ratio,
+            nb_iter=args.iterations,
+            engine=args.engine,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            cache=cache,
+            rng_mode=args.rng_mode
+        )
+        print(f"Mean-field surrogate against {args.iterations} games per cell (simulated / surrogate):")
+        for cell in report['cells']:
+            eta, _lambda = cell['update_params'][:2]
+            print(f"eta={eta:<4} lambda={_lambda:<4} win ratio {cell['win_ratio'][0]:.2%} / {cell['win_ratio'][1]:.2%}, rounds {cell['mean_rounds'][0]:.1f} / {cell['mean_rounds'][1]:.1f}")
+        print(f"Win ratio error: RMS {report['win_rmse']:.2%}, max {report['win_max_error']:.2%}")
+        print(f"Rounds relative error: {report['rounds_error']:.2%}")
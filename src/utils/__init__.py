@@ -1 +1 @@
-from .utils import softmax
\ No newline at end of file
+from .utils import softmax, draw_integers
\ No newline at end of file
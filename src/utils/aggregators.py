@@ -0,0 +1,132 @@
+import numpy as np
+
+class SeriesAccumulator():
+
+    def __init__(self, quantiles=None, bins=200, value_range=(0, 1)):
+        """
+        Mergeable streaming statistics of series indexed by turn (count, mean, variance and optionally quantiles
+        of the values at each turn). The series of each game is folded in as soon as the game is over, so the memory
+        stays O(max_turns) whatever the number of games, and the accumulators of several workers can be merged.
+        quantiles:   list    quantiles to estimate, e.g. [0.25, 0.5, 0.75], None to skip the quantile sketch
+        bins:        int     number of bins of the quantile sketch, a fixed-bin histogram per turn
+        value_range: tuple   range covered by the sketch, the values outside of it are counted in the edge bins
+        """
+        self.quantiles = quantiles
+        self.count = np.zeros(0, dtype=np.int64)
+        self._mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+
+        self.edges = None
+        self._hist = None
+        if quantiles is not None:
+            self.edges = np.linspace(value_range[0], value_range[1], bins + 1)
+            self._hist = np.zeros((0, bins), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.count)
+
+    def _grow(self, length):
+        """
+        extends the per-turn arrays to at least length turns
+        """
+        extra = length - len(self.count)
+        if extra <= 0:
+            return
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self._mean = np.concatenate([self._mean, np.zeros(extra)])
+        self._m2 = np.concatenate([self._m2, np.zeros(extra)])
+        if self._hist is not None:
+            self._hist = np.concatenate([self._hist, np.zeros((extra, self._hist.shape[1]), dtype=np.int64)])
+
+    def add(self, series):
+        """
+        folds in the series of one game, value i being the value at turn i. NaN values are skipped.
+        series: float or list of float
+        """
+        values = np.atleast_1d(np.asarray(series, dtype=float))
+        self._grow(len(values))
+
+        # Welford update of the turns with a value
+        turns = np.flatnonzero(~np.isnan(values))
+        x = values[turns]
+        self.count[turns] += 1
+        delta = x - self._mean[turns]
+        self._mean[turns] += delta / self.count[turns]
+        self._m2[turns] += delta * (x - self._mean[turns])
+
+        if self._hist is not None:
+            bins = np.clip(np.searchsorted(self.edges, x, side='right') - 1, 0, self._hist.shape[1] - 1)
+            self._hist[turns, bins] += 1
+
+    def merge(self, other):
+        """
+        folds in the statistics of another accumulator (e.g. computed by another worker)
+        other: SeriesAccumulator  with the same quantile sketch settings
+
+        returns self
+        """
+        if (self.edges is None) != (other.edges is None) or (self.edges is not None and not np.array_equal(self.edges, other.edges)):
+            raise ValueError("Cannot merge accumulators with different quantile sketches")
+        self._grow(len(other))
+        turns = np.arange(len(other))
+
+        # Chan et al. pairwise update
+        count_a, count_b = self.count[turns], other.count
+        total = count_a + count_b
+        delta = other._mean - self._mean[turns]
+        weight = np.divide(count_b, total, out=np.zeros(len(turns)), where=total > 0)
+        self._mean[turns] += delta * weight
+        self._m2[turns] += other._m2 + delta ** 2 * count_a * weight
+        self.count[turns] = total
+
+        if self._hist is not None:
+            self._hist[turns] += other._hist
+        return self
+
+    @property
+    def mean(self):
+        """
+        returns (T,) float, mean at each turn, NaN for the turns without value
+        """
+        return np.where(self.count > 0, self._mean, np.nan)
+
+    def variance(self, ddof=0):
+        """
+        returns (T,) float, variance at each turn, NaN for the turns with ddof values or less
+        """
+        out = np.full(len(self), np.nan)
+        np.divide(self._m2, self.count - ddof, out=out, where=self.count > ddof)
+        return out
+
+    def std(self, ddof=0):
+        """
+        returns (T,) float, standard deviation at each turn, see variance
+        """
+        return np.sqrt(self.variance(ddof))
+
+    def quantile(self, q=None):
+        """
+        quantiles at each turn, estimated from the histogram sketch with linear interpolation inside the bins
+        q: float or list of float, defaults to the quantiles given at init
+
+        returns (T,) float for a single quantile or (len(q), T) float, NaN for the turns without value
+        """
+        if self._hist is None:
+            raise ValueError("No quantile sketch, create the accumulator with quantiles=[...]")
+        if q is None:
+            q = self.quantiles
+        qs = np.atleast_1d(np.asarray(q, dtype=float))
+
+        cumulative = np.cumsum(self._hist, axis=1)
+        out = np.full((len(qs), len(self)), np.nan)
+        turns = np.arange(len(self))
+        for k, quantile in enumerate(qs):
+            target = quantile * self.count
+            # first bin whose cumulative count reaches the target
+            b = np.minimum((cumulative < target[:, None]).sum(axis=1), self._hist.shape[1] - 1)
+            in_bin = self._hist[turns, b]
+            before = cumulative[turns, b] - in_bin
+            fraction = np.divide(target - before, in_bin, out=np.zeros(len(turns)), where=in_bin > 0)
+            value = self.edges[b] + fraction * (self.edges[b + 1] - self.edges[b])
+            out[k] = np.where(self.count > 0, value, np.nan)
+        return out[0] if np.ndim(q) == 0 else out
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from .locks import file_lock
+
+# bump when a change of the game rules makes the stored outcomes stale
+CACHE_VERSION = 2
+
+class ResultCache():
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        """
+        Persistent, content-addressed cache of per-seed game outcomes.
+        Each game configuration is stored in its own file named after the hash of the configuration,
+        holding the seeds already played with their outcome. Files are evicted in least recently used
+        order once the cache grows over max_bytes.
+        directory: str  cache directory, shared by every process using it
+        max_bytes: int  size limit of the cache
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def config_key(num_werewolves, num_villagers, update_params, p_focus, rng_mode='generator', pack_rule='sum', dtype='float64', tie_rtol=0.0, vote_mode='kernel'):
+        """
+        returns str, hash of everything a game outcome depends on, except its seed
+        A custom pack rule is identified by its qualified name.
+        """
+        if callable(pack_rule):
+            pack_rule = f'{pack_rule.__module__}.{pack_rule.__qualname__}'
+
+        config = {
+            'version': CACHE_VERSION,
+            'num_werewolves': int(num_werewolves),
+            'num_villagers': int(num_villagers),
+            'update_params': [float(x) for x in update_params],
+            'p_focus': None if p_focus is None else float(p_focus),
+            'rng_mode': rng_mode,
+            'pack_rule': pack_rule,
+        }
+        # only in the keys of non-default settings, the float64 entries stay valid
+        if dtype != 'float64' or tie_rtol:
+            config.update(dtype=str(dtype), tie_rtol=float(tie_rtol))
+        # the kernel and agents vote modes play the same games
+        if vote_mode == 'random':
+            config.update(vote_mode=vote_mode)
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def _load(self, key):
+        try:
+            with np.load(self._path(key)) as data:
+                return {name: data[name] for name in ('seeds', 'villager_win', 'rounds')}
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return None
+
+    def get(self, key, seeds):
+        """
+        outcomes stored for some seeds of a configuration, marks the configuration as recently used
+        key:   str       configuration hash from config_key
+        seeds: iterable  seeds to look up
+
+        returns dict, seed -> (villager_win, rounds) for the seeds found in the cache
+        """
+        data = self._load(key)
+        if data is None:
+            return {}
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+
+        stored = dict(zip(data['seeds'].tolist(), zip(data['villager_win'].tolist(), data['rounds'].tolist())))
+        return {seed: stored[seed] for seed in seeds if seed in stored}
+
+    def put(self, key, outcomes):
+        """
+        adds outcomes to a configuration and evicts the least recently used configurations if needed
+        key:      str   configuration hash from config_key
+        outcomes: dict  seed -> (villager_win, rounds)
+        """
+        # merge with the seeds stored meanwhile by other processes, under the lock of the cache so that
+        # two writers of a configuration never replace each other's seeds
+        with file_lock(os.path.join(self.directory, 'cache.lock')):
+            data = self._load(key)
+            merged = {}
+            if data is not None:
+                merged.update(zip(data['seeds'].tolist(), zip(data['villager_win'].tolist(), data['rounds'].tolist())))
+            merged.update(outcomes)
+
+            seeds = np.array(sorted(merged), dtype=np.int64)
+            villager_win = np.array([merged[seed][0] for seed in seeds], dtype=bool)
+            rounds = np.array([merged[seed][1] for seed in seeds], dtype=np.int64)
+
+            # write to a temporary file first so that readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, seeds=seeds, villager_win=villager_win, rounds=rounds)
+            os.replace(tmp_path, self._path(key))
+
+        self.evict(keep=key)
+
+    def size(self):
+        """
+        returns int, current size of the cache in bytes
+        """
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        return entries
+
+    def evict(self, keep=None):
+        """
+        removes the least recently used configurations until the cache fits in max_bytes
+        keep: str   configuration hash never evicted (the one just written)
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, name, size in entries:
+            if total <= self.max_bytes:
+                break
+            if name == f'{keep}.npz':
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,77 @@
+import json
+import os
+
+class SweepCheckpoint():
+
+    def __init__(self, path):
+        """
+        Append-only on-disk record of the finished cells of a parameter sweep.
+        Each line of the file is a JSON object {"key": {...}, "result": {...}} written as soon as the cell is
+        finished, so a killed sweep loses at most the cell it was computing.
+        path: str   checkpoint file, created on the first write
+        """
+        self.path = path
+        self.results = {}
+        # the writer repairs a torn last line before its first append, see add
+        self.repaired = False
+
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        # A last line without newline is either cut by a crash or still being written by a running sweep,
+        # readers skip it and leave the file untouched
+        for line in content[:content.rfind(b'\n') + 1].decode().splitlines():
+            record = json.loads(line)
+            self.results[self._hash(record['key'])] = record['result']
+
+    @staticmethod
+    def _hash(key):
+        return json.dumps(key, sort_keys=True)
+
+    def __contains__(self, key):
+        return self._hash(key) in self.results
+
+    def __len__(self):
+        return len(self.results)
+
+    def get(self, key, default=None):
+        """
+        result stored for key, default if the cell was not computed yet
+        key: dict   JSON serializable description of the cell
+        """
+        return self.results.get(self._hash(key), default)
+
+    def _repair(self):
+        """
+        drops a last line cut by a crash, the next record would be appended to it
+        """
+        try:
+            with open(self.path, 'rb+') as f:
+                content = f.read()
+                complete = content.rfind(b'\n') + 1
+                if complete < len(content):
+                    f.truncate(complete)
+        except FileNotFoundError:
+            pass
+        self.repaired = True
+
+    def add(self, key, result):
+        """
+        stores the result of a cell and flushes it to disk, a sweep has a single writer
+        key:    dict   JSON serializable description of the cell
+        result: dict   JSON serializable result of the cell
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not self.repaired:
+            self._repair()
+
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'key': key, 'result': result}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.results[self._hash(key)] = result
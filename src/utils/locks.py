@@ -0,0 +1,24 @@
+import contextlib
+
+# fcntl is POSIX only, elsewhere the writers of a shared directory are not serialized
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    exclusive advisory lock of a lock file (created if needed) held for the duration of the block,
+    serializes the read-modify-write of a shared file across threads and processes
+    path: str   lock file
+    """
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -1,90 +1,302 @@
 import json
 import numpy as np
 import os
+import re
+import struct
+import weakref
 from datetime import datetime
-import matplotlib.pyplot as plt
-import seaborn as sns
 import argparse
 
+# Binary belief log: a fixed-size header followed by one fixed-size record per logged round
+LOG_MAGIC = b'WWBELIEF'
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct('<8sIIqQ8s')  # magic, version, num_players, seed, num_records, beliefs dtype
+LOG_HEADER_SIZE = 64
+LOG_NUM_RECORDS_OFFSET = 24
+LOG_METRICS = ('s_werewolves', 's_villagers', 'entropy')
+
+def record_dtype(num_players, dtype='<f8'):
+    """
+    numpy dtype of one record of a binary belief log: round number, metrics and belief matrix
+    """
+    return np.dtype([('round', '<i8')] + [(name, '<f8') for name in LOG_METRICS]
+                    + [('beliefs', np.dtype(dtype), (num_players, num_players))])
+
+class BeliefLog():
+
+    def __init__(self, path, num_players, seed=None, dtype='<f8'):
+        """
+        Append-only binary log of the belief matrices of a game.
+        Each round is appended as one fixed-size record, only the record count of the header
+        is rewritten in place, so logging a round costs O(N^2) whatever the length of the game.
+        path:        str    log file, overwritten
+        num_players: int    number of players of the game
+        seed:        int    seed of the game, stored in the header
+        dtype:       str    dtype of the stored belief matrices
+        """
+        self.path = path
+        self.num_players = num_players
+        self.dtype = record_dtype(num_players, dtype)
+        self.num_records = 0
+        self.file = open(path, 'w+b')
+        header = LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, num_players, -1 if seed is None else seed,
+                                 0, np.dtype(dtype).str.encode())
+        self.file.write(header.ljust(LOG_HEADER_SIZE, b'\0'))
+        self.file.flush()
+
+    def append(self, round_num, beliefs, metrics=None):
+        """
+        appends the belief matrix of a round
+        round_num: int       round number
+        beliefs:   ndarray   (N, N) belief matrix, NaN rows for dead players
+        metrics:   dict      values of LOG_METRICS for this round, missing ones are stored as NaN
+        """
+        record = np.zeros(1, dtype=self.dtype)
+        record['round'] = round_num
+        for name in LOG_METRICS:
+            record[name] = (metrics or {}).get(name, np.nan)
+        record['beliefs'] = beliefs
+
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(record.tobytes())
+        # the record is complete before the header counts it
+        self.num_records += 1
+        self.file.seek(LOG_NUM_RECORDS_OFFSET)
+        self.file.write(struct.pack('<Q', self.num_records))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class BeliefLogReader():
+
+    def __init__(self, path):
+        """
+        Memory-mapped reader of a binary belief log: rounds, observers or targets are sliced
+        from the file without loading it, only the pages actually read are brought in memory.
+        path: str   binary log file
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, num_players, seed, num_records, dtype = LOG_HEADER.unpack(f.read(LOG_HEADER.size))
+        if magic != LOG_MAGIC:
+            raise ValueError(f"{path} is not a binary belief log")
+        self.num_players = num_players
+        self.seed = seed
+        self.dtype = record_dtype(num_players, dtype.rstrip(b'\0').decode())
+
+        if num_records == 0:
+            self.records = np.zeros(0, dtype=self.dtype)
+        else:
+            self.records = np.memmap(path, dtype=self.dtype, mode='r', offset=LOG_HEADER_SIZE, shape=(num_records,))
+
+        # round number -> record index
+        self.rounds = np.asarray(self.records['round'])
+        self._index = {int(r): i for i, r in enumerate(self.rounds)}
+
+    def __len__(self):
+        return len(self.records)
+
+    def beliefs(self, round_num):
+        """
+        returns (N, N) memory-mapped belief matrix of a round
+        """
+        return self.records['beliefs'][self._index[round_num]]
+
+    def observer(self, player_id, rounds=None):
+        """
+        beliefs of one player over the rounds
+        rounds: list of round numbers, None for all the rounds
+
+        returns (R, N) array
+        """
+        return self._select(rounds)['beliefs'][:, player_id, :]
+
+    def target(self, player_id, rounds=None):
+        """
+        beliefs of all the players on one player over the rounds
+        rounds: list of round numbers, None for all the rounds
+
+        returns (R, N) array
+        """
+        return self._select(rounds)['beliefs'][:, :, player_id]
+
+    def metric(self, name):
+        """
+        returns (R,) values of one of LOG_METRICS over the rounds
+        """
+        return np.asarray(self.records[name])
+
+    def _select(self, rounds):
+        if rounds is None:
+            return self.records
+        return self.records[[self._index[int(r)] for r in rounds]]
+
+def read_belief_log(path):
+    """
+    Reads a binary belief log.
+
+    Args:
+        path: Path to the log file
+
+    Returns:
+        dict: 'num_players', 'seed' and 'records', a memory-mapped structured array with
+        the fields 'round', 's_werewolves', 's_villagers', 'entropy' and 'beliefs'
+    """
+    reader = BeliefLogReader(path)
+    return {'num_players': reader.num_players, 'seed': reader.seed, 'records': reader.records}
+
+def load_belief_log(log_file):
+    """
+    Belief matrices of a log file, binary or legacy JSON.
+    The matrices of a binary log are memory-mapped, they are only read when used.
+
+    Args:
+        log_file: Path to the log file
+
+    Returns:
+        dict: round number -> belief matrix
+    """
+    if log_file.endswith('.json'):
+        with open(log_file, 'r') as f:
+            data = json.load(f)
+        return {int(k): np.array(v, dtype=float) for k, v in data.items() if k.lstrip('-').isdigit()}
+    reader = BeliefLogReader(log_file)
+    return {int(r): reader.beliefs(int(r)) for r in reader.rounds}
+
+def block_average(matrix, max_size):
+    """
+    Downsamples a matrix by averaging square blocks of cells, ignoring NaN, so that
+    it has at most max_size rows and columns. Blocks of NaN stay NaN.
+
+    Args:
+        matrix: (N, M) array
+        max_size: Maximal number of rows and columns of the result
+
+    Returns:
+        tuple: (averaged matrix, block size)
+    """
+    block = -(-max(matrix.shape) // max_size)
+    if block <= 1:
+        return np.asarray(matrix, dtype=float), 1
+
+    rows, cols = -(-matrix.shape[0] // block), -(-matrix.shape[1] // block)
+    padded = np.full((rows * block, cols * block), np.nan)
+    padded[:matrix.shape[0], :matrix.shape[1]] = matrix
+    blocks = padded.reshape(rows, block, cols, block)
+
+    # nanmean without the all-NaN warning
+    counts = (~np.isnan(blocks)).sum(axis=(1, 3))
+    sums = np.nansum(blocks, axis=(1, 3))
+    averaged = np.full(counts.shape, np.nan)
+    np.divide(sums, counts, out=averaged, where=counts > 0)
+    return averaged, block
+
+def convert_json_log(json_file, log_file=None):
+    """
+    Converts a legacy JSON belief log to the binary format.
+    The JSON logs only kept the metrics of the last round, the other rounds get NaN metrics.
+
+    Args:
+        json_file: Path to the JSON log file
+        log_file: Path of the binary log, defaults to the JSON path with the .wwb extension
+
+    Returns:
+        str: path of the binary log
+    """
+    if log_file is None:
+        log_file = os.path.splitext(json_file)[0] + '.wwb'
+    with open(json_file, 'r') as f:
+        data = json.load(f)
+
+    rounds = sorted(int(k) for k in data if k.lstrip('-').isdigit())
+    metrics = {name: data[name] for name in LOG_METRICS if name in data}
+    seed = int(m.group(1)) if (m := re.match(r'game_(-?\d+)_', os.path.basename(json_file))) else None
+
+    log = BeliefLog(log_file, len(data[str(rounds[0])]), seed)
+    for round_num in rounds:
+        log.append(round_num, np.array(data[str(round_num)], dtype=float), metrics if round_num == rounds[-1] else {})
+    log.close()
+    return log_file
+
+# open logs of the games being played, closed when the game is garbage collected
+_game_logs = weakref.WeakKeyDictionary()
+
 def save_beliefs(game, round_num, log_dir='logs'):
     """
-    Save the belief matrix for all agents to a JSON file.
+    Append the belief matrix for all agents to the binary log of the game.
+    The log file is created at the first call for a game.
     
     Args:
         game: Game instance containing all agents
         round_num: Current round number (-1 for initial state)
         log_dir: Directory to save logs
     """
-    # Create logs directory if it doesn't exist
-    os.makedirs(log_dir, exist_ok=True)
-    
-    # Get current datetime truncated to minutes with underscore format
-    current_time = datetime.now().strftime("%Y_%m_%d_%H_%M")
-    
-    # Create belief matrix
-    num_players = game.num_players
-    belief_matrix = np.full((num_players, num_players), np.nan)
-    
-    # Fill in villagers' beliefs
-    for vid, villager in game.villagers.items():
-        belief_matrix[vid] = villager.beliefs
+    log = _game_logs.get(game)
+    if log is None:
+        # Create logs directory if it doesn't exist
+        os.makedirs(log_dir, exist_ok=True)
         
-    # Fill in werewolves' beliefs
-    for wid, werewolf in game.werewolves.items():
-        belief_matrix[wid] = werewolf.beliefs
-        
-    # Convert to nested list (JSON serializable)
-    belief_matrix = belief_matrix.tolist()
+        # Get current datetime truncated to minutes with underscore format
+        current_time = datetime.now().strftime("%Y_%m_%d_%H_%M")
+        log_file = os.path.join(log_dir, f'game_{game.seed}_{current_time}_beliefs.wwb')
+        log = _game_logs[game] = BeliefLog(log_file, game.num_players, game.seed, dtype=game.dtype.str)
     
-    # Load existing data if file exists
-    log_file = os.path.join(log_dir, f'game_{game.seed}_{current_time}_beliefs.json')
-    try:
-        with open(log_file, 'r') as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        data = {}
-    
-
-    # Update data with current round
-    data[str(round_num)] = belief_matrix
-
-    # calculate information propogation metrics
-    info_metric = game.calc_inf_metric()
+    # Belief matrix of the alive players, the rows of the dead players are NaN
+    belief_matrix = np.where(game.alive_mask[:, None], game.store.to_dense(), np.nan)
 
-    data.update(info_metric)
-
-    #calculate information entropy
-    info_entropy = game.calc_info_entropy()
+    # calculate information propogation metrics and information entropy
+    metrics = game.calc_inf_metric()
+    metrics.update(game.calc_info_entropy())
+    
+    log.append(round_num, belief_matrix, metrics)
 
-    data.update(info_entropy)
+def close_beliefs(game):
+    """
+    Close the binary log of a game, if one was opened by save_beliefs.
     
-    # Save updated data
-    with open(log_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    Args:
+        game: Game instance
+    """
+    log = _game_logs.pop(game, None)
+    if log is not None:
+        log.close()
 
-def visualize_beliefs(log_file):
+def visualize_beliefs(log_file, first_round=None, last_round=None, step=1, players=None, max_size=200, dpi=300):
     """
     Read a belief log file and display the sequence of belief matrices as heatmaps.
-    Save the plot with the same base name as the JSON file.
+    Save the plot with the same base name as the log file.
+    Only the selected rounds are read, and matrices larger than max_size are block-averaged.
     
     Args:
-        log_file: Path to the JSON log file
+        log_file: Path to the binary (or legacy JSON) log file
+        first_round: First round to draw, None for the first logged round
+        last_round: Last round to draw (included), None for the last logged round
+        step: Draw one round every step rounds
+        players: List of player ids to draw (as observers and targets), None for all the players
+        max_size: Maximal number of cells per side of a heatmap, larger matrices are block-averaged
+        dpi: Resolution of the saved plot
     """
-    # Read the JSON file
-    with open(log_file, 'r') as f:
-        data = json.load(f)
+    # plotting libraries are only loaded to draw, the logging does not need them
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Read the log file
+    data = load_belief_log(log_file)
     
-    # Sort rounds by integer value
-    rounds = sorted([int(k) for k in data.keys()])
+    # Sort rounds by integer value and keep the requested ones
+    rounds = sorted(data.keys())
+    rounds = [r for r in rounds
+              if (first_round is None or r >= first_round) and (last_round is None or r <= last_round)][::step]
+    if not rounds:
+        print("No round to draw")
+        return
     n_rounds = len(rounds)
-    n_players = len(data[str(rounds[0])])
     
     # Create a figure with subplots
     n_cols = min(5, n_rounds)  # Maximum 5 columns
     n_rows = (n_rounds + n_cols - 1) // n_cols
-    fig, axes = plt.subplots(n_rows, n_cols, figsize=(4*n_cols, 4*n_rows))
-    if n_rows == 1:
-        axes = axes.reshape(1, -1)
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=(4*n_cols, 4*n_rows), squeeze=False)
     
     # Custom colormap: green to red with black for NaN
     colors = [(0, 0.8, 0), (1, 0, 0)]  # Green to red
@@ -97,15 +309,20 @@ def visualize_beliefs(log_file):
         col = idx % n_cols
         ax = axes[row, col]
         
-        # Convert data to numpy array
-        beliefs = np.array(data[str(round_num)])
+        beliefs = data[round_num]
+        if players is not None:
+            beliefs = beliefs[np.ix_(players, players)]
+
+        # Downsample the matrix to the screen resolution
+        beliefs, block = block_average(beliefs, max_size)
         
         # Create heatmap
         sns.heatmap(beliefs, cmap=cmap, ax=ax, vmin=0, vmax=2,
-                   cbar=True if col == n_cols-1 else False)
+                   cbar=True if col == n_cols-1 else False,
+                   xticklabels=block == 1, yticklabels=block == 1)
         ax.set_title(f'Round {round_num}')
-        ax.set_xlabel('Target Player')
-        ax.set_ylabel('Observer Player')
+        ax.set_xlabel('Target Player' if block == 1 else f'Target Player (blocks of {block})')
+        ax.set_ylabel('Observer Player' if block == 1 else f'Observer Player (blocks of {block})')
     
     # Remove empty subplots if any
     for idx in range(len(rounds), n_rows * n_cols):
@@ -115,27 +332,37 @@ def visualize_beliefs(log_file):
     
     plt.tight_layout()
     
-    # Save plot with same name as JSON file but with .png extension
+    # Save plot with same name as the log file but with .png extension
     plot_file = os.path.splitext(log_file)[0] + '.png'
-    plt.savefig(plot_file, dpi=300, bbox_inches='tight')
+    plt.savefig(plot_file, dpi=dpi, bbox_inches='tight')
     plt.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Visualize belief matrices from a game log.')
-    parser.add_argument('--path', type=str, help='Path to the JSON log file')
+    parser.add_argument('--path', type=str, help='Path to the log file')
+    parser.add_argument('--convert', action='store_true', help='Convert the JSON log file to the binary format', default=False)
+    parser.add_argument('--first', type=int, help='First round to draw', default=None)
+    parser.add_argument('--last', type=int, help='Last round to draw', default=None)
+    parser.add_argument('--step', type=int, help='Draw one round every step rounds', default=1)
+    parser.add_argument('--players', type=int, nargs='+', help='Players to draw', default=None)
+    parser.add_argument('--max-size', type=int, help='Maximal number of cells per side, larger matrices are block-averaged', default=200)
+    parser.add_argument('--dpi', type=int, help='Resolution of the plot', default=300)
     args = parser.parse_args()
+    options = dict(first_round=args.first, last_round=args.last, step=args.step, players=args.players, max_size=args.max_size, dpi=args.dpi)
 
-    if args.path:
+    if args.path and args.convert:
+        print(f"Converted to {convert_json_log(args.path)}")
+    elif args.path:
         if os.path.exists(args.path):
-            visualize_beliefs(args.path)
+            visualize_beliefs(args.path, **options)
         else:
             print(f"File not found: {args.path}")
     else:
         # Default behavior: find most recent log
         log_dir = 'logs'
-        log_files = [f for f in os.listdir(log_dir) if f.endswith('_beliefs.json')]
+        log_files = [f for f in os.listdir(log_dir) if f.endswith(('_beliefs.wwb', '_beliefs.json'))]
         if log_files:
             latest_log = max(log_files)
-            visualize_beliefs(os.path.join(log_dir, latest_log))
+            visualize_beliefs(os.path.join(log_dir, latest_log), **options)
         else:
             print("No log files found")
@@ -0,0 +1,132 @@
+import contextlib
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+# context used by the callers when profiling is disabled, entering it costs next to nothing
+NO_PROFILING = contextlib.nullcontext()
+
+# profiler of the phase being run, read by the functions decorated with profiled
+_active = None
+
+class PhaseProfiler():
+
+    def __init__(self, memory=False):
+        """
+        Wall time, call counts and (optionally) memory of the phases of one or several games.
+        Nested phases are inclusive: the time of a softmax is also counted in the phase that called it.
+        memory: bool   also record the memory allocated in each outermost phase with tracemalloc (numpy arrays
+                       included). Much slower, for investigations only.
+
+        phases: dict   name -> {'time': seconds, 'calls': int} (+ 'peak_bytes' and 'net_bytes' with memory)
+                       peak_bytes: highest extra memory in use during one call, net_bytes: memory kept after the calls
+        """
+        self.memory = memory
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        context timing one call of a phase
+        name: str   phase name
+        """
+        global _active
+        previous, _active = _active, self
+        measure_memory = self.memory and previous is None
+
+        if measure_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _active = previous
+
+            record = self.phases.setdefault(name, {'time': 0.0, 'calls': 0})
+            record['time'] += elapsed
+            record['calls'] += 1
+            if measure_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record['peak_bytes'] = max(record.get('peak_bytes', 0), peak - start_bytes)
+                record['net_bytes'] = record.get('net_bytes', 0) + current - start_bytes
+
+    def merge(self, other):
+        """
+        adds the phases of another profiler, or of its report (e.g. sent back by a worker process)
+        other: PhaseProfiler or dict
+
+        returns self
+        """
+        phases = other.phases if isinstance(other, PhaseProfiler) else other
+        for name, values in phases.items():
+            record = self.phases.setdefault(name, {'time': 0.0, 'calls': 0})
+            record['time'] += values['time']
+            record['calls'] += values['calls']
+            if 'peak_bytes' in values:
+                record['peak_bytes'] = max(record.get('peak_bytes', 0), values['peak_bytes'])
+                record['net_bytes'] = record.get('net_bytes', 0) + values['net_bytes']
+        return self
+
+    def report(self):
+        """
+        returns dict, copy of the phases, JSON serializable
+        """
+        return {name: dict(values) for name, values in self.phases.items()}
+
+    def format(self):
+        """
+        returns str, one line per phase sorted by decreasing time
+        """
+        lines = [f"{'phase':24s} {'calls':>10s} {'total (s)':>12s} {'per call (us)':>15s}" + (f" {'peak (MB)':>10s}" if self.memory else "")]
+        for name, values in sorted(self.phases.items(), key=lambda item: -item[1]['time']):
+            line = f"{name:24s} {values['calls']:10d} {values['time']:12.4f} {1e6 * values['time'] / values['calls']:15.1f}"
+            if 'peak_bytes' in values:
+                line += f" {values['peak_bytes'] / 2**20:10.2f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """
+        writes the report to a JSON file
+        path: str
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+def profiled(name):
+    """
+    decorator counting the calls of a function as a phase of the active profiler, if any.
+    Outside of a profiled phase the call only costs a global lookup.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def profiled_method(name):
+    """
+    decorator timing a method as a phase of the profiler of its object (self.profiler), if it has one
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.profiler is None:
+                return method(self, *args, **kwargs)
+            with self.profiler.phase(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
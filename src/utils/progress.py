@@ -0,0 +1,38 @@
+# tqdm is only imported when a progress bar is shown: the headless runs (workers, disabled bars) do not load it
+
+
+class _NoProgress():
+    """
+    silent stand-in of a disabled tqdm bar: iterates, updates and closes without drawing anything
+    """
+
+    def __init__(self, iterable=None):
+        self.iterable = iterable
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, n=1):
+        pass
+
+    def close(self):
+        pass
+
+
+def progress(iterable=None, disable=False, **kwargs):
+    """
+    tqdm progress bar over iterable, see tqdm.tqdm for kwargs
+    disable: bool   no bar, tqdm is then not imported
+
+    returns tqdm or a silent stand-in
+    """
+    if disable:
+        return _NoProgress(iterable)
+    from tqdm import tqdm
+    return tqdm(iterable, **kwargs)
@@ -0,0 +1,314 @@
+import json
+import os
+import tempfile
+import uuid
+import numpy as np
+from .locks import file_lock
+
+# Columns of the results store: the configuration of each game and its scalar outcome.
+# 'U' columns hold strings, p_focus is NaN without Little Girl, first_lynched is the role code
+# (see game.kernels) of the first player lynched by day, -1 when the game ended before.
+RESULT_COLUMNS = {
+    'seed': np.int64,
+    'num_werewolves': np.int32,
+    'num_villagers': np.int32,
+    'eta': np.float64,
+    'lambda': np.float64,
+    'mu': np.float64,
+    'gamma': np.float64,
+    'p_focus': np.float64,
+    'rng_mode': 'U',
+    'pack_rule': 'U',
+    'dtype': 'U',
+    'tie_rtol': np.float64,
+    'vote_mode': 'U',
+    'villagers_win': np.bool_,
+    'rounds': np.int32,
+    'last_turn_little_girl': np.int32,
+    'remaining_villagers': np.int32,
+    'remaining_wolves': np.int32,
+    'first_lynched': np.int8,
+}
+
+# aggregation functions of ResultStore.aggregate
+AGGREGATIONS = ('count', 'sum', 'mean', 'std', 'min', 'max')
+
+
+class ResultStore():
+
+    def __init__(self, directory):
+        """
+        Columnar on-disk store of the per-game outcomes of the simulations (see RESULT_COLUMNS).
+        Each append writes one part file holding a typed array per column, read column by column:
+        a query only loads the columns it filters on and returns. The manifest keeps the row count and
+        the min / max of the numeric columns of every part, so the parts that cannot match a filter are
+        not opened at all.
+        directory: str  store directory, created if needed
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.parts = self._load_manifest()
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path, 'r') as f:
+                return json.load(f)['parts']
+        except FileNotFoundError:
+            return {}
+
+    @property
+    def _lock_path(self):
+        return os.path.join(self.directory, 'manifest.lock')
+
+    def _write_manifest(self):
+        # write to a temporary file first so that readers never see a partial manifest
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'columns': list(RESULT_COLUMNS), 'parts': self.parts}, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def __len__(self):
+        self.parts = self._load_manifest()
+        return sum(part['rows'] for part in self.parts.values())
+
+    @staticmethod
+    def config_columns(num_werewolves, num_villagers, update_params, p_focus, rng_mode='generator', pack_rule='sum', dtype='float64', tie_rtol=0.0, vote_mode='kernel'):
+        """
+        returns dict, configuration columns of the games of a simulation, shared by all its rows.
+        A custom pack rule is identified by its qualified name.
+        """
+        if callable(pack_rule):
+            pack_rule = f'{pack_rule.__module__}.{pack_rule.__qualname__}'
+        eta, _lambda, mu, gamma = (float(x) for x in update_params)
+        return {
+            'num_werewolves': int(num_werewolves),
+            'num_villagers': int(num_villagers),
+            'eta': eta,
+            'lambda': _lambda,
+            'mu': mu,
+            'gamma': gamma,
+            'p_focus': None if p_focus is None else float(p_focus),
+            'rng_mode': rng_mode,
+            'pack_rule': pack_rule,
+            'dtype': str(dtype),
+            'tie_rtol': float(tie_rtol),
+            'vote_mode': vote_mode,
+        }
+
+    @staticmethod
+    def _columns(columns):
+        """
+        typed (n,) arrays of every column of a batch, the scalars are broadcast
+        """
+        missing = set(RESULT_COLUMNS) - set(columns)
+        if missing:
+            raise ValueError(f"Missing result columns {sorted(missing)}")
+        rows = max((np.size(value) for value in columns.values() if np.ndim(value) > 0), default=1)
+        typed = {}
+        for name, dtype in RESULT_COLUMNS.items():
+            value = columns[name]
+            value = np.asarray(np.nan if value is None else value, dtype=str if dtype == 'U' else dtype)
+            typed[name] = np.broadcast_to(value, (rows,)).copy() if value.ndim == 0 else value
+            if len(typed[name]) != rows:
+                raise ValueError(f"Column {name!r} has {len(typed[name])} rows, expected {rows}")
+        return typed
+
+    def _write_part(self, columns):
+        """
+        writes typed columns to a new part file, not listed in the manifest yet
+
+        returns (str, dict), part name and its manifest entry
+        """
+        name = f'part-{uuid.uuid4().hex}.npz'
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+
+        ranges = {column: [np.nanmin(values).item(), np.nanmax(values).item()] for column, values in columns.items()
+                  if values.dtype.kind in 'iuf' and not np.isnan(values).all()}
+        return name, {'rows': len(columns['seed']), 'ranges': ranges}
+
+    def append(self, columns):
+        """
+        adds a batch of games as a new part
+        columns: dict   column name -> (n,) values or a scalar shared by the whole batch, every column of
+                        RESULT_COLUMNS is needed
+        """
+        columns = self._columns(columns)
+        if len(columns['seed']) == 0:
+            return
+        name, part = self._write_part(columns)
+        # merge with the parts appended meanwhile by other threads and processes, under the lock of the
+        # manifest so that two appends never drop each other's part
+        with file_lock(self._lock_path):
+            self.parts = self._load_manifest()
+            self.parts[name] = part
+            self._write_manifest()
+
+    @staticmethod
+    def _may_match(part, where):
+        """
+        False when the min / max of a part exclude an equality or range condition
+        """
+        for column, condition in where.items():
+            bounds = part['ranges'].get(column)
+            if bounds is None or callable(condition) or condition is None:
+                continue
+            if isinstance(condition, tuple):
+                low, high = condition
+            elif np.ndim(condition) == 0 and not isinstance(condition, str):
+                low = high = condition
+            else:
+                continue
+            if (low is not None and bounds[1] < low) or (high is not None and bounds[0] > high):
+                return False
+        return True
+
+    @staticmethod
+    def _mask(values, condition):
+        """
+        rows of a column matching a condition, see read
+        """
+        if callable(condition):
+            return np.asarray(condition(values), dtype=bool)
+        if condition is None:
+            return np.isnan(values) if values.dtype.kind == 'f' else np.zeros(len(values), dtype=bool)
+        if isinstance(condition, tuple):
+            low, high = condition
+            mask = np.ones(len(values), dtype=bool)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+            return mask
+        if np.ndim(condition) > 0:
+            return np.isin(values, list(condition))
+        return values == condition
+
+    def _read_parts(self, parts, columns, where):
+        """
+        matching rows of some parts, column -> list of (n,) arrays
+        """
+        self.parts = parts
+        chunks = {column: [] for column in columns}
+        for name, part in parts.items():
+            if not self._may_match(part, where):
+                continue
+            with np.load(os.path.join(self.directory, name)) as data:
+                mask = np.ones(part['rows'], dtype=bool)
+                for column, condition in where.items():
+                    mask &= self._mask(data[column], condition)
+                if not mask.any():
+                    continue
+                for column in columns:
+                    chunks[column].append(data[column][mask])
+        return chunks
+
+    def read(self, columns=None, where=None):
+        """
+        rows of the store matching every condition of where
+        columns: list   columns to return, None for all of them
+        where:   dict   column -> condition: a value (None matches the NaN of p_focus), an inclusive
+                        (low, high) range (None for an open bound), a list of values, or a callable
+                        mapping the column to a boolean mask
+
+        returns dict, column -> (n,) array, in the order of the parts and of the rows
+        """
+        columns = list(columns or RESULT_COLUMNS)
+        where = where or {}
+        unknown = (set(columns) | set(where)) - set(RESULT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown result columns {sorted(unknown)}")
+
+        # a compaction running meanwhile may remove parts of the manifest just loaded, the read then
+        # starts again from the new manifest
+        parts = self._load_manifest()
+        while True:
+            try:
+                chunks = self._read_parts(parts, columns, where)
+                break
+            except FileNotFoundError:
+                current = self._load_manifest()
+                if current == parts:
+                    raise
+                parts = current
+
+        result = {}
+        for column in columns:
+            dtype = RESULT_COLUMNS[column]
+            result[column] = np.concatenate(chunks[column]) if chunks[column] else np.array([], dtype=str if dtype == 'U' else dtype)
+        return result
+
+    def aggregate(self, by, where=None, **aggregations):
+        """
+        grouped aggregation of the matching rows
+        by:           list   columns to group on
+        where:        dict   filter, see read
+        aggregations: name=(column, function) with function in AGGREGATIONS,
+                      e.g. win_ratio=('villagers_win', 'mean'); std is the population standard deviation
+
+        returns dict, the group columns and one (groups,) array per aggregation, groups in increasing order
+        """
+        for column, function in aggregations.values():
+            if function not in AGGREGATIONS:
+                raise ValueError(f"Unknown aggregation {function!r}, expected one of {AGGREGATIONS}")
+        by = list(by)
+        data = self.read(set(by) | {column for column, _ in aggregations.values()}, where)
+        rows = len(data[by[0]]) if by else len(next(iter(data.values()), []))
+
+        # group index of every row: unique codes of each group column, combined into one index
+        if by:
+            uniques, codes = zip(*(np.unique(data[column], return_inverse=True) for column in by))
+            flat = np.ravel_multi_index([code.ravel() for code in codes], [max(len(unique), 1) for unique in uniques])
+            groups, group = np.unique(flat, return_inverse=True)
+            keys = np.unravel_index(groups, [max(len(unique), 1) for unique in uniques])
+            result = {column: unique[key] for column, unique, key in zip(by, uniques, keys)}
+        else:
+            groups, group = np.zeros(min(rows, 1), dtype=int), np.zeros(rows, dtype=int)
+            result = {}
+
+        count = np.bincount(group, minlength=len(groups))
+        for name, (column, function) in aggregations.items():
+            values = data[column].astype(float)
+            if function == 'count':
+                result[name] = count
+            elif function in ('sum', 'mean', 'std'):
+                total = np.bincount(group, values, minlength=len(groups))
+                if function == 'sum':
+                    result[name] = total
+                    continue
+                mean = total / count
+                if function == 'mean':
+                    result[name] = mean
+                else:
+                    result[name] = np.sqrt(np.maximum(np.bincount(group, (values - mean[group])**2, minlength=len(groups)) / count, 0))
+            else:
+                out = np.full(len(groups), np.inf if function == 'min' else -np.inf)
+                (np.minimum if function == 'min' else np.maximum).at(out, group, values)
+                result[name] = out
+        return result
+
+    def compact(self):
+        """
+        merges all the parts into a single one, for stores grown by many small appends. The manifest swaps
+        the old parts for the merged one in a single write: a crash leaves either of them, never both
+        """
+        with file_lock(self._lock_path):
+            parts = self._load_manifest()
+            if len(parts) <= 1:
+                self.parts = parts
+                return
+            chunks = self._read_parts(parts, list(RESULT_COLUMNS), {})
+            name, part = self._write_part({column: np.concatenate(chunks[column]) for column in RESULT_COLUMNS})
+            self.parts = {name: part}
+            self._write_manifest()
+        for old in parts:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except FileNotFoundError:
+                pass
@@ -1,6 +1,26 @@
 import numpy as np
 
-def softmax(array):
+from .profiling import profiled
+
+@profiled("softmax")
+def softmax(array, axis=None):
+    """
+    NaN-aware softmax. NaN entries (dead players, self) stay NaN and are ignored in the normalization.
+    axis: int or None   axis to normalize along, None normalizes the whole array
+    """
     exp_array = np.exp(array)
-    assert not np.isnan((exp_array/np.nansum(exp_array))[~np.isnan(array)]).any()
-    return exp_array / np.nansum(exp_array)
\ No newline at end of file
+    out = exp_array / np.nansum(exp_array, axis=axis, keepdims=True)
+    assert not np.isnan(out[~np.isnan(array)]).any()
+    return out
+
+def draw_integers(rng, high):
+    """
+    uniform integers in [0, high) drawn from a Generator or from a legacy RandomState
+    rng:  Generator or RandomState
+    high: int or array of int, one draw per entry of the array
+
+    An array of bounds consumes the stream exactly like one scalar draw per entry.
+    """
+    if isinstance(rng, np.random.Generator):
+        return rng.integers(0, high)
+    return rng.randint(0, high)